@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from starlette.datastructures import Headers, MutableHeaders
+from zlib import compressobj, DEFLATED, MAX_WBITS, Z_FINISH, Z_SYNC_FLUSH
+
+try:
+    import brotli
+except ImportError:  # Optional, the responses are only compressed with gzip without it
+    brotli = None
+
+# Default values of the compression section of the configuration
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Media types of the bodies that are already compressed, e.g. GET /export?compress=gzip
+INCOMPRESSIBLE_TYPES = ("application/gzip", "application/zip", "application/x-brotli", "image/", "audio/", "video/")
+
+
+class GzipEncoder:
+    def __init__(self, level: int = GZIP_LEVEL):
+        self.compressor = compressobj(level, DEFLATED, MAX_WBITS | 16)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Every chunk of a stream is flushed, the client receives it without waiting for the next one
+        return self.compressor.compress(data) + self.compressor.flush(Z_FINISH if final else Z_SYNC_FLUSH)
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self.compressor.process(data) + (self.compressor.finish() if final else self.compressor.flush())
+
+
+def negotiate(accept_encoding: str, encodings: tuple):
+    """
+    Select the content coding of a response
+    :param accept_encoding: Value of the Accept-Encoding header of the request
+    :param encodings: Supported content codings in order of preference
+    :return: The first of the encodings accepted by the client, or None
+    """
+    qualities = dict()
+
+    for item in accept_encoding.split(","):
+        name, *parameters = item.split(";")
+        quality = 1.0
+
+        for parameter in parameters:
+            key, _, value = parameter.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        qualities[name.strip().lower()] = quality
+
+    return next((x for x in encodings if qualities.get(x, qualities.get("*", 0.0)) > 0), None)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware that compresses the responses of at least minimum_size bytes with brotli or gzip, as
+    accepted by the client, e.g. the batch, listing and export responses. Streamed responses are compressed chunk by
+    chunk whatever their size. The ETag of a compressed response is made weak, it identifies the content and not its
+    encoding, so the conditional requests still match. Every response that could be compressed has the header
+    Vary: Accept-Encoding, compressed or not, so the shared caches keep one variant per content coding.
+    """
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = {"gzip": lambda: GzipEncoder(level=gzip_level)}
+        self.encodings = ("gzip",)
+
+        if brotli is not None:
+            self.encoders["br"] = lambda: BrotliEncoder(quality=brotli_quality)
+            self.encodings = ("br", "gzip")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(accept_encoding=Headers(scope=scope).get("accept-encoding", ""),
+                             encodings=self.encodings)
+
+        start = None
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start, encoder
+
+            if message["type"] == "http.response.start":
+                # The headers depend on the size of the body, they are sent with its first chunk
+                start = message
+                return
+
+            if message["type"] == "http.response.body" and start is not None:
+                encoder = self.__start__(start=start, message=message, encoding=encoding)
+                await send(start)
+                start = None
+            elif message["type"] == "http.response.body" and encoder is not None:
+                message["body"] = encoder.compress(message.get("body", b""), final=not message.get("more_body"))
+
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def __start__(self, start: dict, message: dict, encoding: str):
+        """
+        Compress the first chunk of the body, if the response is compressed, and rewrite the headers accordingly
+        :param start: The http.response.start message
+        :param message: The first http.response.body message
+        :param encoding: The content coding accepted by the client, or None if it accepts none of them
+        :return: The encoder of the next chunks, or None if the response is not compressed
+        """
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        start["headers"] = list(start.get("headers", []))
+        headers = MutableHeaders(raw=start["headers"])
+
+        if not self.__negotiable__(headers=headers):
+            return None
+
+        # The response depends on the Accept-Encoding header even when this one is sent without compression
+        headers.add_vary_header("accept-encoding")
+
+        if encoding is None or not self.__compressible__(status=start["status"],
+                                                         size=None if more_body else len(body)):
+            return None
+
+        encoder = self.encoders[encoding]()
+        message["body"] = encoder.compress(body, final=not more_body)
+
+        del headers["content-length"]
+        if not more_body:
+            headers["content-length"] = str(len(message["body"]))
+
+        headers["content-encoding"] = encoding
+
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["etag"] = f"W/{etag}"
+
+        return encoder
+
+    @staticmethod
+    def __negotiable__(headers: MutableHeaders) -> bool:
+        """
+        Check if a response can be compressed, i.e. it is not encoded yet and its media type is not compressed
+        """
+        if "content-encoding" in headers:
+            return False
+
+        return not headers.get("content-type", "").startswith(INCOMPRESSIBLE_TYPES)
+
+    def __compressible__(self, status: int, size) -> bool:
+        """
+        Check if a negotiable response is compressed
+        :param size: Size of the body, or None if it is streamed
+        """
+        if status < 200 or status in (204, 304):
+            return False
+
+        return size is None or size >= self.minimum_size
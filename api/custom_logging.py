@@ -21,11 +21,15 @@
 ##
 # Custom Logger Using Loguru
 
-from logging import Handler, currentframe, __file__, basicConfig, getLogger
+from logging import Handler, Filter, currentframe, __file__, basicConfig, getLogger
 import sys
 from pathlib import Path
 from loguru import logger
 from json import load
+from queue import Queue, Full
+from threading import Thread
+from random import random
+from time import monotonic, sleep
 
 
 class InterceptHandler(Handler):
@@ -53,9 +57,130 @@ class InterceptHandler(Handler):
         log.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
 
 
+def patch_origin(record):
+    """
+    Loguru patcher that restores the origin of the messages logged through the QueuedLogger, which are emitted by its
+    writer thread instead of by the code that produced them
+    """
+    origin = record["extra"].pop("_origin", None)
+
+    if origin is not None:
+        record["name"], record["function"], record["line"] = origin
+
+
+class SamplingFilter(Filter):
+    """
+    Keep only a fraction of the records, used for the access log in the fast logging mode
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return self.rate >= 1 or random() < self.rate
+
+
+class QueuedLogger(Handler):
+    """
+    Fast logging front end for the request hot path. The messages below the configured level are discarded with an
+    integer comparison, the others are put with their arguments in a bounded queue and formatted and written by a
+    single thread. When the queue is full the message is dropped and counted instead of blocking the request. It
+    exposes the loguru methods used by the application (with the same "{}" formatting of the arguments) and it is
+    also the logging.Handler of the standard library loggers, so their records do not walk the stack frames.
+    """
+    level_numbers = {
+        "CRITICAL": 50,
+        "ERROR": 40,
+        "WARNING": 30,
+        "INFO": 20,
+        "DEBUG": 10,
+    }
+
+    def __init__(self, level: str, queue_size: int):
+        super().__init__()
+
+        self.level_no = logger.level(level.upper()).no
+        self.queue = Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.reported_dropped = 0
+
+        self.writer = Thread(target=self.__write__, name="QueuedLogger", daemon=True)
+        self.writer.start()
+
+    def __put__(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self.dropped += 1
+
+    def __log__(self, level: str, message: str, args: tuple, kwargs: dict, exception=None):
+        if self.level_numbers[level] < self.level_no:
+            return
+
+        frame = sys._getframe(2)
+        origin = (frame.f_globals.get("__name__"), frame.f_code.co_name, frame.f_lineno)
+
+        self.__put__((level, message, args, kwargs, origin, exception))
+
+    def emit(self, record):
+        if record.levelno < self.level_no:
+            return
+
+        self.__put__(record)
+
+    def __write__(self):
+        log = logger.bind(request_id="app")
+
+        while True:
+            item = self.queue.get()
+
+            if self.dropped != self.reported_dropped:
+                log.warning(f"{self.dropped - self.reported_dropped} log messages dropped, the queue is full")
+                self.reported_dropped = self.dropped
+
+            try:
+                if isinstance(item, tuple):
+                    level, message, args, kwargs, origin, exception = item
+                    log.bind(request_id=None, _origin=origin).opt(exception=exception).log(level, message,
+                                                                                          *args, **kwargs)
+                else:
+                    level = InterceptHandler.loglevel_mapping.get(item.levelno, item.levelname)
+                    log.bind(_origin=(item.name, item.funcName, item.lineno)) \
+                        .opt(exception=item.exc_info).log(level, item.getMessage())
+            except Exception as e:
+                sys.stderr.write(f"Unable to write log message: {e}\n")
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout: float = 5):
+        # Called by logging.shutdown() at exit, give the writer thread some time to empty the queue
+        deadline = monotonic() + timeout
+
+        while self.queue.unfinished_tasks and monotonic() < deadline:
+            sleep(0.01)
+
+    def debug(self, message, *args, **kwargs):
+        self.__log__("DEBUG", message, args, kwargs)
+
+    def info(self, message, *args, **kwargs):
+        self.__log__("INFO", message, args, kwargs)
+
+    def warning(self, message, *args, **kwargs):
+        self.__log__("WARNING", message, args, kwargs)
+
+    def error(self, message, *args, **kwargs):
+        self.__log__("ERROR", message, args, kwargs)
+
+    def critical(self, message, *args, **kwargs):
+        self.__log__("CRITICAL", message, args, kwargs)
+
+    def exception(self, message, *args, **kwargs):
+        self.__log__("ERROR", message, args, kwargs, exception=sys.exc_info())
+
+
 class CustomizeLogger:
     @classmethod
-    def make_logger(cls, config_path: Path):
+    def make_logger(cls, config_path: Path, stream=sys.stdout):
         config = cls.load_logging_config(config_path)
         logging_config = config.get("logger")
 
@@ -65,16 +190,29 @@ class CustomizeLogger:
             retention=logging_config.get("retention"),
             rotation=logging_config.get("rotation"),
             format=logging_config.get("format"),
+            fast=logging_config.get("fast", False),
+            queue_size=logging_config.get("queue_size", 10000),
+            access_log_level=logging_config.get("access_log_level", logging_config.get("level")),
+            access_log_sample_rate=logging_config.get("access_log_sample_rate", 1.0),
+            stream=stream,
         )
 
         return logger
 
     @classmethod
-    def customize_logging(cls, filepath: Path, level: str, rotation: str, retention: str, format: str):
+    def customize_logging(cls, filepath: Path, level: str, rotation: str, retention: str, format: str,
+                          fast: bool = False, queue_size: int = 10000, access_log_level: str = None,
+                          access_log_sample_rate: float = 1.0, stream=sys.stdout):
 
         logger.remove()
 
-        logger.add(sys.stdout, enqueue=True, backtrace=True, level=level.upper(), format=format)
+        if fast:
+            return cls.customize_fast_logging(filepath=filepath, level=level, rotation=rotation, retention=retention,
+                                              format=format, queue_size=queue_size,
+                                              access_log_level=access_log_level or level,
+                                              access_log_sample_rate=access_log_sample_rate, stream=stream)
+
+        logger.add(stream, enqueue=True, backtrace=True, level=level.upper(), format=format)
 
         logger.add(
             str(filepath),
@@ -95,6 +233,41 @@ class CustomizeLogger:
 
         return logger.bind(request_id=None, method=None)
 
+    @classmethod
+    def customize_fast_logging(cls, filepath: Path, level: str, rotation: str, retention: str, format: str,
+                               queue_size: int, access_log_level: str, access_log_sample_rate: float,
+                               stream=sys.stdout):
+        # The QueuedLogger thread is the only writer, the sinks do not need their own queue
+        logger.configure(patcher=patch_origin)
+
+        logger.add(stream, enqueue=False, backtrace=True, level=level.upper(), format=format)
+
+        logger.add(
+            str(filepath),
+            rotation=rotation,
+            retention=retention,
+            enqueue=False,
+            backtrace=True,
+            level=level.upper(),
+            format=format,
+        )
+
+        queued_logger = QueuedLogger(level=level, queue_size=queue_size)
+
+        # The standard library discards the records below the level before creating them
+        basicConfig(handlers=[queued_logger], level=level.upper(), force=True)
+
+        for _log in ["uvicorn", "uvicorn.error", "uvicorn.access", "fastapi"]:
+            _logger = getLogger(_log)
+            _logger.handlers = [queued_logger]
+            _logger.setLevel(level.upper())
+
+        access_logger = getLogger("uvicorn.access")
+        access_logger.setLevel(access_log_level.upper())
+        access_logger.filters = [SamplingFilter(rate=access_log_sample_rate)]
+
+        return queued_logger
+
     @classmethod
     def load_logging_config(cls, config_path):
         config = None
@@ -102,7 +275,12 @@ class CustomizeLogger:
             config = load(config_file)
         return config
 
-    def get_logger(self):
+    def get_logger(self, stream=sys.stdout):
+        """
+        Logger configured by the logger key of common/config.json
+        :param stream: Stream where the log is written besides the log file, the commands that write their results to
+                       stdout use stderr
+        """
         # filename = join(dirname(dirname(__file__)), 'logs', 'app.log')
         #
         # basicConfig(filename=filename,
@@ -115,6 +293,6 @@ class CustomizeLogger:
         # return logging
         #
         logging_config_path = Path.cwd().joinpath("common/config.json")
-        customize_logger = CustomizeLogger.make_logger(logging_config_path)
+        customize_logger = CustomizeLogger.make_logger(logging_config_path, stream=stream)
 
         return customize_logger
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from secure import (
+    Server,
+    ContentSecurityPolicy,
+    StrictTransportSecurity,
+    ReferrerPolicy,
+    PermissionsPolicy,
+    CacheControl,
+    Secure,
+)
+
+
+def build_secure_headers() -> list:
+    """
+    Build the security headers added to every response of the service
+    :return: List of (name, value) tuples encoded as ASGI raw headers
+    """
+    server = Server().set("Secure")
+
+    csp = (
+        ContentSecurityPolicy()
+        .default_src("'none'")
+        .base_uri("'self'")
+        .connect_src("'self'" "api.spam.com")
+        .frame_src("'none'")
+        .img_src("'self'", "static.spam.com")
+    )
+
+    hsts = StrictTransportSecurity().include_subdomains().preload().max_age(2592000)
+
+    referrer = ReferrerPolicy().no_referrer()
+
+    permissions_value = PermissionsPolicy().geolocation("self", "'spam.com'").camera("'none'").microphone("'none'")
+
+    cache_value = CacheControl().must_revalidate()
+
+    secure_headers = Secure(
+        server=server,
+        csp=csp,
+        hsts=hsts,
+        referrer=referrer,
+        permissions=permissions_value,
+        cache=cache_value,
+    )
+
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in secure_headers.headers.items()]
+
+
+class SecureHeadersMiddleware:
+    """
+    Pure ASGI middleware that adds a precomputed set of security headers to every HTTP response. Unlike the
+    BaseHTTPMiddleware path, it does not wrap the request in a new task and response stream, it only rewrites the
+    headers of the http.response.start message.
+    """
+    def __init__(self, app, headers: list = None):
+        self.app = app
+        self.headers = headers if headers is not None else build_secure_headers()
+        self.names = frozenset(name for name, _ in self.headers)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = [x for x in message.get("headers", []) if x[0].lower() not in self.names]
+                headers.extend(self.headers)
+                message["headers"] = headers
+
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
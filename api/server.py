@@ -19,103 +19,289 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 ##
-from fastapi import FastAPI, Request, Response, status
+from fastapi import FastAPI, APIRouter, Request, Response, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.logger import logger as fastapi_logger
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from uvicorn import run
 from datetime import datetime
 from cli.command import __version__
-from secure import (
-    Server,
-    ContentSecurityPolicy,
-    StrictTransportSecurity,
-    ReferrerPolicy,
-    PermissionsPolicy,
-    CacheControl,
-    Secure,
-)
+from api.secure_headers import SecureHeadersMiddleware, build_secure_headers
+from api.request_metrics import RequestMetricsMiddleware
+from api.compression import CompressionMiddleware
+from common.metrics import REGISTRY, CATALOGUE_AGE_SECONDS
 from logging import getLogger
 from pathlib import Path
 from api.custom_logging import CustomizeLogger
-from json import load, JSONDecodeError
+from json import load, dumps, JSONDecodeError
 from ssl import SSLContext, PROTOCOL_TLS_SERVER
+from common.AsyncSDMDescriptionFile import AsyncSDMDescriptionFile
 from common.SDMDescriptionFile import SDMDescriptionFile
+from common.BaseSDMDescriptionFile import CatalogueNotReady
+from common.MappedCatalogueIndex import MAPPED_INDEX_FILENAME
+from os import environ, kill, getpid
+from os.path import join, abspath
+from common.SchemaCache import SchemaCache, SchemaNotAvailable
+from common.config import load_config
+from common.ReverseIndex import KINDS
+from common.SQLSchema import SQLCompiler, DIALECTS, compile_links
+from common.PayloadValidator import PayloadValidator, iter_lines, schema_resolver
+from common.CatalogueExport import FORMATS as EXPORT_FORMATS, MEDIA_TYPES as EXPORT_MEDIA_TYPES
+from hashlib import sha256
+from hmac import compare_digest
+from contextlib import asynccontextmanager
+import asyncio
+import signal
 
 initial_uptime = datetime.now()
 logger = getLogger(__name__)
-sdm_description_file = SDMDescriptionFile()
+
+# Maximum number of Entity Types accepted in one POST /entities request
+MAX_BATCH_SIZE = 10000
+
+# Maximum number of Entity Types accepted in one POST /sql request, each of them downloads its JSON Schemas
+MAX_SQL_BATCH_SIZE = 100
+
+# Content type of the POST /validate requests with one NGSI-LD entity per line, the results are returned in the same
+# format
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Number of results of the Entity Type search by default and at most
+DEFAULT_SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 100
+
+# Number of results per page of the listing endpoints by default and at most
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Environment variable with the path of the shared index, set by launch() for the workers of a multi-process server
+SHARED_INDEX_ENV = "SDM_SHARED_INDEX"
+
+# Environment variable with the PID of the process that downloads the catalogues for a multi-process server, the
+# workers send it REFRESH_SIGNAL to request a refresh
+REFRESHER_PID_ENV = "SDM_REFRESHER_PID"
+REFRESH_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+# Environment variable set by launch() when the compression of the responses is enabled in the command line
+COMPRESSION_ENV = "SDM_COMPRESSION"
+
+# Environment variables with the catalogue source and the offline mode given in the command line, set by launch()
+SOURCE_ENV = "SDM_CATALOGUE_SOURCE"
+OFFLINE_ENV = "SDM_OFFLINE"
+
+
+class PrecomputedJSONResponse(Response):
+    """
+    Response with a body already serialized to JSON, e.g. the precomputed responses of the CatalogueIndex
+    """
+    media_type = "application/json"
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Response streamed while the body of the request is still being read, e.g. the results of POST /validate.
+    StreamingResponse listens for the disconnection of the client in the same channel that delivers the body, it
+    would consume it, so the disconnection is detected by the reader of the body instead.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Check if the If-None-Match header of the request matches the ETag
+    :param request: The HTTP request
+    :param etag: The strong ETag of the current representation
+    :return: True if the client already has the current representation
+    """
+    if_none_match = request.headers.get("if-none-match")
+
+    if if_none_match is None:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    return etag in (x.strip().removeprefix("W/") for x in if_none_match.split(","))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    shared_index_path = environ.get(SHARED_INDEX_ENV)
+
+    if shared_index_path is None:
+        # The catalogues are downloaded by a task of the event loop, the request handlers never block on them
+        app.state.sdm_description_file = AsyncSDMDescriptionFile(source=environ.get(SOURCE_ENV),
+                                                                 offline=True if environ.get(OFFLINE_ENV) else None)
+    else:
+        # Worker of a multi-process server, the parent process downloads the catalogues and shares the index
+        app.state.sdm_description_file = AsyncSDMDescriptionFile(shared_index_path=shared_index_path, follower=True)
+
+    await app.state.sdm_description_file.start()
+
+    CATALOGUE_AGE_SECONDS.set_function(lambda: catalogue_age(app.state.sdm_description_file))
+
+    config = load_config()
+    cache_config = config.get('cache', dict())
+    app.state.schema_cache = SchemaCache(directory=cache_config.get('directory', './cache'),
+                                         **cache_config.get('schemas', dict()))
+    await app.state.schema_cache.start()
+
+    # The JSON Schemas are compiled to SQL in a process pool, created with the first batch that needs it
+    app.state.sql_compiler = SQLCompiler(**config.get('sql', dict()))
+
+    # The large NDJSON streams are validated in another process pool, also created when it is first needed
+    app.state.payload_validator = PayloadValidator(**config.get('validate', dict()))
+
+    # The admin endpoints are disabled unless a token is configured
+    app.state.admin_token = config.get('admin', dict()).get('token')
+
+    yield
+
+    app.state.sql_compiler.close()
+    app.state.payload_validator.close()
+    await app.state.schema_cache.stop()
+    await app.state.sdm_description_file.stop()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="SDM JSON Schema Retrieval Based On Entity Types", debug=False)
+    app = FastAPI(title="SDM JSON Schema Retrieval Based On Entity Types", debug=False, lifespan=lifespan,
+                  default_response_class=ORJSONResponse)
     app.add_middleware(HTTPSRedirectMiddleware)
 
+    # The middlewares added last run first. The compression only wraps the HTTPS redirect and the endpoints, the
+    # security headers and the metrics are applied to the compressed responses.
+    compression = load_config().get("compression", dict())
+    if environ.get(COMPRESSION_ENV) or compression.get("enabled", False):
+        app.add_middleware(CompressionMiddleware, **{k: v for k, v in compression.items() if k != "enabled"})
+
+    # The security headers are the same for every response, build them once
+    app.add_middleware(SecureHeadersMiddleware, headers=build_secure_headers())
+    app.add_middleware(RequestMetricsMiddleware)
+
     custom_logger = CustomizeLogger()
     customize_logger = custom_logger.get_logger()
 
     fastapi_logger.addHandler(customize_logger)
     app.logger = customize_logger
 
-    return app
-
-
-application = create_app()
+    app.add_exception_handler(CatalogueNotReady, catalogue_not_ready)
+    app.include_router(router)
 
+    return app
 
-@application.middleware("https")
-async def set_secure_headers(request, call_next):
-    response = await call_next(request)
-    server = Server().set("Secure")
 
-    csp = (
-        ContentSecurityPolicy()
-        .default_src("'none'")
-        .base_uri("'self'")
-        .connect_src("'self'" "api.spam.com")
-        .frame_src("'none'")
-        .img_src("'self'", "static.spam.com")
-    )
+async def catalogue_not_ready(request: Request, exc: CatalogueNotReady) -> Response:
+    # The requests received before the first index is loaded are rejected fast instead of queueing behind the download
+    request.app.logger.warning(str(exc))
 
-    hsts = StrictTransportSecurity().include_subdomains().preload().max_age(2592000)
+    return ORJSONResponse({"message": str(exc)}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                          headers={"Retry-After": str(exc.retry_after)})
 
-    referrer = ReferrerPolicy().no_referrer()
 
-    permissions_value = PermissionsPolicy().geolocation("self", "'spam.com'").camera("'none'").microphone("'none'")
+def __getattr__(name: str):
+    # The application is created when it is first used, e.g. by uvicorn with "api.server:application", importing the
+    # module does not configure the logger nor build the middleware stack
+    if name == "application":
+        if "application" not in globals():
+            globals()["application"] = create_app()
 
-    cache_value = CacheControl().must_revalidate()
+        return globals()["application"]
 
-    secure_headers = Secure(
-        server=server,
-        csp=csp,
-        hsts=hsts,
-        referrer=referrer,
-        permissions=permissions_value,
-        cache=cache_value,
-    )
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    await secure_headers.set_headers_async(response)
 
-    return response
+router = APIRouter()
 
 
-@application.get("/version", status_code=status.HTTP_200_OK)
+@router.get("/version", status_code=status.HTTP_200_OK)
 def getversion(request: Request):
     request.app.logger.info("GET /version - Request version information")
 
+    sdm_description_file = request.app.state.sdm_description_file
+    index = sdm_description_file.index
+
     data = {
         "doc": "...",
         "git_hash": "nogitversion",
         "version": __version__,
         "release_date": "no released",
-        "uptime": get_uptime()
+        "uptime": get_uptime(),
+        "catalogue_version": None if index is None else index.version,
+        "catalogue_fetched_at": None if index is None else sdm_description_file.obtained_time.isoformat()
     }
 
     return data
 
 
-@application.post("/entity", status_code=status.HTTP_200_OK)
+@router.get("/health/ready", status_code=status.HTTP_200_OK)
+def get_readiness(request: Request, response: Response):
+    sdm_description_file = request.app.state.sdm_description_file
+    index = sdm_description_file.index
+
+    if index is None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        response.headers["Retry-After"] = str(sdm_description_file.retry_after())
+        return {"status": "not_ready", "catalogue_version": None}
+
+    return {"status": "ready", "catalogue_version": index.version}
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+def getmetrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.post("/admin/refresh", status_code=status.HTTP_200_OK)
+async def refresh_catalogues(request: Request, response: Response):
+    request.app.logger.info('POST /admin/refresh - Refreshing the catalogues')
+
+    admin_token = request.app.state.admin_token
+
+    if not admin_token:
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return {"message": "The admin endpoints are disabled, set the key 'admin.token' in the configuration file"}
+
+    authorization = request.headers.get("authorization", "")
+
+    if not compare_digest(authorization.encode("utf-8"), f"Bearer {admin_token}".encode("utf-8")):
+        request.app.logger.error("Invalid admin token")
+
+        response.status_code = status.HTTP_401_UNAUTHORIZED
+        response.headers["WWW-Authenticate"] = "Bearer"
+        return {"message": "It is needed to provide the admin token in the header 'Authorization: Bearer <token>'"}
+
+    sdm_description_file = request.app.state.sdm_description_file
+
+    if sdm_description_file.follower:
+        # Worker of a multi-process server, the catalogues are refreshed by the parent process
+        refresher_pid = environ.get(REFRESHER_PID_ENV)
+
+        if refresher_pid is None:
+            response.status_code = status.HTTP_501_NOT_IMPLEMENTED
+            return {"message": "The refresh on demand of a multi-process server is not available in this platform"}
+
+        kill(int(refresher_pid), REFRESH_SIGNAL)
+
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Refresh requested, the workers map the new index once it is built"}
+
+    result = await sdm_description_file.refresh()
+    index = sdm_description_file.index
+
+    if result == 'failed':
+        response.status_code = status.HTTP_502_BAD_GATEWAY
+
+    return {
+        "result": result,
+        "catalogue_version": None if index is None else index.version,
+        "catalogue_fetched_at": None if index is None else sdm_description_file.obtained_time.isoformat()
+    }
+
+
+@router.post("/entity", status_code=status.HTTP_200_OK)
 async def get_json_schema(request: Request, response: Response):
-    request.app.logger.info(f'POST /entity - Obtaining SDM JSON Schema')
+    request.app.logger.info('POST /entity - Obtaining SDM JSON Schema')
 
     try:
         req_info = await request.json()
@@ -130,16 +316,20 @@ async def get_json_schema(request: Request, response: Response):
         response.status_code = status.HTTP_400_BAD_REQUEST
         return resp
 
+    entity_type = None
+
     try:
         entity_type = req_info["type"]
 
-        request.app.logger.debug(f'Request obtain the JSON Schema of the Entity Type: "{entity_type}"')
-        data = sdm_description_file.get_data(entity_name=entity_type)
+        request.app.logger.debug('Request obtain the JSON Schema of the Entity Type: "{}"', entity_type)
+        data, etag = await request.app.state.sdm_description_file.get_response(entity_name=entity_type)
 
-        request.app.logger.info(f"JSON Schema obtained successfully: {data}")
+        request.app.logger.debug("JSON Schema of the Entity Type \"{}\" obtained successfully", entity_type)
 
-        response.status_code = status.HTTP_200_OK
-        return data
+        if etag_matches(request=request, etag=etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        return PrecomputedJSONResponse(content=data, status_code=status.HTTP_200_OK, headers={"ETag": etag})
 
     except KeyError as e:
         message = f"Unexpected {e=}, {type(e)=}"
@@ -149,9 +339,399 @@ async def get_json_schema(request: Request, response: Response):
             "message": message
         }
 
+        if isinstance(entity_type, str):
+            # Most of the unknown Entity Types are misspelled or wrongly cased ones
+            resp["suggestions"] = await request.app.state.sdm_description_file.suggest(entity_name=entity_type)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return resp
+
+    except IndexError:
+        # The Entity Type exists but it has no links, its metadata is incomplete
+        message = f"Incomplete metadata for entity {entity_type}"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+
+@router.post("/search", status_code=status.HTTP_200_OK)
+async def search_entity_types(request: Request, response: Response):
+    request.app.logger.info('POST /search - Searching Entity Types')
+
+    try:
+        req_info = await request.json()
+        query = req_info["query"]
+        limit = req_info.get("limit", DEFAULT_SEARCH_RESULTS)
+    except (JSONDecodeError, KeyError, TypeError, AttributeError):
+        request.app.logger.error("Missing JSON payload")
+
+        resp = {
+            "message": "It is needed to provide a JSON object in the payload with the key 'query' "
+                       "and the value of an Entity Type, part of it or a misspelled one"
+        }
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return resp
+
+    if not isinstance(query, str) or not isinstance(limit, int) or not 1 <= limit <= MAX_SEARCH_RESULTS:
+        message = f"The value of the key 'query' must be a string and 'limit' an integer between 1 and " \
+                  f"{MAX_SEARCH_RESULTS}"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+    request.app.logger.debug('Request search the Entity Types that match "{}"', query)
+    results = await request.app.state.sdm_description_file.search(query=query, limit=limit)
+
+    return {"query": query, "results": results}
+
+
+def page_parameters(values) -> tuple:
+    """
+    Read the pagination parameters of a listing request
+    :param values: Mapping with the optional keys 'offset' and 'limit', e.g. the JSON payload or the query parameters
+    :return: Tuple with the offset and the limit
+    :raise ValueError: If they are not integers in the valid ranges
+    """
+    try:
+        offset = int(values.get("offset", 0))
+        limit = int(values.get("limit", DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        offset = limit = -1
+
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"The value of 'offset' must be an integer >= 0 and 'limit' an integer between 1 and "
+                         f"{MAX_PAGE_SIZE}")
+
+    return offset, limit
+
+
+def page(total: int, offset: int, limit: int, items: list) -> dict:
+    next_offset = offset + len(items)
+
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset if next_offset < total else None
+    }
+
+
+@router.post("/lookup", status_code=status.HTTP_200_OK)
+async def lookup_entity_types(request: Request, response: Response):
+    request.app.logger.info('POST /lookup - Obtaining the Entity Types of a subject, repository or JSON Schema')
+
+    try:
+        req_info = await request.json()
+        kinds = [x for x in KINDS if x in req_info]
+        offset, limit = page_parameters(req_info)
+    except (JSONDecodeError, TypeError, AttributeError):
+        kinds = []
+    except ValueError as e:
+        request.app.logger.error(e.args[0])
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": e.args[0]}
+
+    if len(kinds) != 1:
+        request.app.logger.error("Missing JSON payload")
+
+        resp = {
+            "message": "It is needed to provide a JSON object in the payload with one of the keys 'subject', "
+                       "'repoLink' or 'jsonSchemaUrl'"
+        }
+
         response.status_code = status.HTTP_400_BAD_REQUEST
         return resp
 
+    kind = kinds[0]
+    key = req_info[kind]
+
+    try:
+        total, entity_types = await request.app.state.sdm_description_file.lookup(kind=kind, key=key, offset=offset,
+                                                                                  limit=limit)
+    except KeyError as e:
+        request.app.logger.error(e.args[0])
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": e.args[0]}
+
+    return {kind: key, **page(total=total, offset=offset, limit=limit, items=entity_types), "types": entity_types}
+
+
+@router.get("/subjects", status_code=status.HTTP_200_OK)
+async def list_subjects(request: Request, response: Response):
+    request.app.logger.info('GET /subjects - Obtaining the subjects of the catalogues')
+
+    try:
+        offset, limit = page_parameters(request.query_params)
+    except ValueError as e:
+        request.app.logger.error(e.args[0])
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": e.args[0]}
+
+    prefix = request.query_params.get("prefix", "")
+    total, subjects = await request.app.state.sdm_description_file.list_subjects(offset=offset, limit=limit,
+                                                                                 prefix=prefix)
+
+    return {**page(total=total, offset=offset, limit=limit, items=subjects), "subjects": subjects}
+
+
+@router.post("/entities", status_code=status.HTTP_200_OK)
+async def get_json_schemas(request: Request, response: Response):
+    request.app.logger.info('POST /entities - Obtaining SDM JSON Schemas')
+
+    try:
+        req_info = await request.json()
+        entity_types = req_info["types"]
+    except (JSONDecodeError, KeyError, TypeError):
+        request.app.logger.error("Missing JSON payload")
+
+        resp = {
+            "message": "It is needed to provide a JSON object in the payload with the key 'types' "
+                       "and the value of a list of valid Entity Types"
+        }
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return resp
+
+    if not isinstance(entity_types, list) or not all(isinstance(x, str) for x in entity_types):
+        message = "The value of the key 'types' must be a list of strings"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+    if len(entity_types) > MAX_BATCH_SIZE:
+        message = f"The maximum number of Entity Types per request is {MAX_BATCH_SIZE}"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+    request.app.logger.debug('Request obtain the JSON Schema of {} Entity Types', len(entity_types))
+    data = await request.app.state.sdm_description_file.get_data_batch(entity_names=entity_types)
+
+    response.status_code = status.HTTP_200_OK
+    return data
+
+
+@router.post("/schema", status_code=status.HTTP_200_OK)
+async def get_json_schema_document(request: Request, response: Response):
+    request.app.logger.info('POST /schema - Obtaining SDM JSON Schema document')
+
+    try:
+        req_info = await request.json()
+        entity_type = req_info["type"]
+        resolve = req_info.get("resolve", True)
+    except (JSONDecodeError, KeyError, TypeError, AttributeError):
+        request.app.logger.error("Missing JSON payload")
+
+        resp = {
+            "message": "It is needed to provide a JSON object in the payload with the key 'type' "
+                       "and the value of a valid Entity Type"
+        }
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return resp
+
+    if not isinstance(resolve, bool):
+        message = "The value of the key 'resolve' must be true or false"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+    try:
+        data = await request.app.state.sdm_description_file.get_data(entity_name=entity_type)
+    except KeyError as e:
+        message = f"Unexpected {e=}, {type(e)=}"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+    except IndexError:
+        message = f"Incomplete metadata for entity {entity_type}"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+    try:
+        documents = [await request.app.state.schema_cache.get_response(url=x['jsonSchema'], resolve=resolve)
+                     for x in data]
+    except SchemaNotAvailable as e:
+        request.app.logger.error(str(e))
+
+        response.status_code = status.HTTP_502_BAD_GATEWAY
+        return {"message": str(e)}
+
+    # The ETag of the response is derived from the ETags of the documents, no need to hash the whole body again
+    etag = f'"{sha256(b"".join(x[1].encode() for x in documents)).hexdigest()}"'
+
+    if etag_matches(request=request, etag=etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    items = [b'{"jsonSchema":' + dumps(x['jsonSchema']).encode() + b',"schema":' + document[0] + b'}'
+             for x, document in zip(data, documents)]
+
+    return PrecomputedJSONResponse(content=b'[' + b','.join(items) + b']', headers={"ETag": etag})
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_catalogue(request: Request, response: Response):
+    request.app.logger.info('GET /export - Exporting the resolved catalogue')
+
+    export_format = request.query_params.get("format", "ndjson")
+    compress = request.query_params.get("compress")
+
+    if export_format not in EXPORT_FORMATS or compress not in (None, "gzip"):
+        message = f"The value of 'format' must be one of {', '.join(EXPORT_FORMATS)} and 'compress', if provided, gzip"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+    filename = f"sdm-catalogue.{export_format}" + (".gz" if compress else "")
+
+    # Nothing is serialized until the response is streamed, the chunks are produced in the thread pool
+    chunks, version = await request.app.state.sdm_description_file.export(export_format=export_format,
+                                                                          compress=compress is not None)
+
+    # The export is a pure function of the catalogues, their version identifies each of its representations
+    etag = f'"{version}-{filename}"'
+
+    if etag_matches(request=request, etag=etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    headers = {"ETag": etag, "Content-Disposition": f'attachment; filename="{filename}"'}
+    media_type = "application/gzip" if compress else EXPORT_MEDIA_TYPES[export_format]
+
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+async def compile_sql(request: Request, entity_types: list, dialect: str) -> dict:
+    """
+    Compile the SQL DDL of several Entity Types, see compile_links
+    :return: Dictionary keyed by Entity Type with either the keys 'sql' and 'etag' or the keys 'error' and 'status'
+    """
+    outcomes = await asyncio.gather(*(request.app.state.sdm_description_file.get_data(entity_name=x)
+                                      for x in entity_types), return_exceptions=True)
+
+    result = dict()
+    links_by_type = dict()
+
+    for entity_type, outcome in zip(entity_types, outcomes):
+        if isinstance(outcome, KeyError):
+            result[entity_type] = {"error": f"No Data Models found for entity {entity_type}",
+                                   "status": status.HTTP_400_BAD_REQUEST}
+        elif isinstance(outcome, IndexError):
+            result[entity_type] = {"error": f"Incomplete metadata for entity {entity_type}",
+                                   "status": status.HTTP_400_BAD_REQUEST}
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            links_by_type[entity_type] = outcome
+
+    compiled = await compile_links(links_by_type=links_by_type, schema_cache=request.app.state.schema_cache,
+                                   compiler=request.app.state.sql_compiler, dialect=dialect)
+
+    # The JSON Schemas that cannot be downloaded or compiled are errors of the upstream servers
+    result.update((k, {**v, "status": status.HTTP_502_BAD_GATEWAY} if "error" in v else v) for k, v in compiled.items())
+
+    return {x: result[x] for x in entity_types}
+
+
+@router.post("/sql", status_code=status.HTTP_200_OK)
+async def get_sql_schema(request: Request, response: Response):
+    request.app.logger.info('POST /sql - Compiling the SQL DDL of the SDM JSON Schemas')
+
+    try:
+        req_info = await request.json()
+        dialect = req_info.get("dialect", "postgresql")
+        entity_types = req_info["types"] if "types" in req_info else [req_info["type"]]
+    except (JSONDecodeError, KeyError, TypeError, AttributeError):
+        request.app.logger.error("Missing JSON payload")
+
+        resp = {
+            "message": "It is needed to provide a JSON object in the payload with the key 'type' and the value of a "
+                       "valid Entity Type, or the key 'types' and a list of them, and the optional key 'dialect'"
+        }
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return resp
+
+    if not isinstance(entity_types, list) or not all(isinstance(x, str) for x in entity_types) or \
+            dialect not in DIALECTS or len(entity_types) > MAX_SQL_BATCH_SIZE:
+        message = f"The value of the key 'type' must be a string, 'types' a list of at most {MAX_SQL_BATCH_SIZE} " \
+                  f"strings and 'dialect' one of {', '.join(DIALECTS)}"
+        request.app.logger.error(message)
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": message}
+
+    request.app.logger.debug('Request compile the SQL DDL of {} Entity Types', len(entity_types))
+    result = await compile_sql(request=request, entity_types=list(dict.fromkeys(entity_types)), dialect=dialect)
+
+    if "types" in req_info:
+        return {k: {"sql": v["sql"]} if "sql" in v else {"error": v["error"]} for k, v in result.items()}
+
+    entity_result = result[entity_types[0]]
+
+    if "error" in entity_result:
+        request.app.logger.error(entity_result["error"])
+
+        response.status_code = entity_result["status"]
+        return {"message": entity_result["error"]}
+
+    etag = entity_result["etag"]
+
+    if etag_matches(request=request, etag=etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    return PlainTextResponse(entity_result["sql"], media_type="application/sql", headers={"ETag": etag})
+
+
+@router.post("/validate", status_code=status.HTTP_200_OK)
+async def validate_payloads(request: Request, response: Response):
+    request.app.logger.info('POST /validate - Validating NGSI-LD entities against the SDM JSON Schemas')
+
+    # A stream is rejected before it is read, its lines are only resolved while the response is streamed
+    await request.app.state.sdm_description_file.wait_ready()
+
+    validator = request.app.state.payload_validator
+    resolve = schema_resolver(get_data=request.app.state.sdm_description_file.get_data,
+                              schema_cache=request.app.state.schema_cache)
+
+    if request.headers.get("content-type", "").split(";")[0].strip() == NDJSON_MEDIA_TYPE:
+        # The stream is validated while it is read, one result per line in the same order
+        async def results():
+            async for result in validator.validate_stream(lines=iter_lines(request.stream()), resolve=resolve):
+                yield dumps(result, separators=(",", ":")).encode() + b"\n"
+
+        return DuplexStreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        payload = await request.json()
+    except JSONDecodeError:
+        request.app.logger.error("Missing JSON payload")
+
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": "It is needed to provide an NGSI-LD entity as a JSON object in the payload, or one per line "
+                           f"with the content type {NDJSON_MEDIA_TYPE}"}
+
+    return await validator.validate(payload=payload, resolve=resolve)
+
+
+def catalogue_age(sdm_description_file):
+    if sdm_description_file.index is None:
+        return None
+
+    return (datetime.now() - sdm_description_file.obtained_time).total_seconds()
+
 
 def get_uptime():
     now = datetime.now()
@@ -166,7 +746,14 @@ def get_uptime():
     return fmt.format(d=days, h=hours, m=minutes, s=seconds)
 
 
-def launch(app: str = "server:application", host: str = "127.0.0.1", port: int = 5700):
+def launch(app: str = "server:application", host: str = "127.0.0.1", port: int = 5700, workers: int = 1,
+           source: str = None, offline: bool = None, http2: bool = False, compress: bool = False):
+    """
+    Launch the server with TLS, the certificate and the key of common/config.json
+    :param http2: Serve with hypercorn, which negotiates HTTP/2 (multiplexed streams, HPACK compressed headers) with
+                  ALPN and falls back to HTTP/1.1, instead of uvicorn
+    :param compress: Compress the responses, see CompressionMiddleware, even if it is not enabled in the configuration
+    """
     ssl_context = SSLContext(PROTOCOL_TLS_SERVER)
 
     logging_config_path = Path.cwd().joinpath("common/config.json")
@@ -175,15 +762,73 @@ def launch(app: str = "server:application", host: str = "127.0.0.1", port: int =
 
     ssl_context.load_cert_chain(certfile=config["cert"], keyfile=config["key"])
 
-    run(
-        app=app,
-        host=host,
-        port=port,
-        log_level="info",
-        server_header=False,
-        ssl_certfile=config["cert"],
-        ssl_keyfile=config["key"]
-    )
+    # The options are inherited by the workers, they create the catalogue service in the lifespan
+    if source is not None:
+        environ[SOURCE_ENV] = source
+    if offline:
+        environ[OFFLINE_ENV] = "1"
+    if compress:
+        environ[COMPRESSION_ENV] = "1"
+
+    refresher = None
+
+    if workers > 1:
+        # Only this process downloads the catalogues, the workers map the index file that it keeps up to date
+        cache_directory = config.get("cache", dict()).get("directory", "./cache")
+        shared_index_path = abspath(join(cache_directory, MAPPED_INDEX_FILENAME))
+
+        environ[SHARED_INDEX_ENV] = shared_index_path
+        refresher = SDMDescriptionFile(shared_index_path=shared_index_path, source=source, offline=offline,
+                                       revalidate=True)
+
+        if REFRESH_SIGNAL is not None:
+            environ[REFRESHER_PID_ENV] = str(getpid())
+            signal.signal(REFRESH_SIGNAL, lambda signum, frame: refresher.refresh())
+
+    try:
+        if http2:
+            run_http2(app=app, host=host, port=port, workers=workers, certfile=config["cert"], keyfile=config["key"])
+        else:
+            run(
+                app=app,
+                host=host,
+                port=port,
+                workers=workers,
+                log_level="info",
+                server_header=False,
+                ssl_certfile=config["cert"],
+                ssl_keyfile=config["key"]
+            )
+    finally:
+        if refresher is not None:
+            refresher.stop()
+
+
+def run_http2(app: str, host: str, port: int, workers: int, certfile: str, keyfile: str):
+    """
+    Run the application with hypercorn, HTTP/2 or HTTP/1.1 over TLS as negotiated with ALPN
+    """
+    # hypercorn is only needed, and imported, to serve HTTP/2
+    from hypercorn.config import Config as HypercornConfig
+    from hypercorn.run import run as run_hypercorn
+
+    # hypercorn evaluates the name in the namespace of the module, without the module __getattr__ that creates the
+    # application on first use, so it is resolved through the module attribute
+    module_name, _, attribute = app.partition(":")
+
+    hypercorn_config = HypercornConfig()
+    hypercorn_config.application_path = f"{module_name}:__getattr__({attribute!r})"
+    hypercorn_config.bind = [f"[{host}]:{port}" if ":" in host else f"{host}:{port}"]
+    hypercorn_config.certfile = certfile
+    hypercorn_config.keyfile = keyfile
+    hypercorn_config.alpn_protocols = ["h2", "http/1.1"]
+    hypercorn_config.include_server_header = False
+    hypercorn_config.loglevel = "INFO"
+
+    # With one worker the server runs in this process, like uvicorn, otherwise hypercorn spawns the workers
+    hypercorn_config.workers = 0 if workers == 1 else workers
+
+    run_hypercorn(hypercorn_config)
 
 
 if __name__ == "__main__":
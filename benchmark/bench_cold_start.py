@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Time to first answer of the service
+
+Measures the time from the start of the process until the first successful answer to POST /entity, with an empty
+cache (the catalogues are downloaded from the mock upstream) and with the snapshot left by the previous run (the
+catalogues are revalidated in background). The upstream latency can be increased to make the difference visible.
+
+Usage:
+  python -m benchmark.bench_cold_start [--entities N] [--runs N] [--latency SECONDS]
+"""
+from argparse import ArgumentParser
+from shutil import rmtree
+from statistics import median
+from tempfile import TemporaryDirectory
+from os.path import join
+from benchmark.catalogue_generator import entity_names
+from benchmark.mock_upstream import MockUpstream
+from benchmark.service import ServiceProcess, write_config
+
+
+def benchmark(entities: int = 1000, runs: int = 3, latency: float = 0.2) -> dict:
+    """
+    Run the cold start benchmark
+    :param entities: Number of Entity Types of the synthetic catalogues
+    :param runs: Number of starts of each variant, the median is reported
+    :param latency: Seconds waited by the mock upstream before answering each request
+    :return: Dictionary with the seconds to the first answer of each variant
+    """
+    entity_type = entity_names(entities)[-1]
+    cold, warm = list(), list()
+
+    with MockUpstream(entities=entities, latency=latency) as upstream, TemporaryDirectory() as workdir:
+        write_config(workdir=workdir, upstream=upstream)
+
+        for _ in range(runs):
+            rmtree(join(workdir, 'cache'), ignore_errors=True)
+
+            with ServiceProcess(workdir=workdir) as service:
+                cold.append(service.wait_ready(entity_type=entity_type))
+
+            # The snapshot written by the previous process is loaded before the catalogues are revalidated
+            with ServiceProcess(workdir=workdir) as service:
+                warm.append(service.wait_ready(entity_type=entity_type))
+
+    return {
+        'empty_cache_seconds': median(cold),
+        'snapshot_seconds': median(warm),
+    }
+
+
+def main():
+    parser = ArgumentParser(description='Time to first answer of the service')
+    parser.add_argument('--entities', type=int, default=1000, help='Number of Entity Types of the catalogues')
+    parser.add_argument('--runs', type=int, default=3, help='Number of starts of each variant')
+    parser.add_argument('--latency', type=float, default=0.2, help='Latency of the mock upstream in seconds')
+    args = parser.parse_args()
+
+    results = benchmark(entities=args.entities, runs=args.runs, latency=args.latency)
+
+    print(f"{'empty cache':<16} {results['empty_cache_seconds'] * 1e3:8.0f} ms")
+    print(f"{'snapshot':<16} {results['snapshot_seconds'] * 1e3:8.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Load test of the HTTP endpoints of the service
+
+Starts the mock upstream and the service in a child process, waits until the catalogues are loaded and keeps a fixed
+number of concurrent connections busy for a given time per scenario. Reports throughput and latency percentiles.
+
+Usage:
+  python -m benchmark.bench_http [--entities N] [--concurrency N] [--duration SECONDS] [--fast-logging]
+"""
+from argparse import ArgumentParser
+from random import Random
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from benchmark.catalogue_generator import entity_names
+from benchmark.mock_upstream import MockUpstream
+from benchmark.service import ServiceProcess, write_config, FORWARDED_HEADERS
+import asyncio
+import httpx
+
+BATCH_SIZE = 100
+
+
+def scenarios(names: list, seed: int = 0) -> dict:
+    """
+    Requests of each scenario, as functions that receive the client and return the response
+    """
+    rng = Random(seed)
+
+    return {
+        'GET /version': lambda client: client.get('/version'),
+        'POST /entity': lambda client: client.post('/entity', json={'type': rng.choice(names)}),
+        'POST /entity (unknown)': lambda client: client.post('/entity', json={'type': 'NotAnEntityType'}),
+        f'POST /entities ({BATCH_SIZE})': lambda client: client.post('/entities',
+                                                                     json={'types': rng.sample(names, BATCH_SIZE)}),
+    }
+
+
+async def run_scenario(base_url: str, request, concurrency: int, duration: float) -> dict:
+    latencies = list()
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=FORWARDED_HEADERS, limits=limits, timeout=10.0) as client:
+        # Open the connections before measuring
+        await asyncio.gather(*(request(client) for _ in range(concurrency)))
+
+        deadline = perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while perf_counter() < deadline:
+                start = perf_counter()
+                try:
+                    response = await request(client)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(perf_counter() - start)
+
+        start = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = perf_counter() - start
+
+    percentiles = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_seconds': percentiles[49],
+        'p90_seconds': percentiles[89],
+        'p99_seconds': percentiles[98],
+    }
+
+
+def benchmark(entities: int = 1000, concurrency: int = 16, duration: float = 10.0, fast_logging: bool = False) -> dict:
+    """
+    Run the load test
+    :param entities: Number of Entity Types of the synthetic catalogues
+    :param concurrency: Number of concurrent connections
+    :param duration: Seconds of load per scenario
+    :param fast_logging: Use the fast logging mode of the service
+    :return: Dictionary of results keyed by scenario
+    """
+    names = entity_names(entities)
+
+    with MockUpstream(entities=entities) as upstream, TemporaryDirectory() as workdir:
+        write_config(workdir=workdir, upstream=upstream, overrides={'logger': {'fast': fast_logging}})
+
+        with ServiceProcess(workdir=workdir) as service:
+            service.wait_ready(entity_type=names[0])
+
+            return {name: asyncio.run(run_scenario(base_url=service.base_url, request=request,
+                                                   concurrency=concurrency, duration=duration))
+                    for name, request in scenarios(names).items()}
+
+
+def main():
+    parser = ArgumentParser(description='Load test of the HTTP endpoints of the service')
+    parser.add_argument('--entities', type=int, default=1000, help='Number of Entity Types of the catalogues')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per scenario')
+    parser.add_argument('--fast-logging', action='store_true', help='Use the fast logging mode of the service')
+    args = parser.parse_args()
+
+    results = benchmark(entities=args.entities, concurrency=args.concurrency, duration=args.duration,
+                        fast_logging=args.fast_logging)
+
+    print(f"{'scenario':<24} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<24} {result['requests_per_second']:>9.0f} {result['p50_seconds'] * 1e3:>8.2f} "
+              f"{result['p90_seconds'] * 1e3:>8.2f} {result['p99_seconds'] * 1e3:>8.2f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
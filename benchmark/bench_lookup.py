@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Microbenchmark of the Entity Type lookup for several catalogue sizes
+
+Measures, per call, the linear scan of both catalogues done before the index existed, CatalogueIndex.get_data, which
+builds the list of links, and CatalogueIndex.get_response, which returns the precomputed JSON document. The time to
+build the index is reported as well, the time to get the suggestions of a misspelled Entity Type and the time to get
+the first page of 100 Entity Types of a subject.
+
+Usage:
+  python -m benchmark.bench_lookup [--sizes N [N ...]] [--lookups N]
+"""
+from argparse import ArgumentParser
+from os.path import join
+from random import Random
+from time import perf_counter
+from benchmark.catalogue_generator import generate_catalogues, entity_names
+from common.CatalogueIndex import CatalogueIndex
+from common.ReverseIndex import SUBJECT
+
+
+def linear_scan(official_list_data_models_data: dict, data_models_metadata_data: list, entity_name: str) -> list:
+    """
+    Lookup of an Entity Type as it was done before the index existed, kept as the reference of the benchmark
+    """
+    official_data_model = [x for x in official_list_data_models_data['officialList'] if entity_name in x['dataModels']]
+    data_model_metadata = [x for x in data_models_metadata_data if x['dataModel'] == entity_name]
+
+    if len(official_data_model) == 0:
+        raise KeyError(f'No Data Models found for entity {entity_name}')
+
+    response = list()
+    for i in range(len(official_data_model)):
+        entity_repo_link = official_data_model[i]['repoLink'].replace('.git', '')
+        response.append({
+            'repo': join(entity_repo_link, 'tree', 'master', entity_name),
+            'yaml': data_model_metadata[i]['yamlUrl'],
+            'jsonSchema': data_model_metadata[i]['jsonSchemaUrl']
+        })
+
+    return response
+
+
+def misspell(entity_name: str) -> str:
+    """
+    Lower case version of the Entity Type with two adjacent characters swapped, as sent by the clients
+    """
+    if len(entity_name) < 4:
+        return entity_name.lower()
+
+    return entity_name[:2].lower() + entity_name[3] + entity_name[2] + entity_name[4:]
+
+
+def time_calls(function, names: list) -> float:
+    start = perf_counter()
+    for name in names:
+        function(name)
+
+    return (perf_counter() - start) / len(names)
+
+
+def benchmark(sizes: list, lookups: int = 10000, seed: int = 0) -> list:
+    """
+    Run the lookup benchmark
+    :param sizes: Numbers of Entity Types of the synthetic catalogues
+    :param lookups: Number of lookups per variant, the linear scan is limited to a budget of element comparisons
+    :param seed: Seed of the random selection of the Entity Types
+    :return: List with one dictionary of results, in seconds, per size
+    """
+    results = list()
+
+    for size in sizes:
+        official_list, metadata = generate_catalogues(entities=size)
+
+        start = perf_counter()
+        index = CatalogueIndex(official_list, metadata)
+        build_seconds = perf_counter() - start
+
+        names = Random(seed).choices(entity_names(size), k=lookups)
+        subjects = Random(seed).choices([x['name'] for x in official_list['officialList']], k=lookups)
+        linear_names = names[:max(10, min(lookups, 2_000_000 // size))]
+
+        results.append({
+            'entities': size,
+            'index_build_seconds': build_seconds,
+            'linear_scan_seconds': time_calls(lambda name: linear_scan(official_list, metadata, name), linear_names),
+            'get_data_seconds': time_calls(index.get_data, names),
+            'get_response_seconds': time_calls(index.get_response, names),
+            'suggest_seconds': time_calls(index.suggest, [misspell(x) for x in names[:1000]]),
+            'subject_page_seconds': time_calls(lambda name: index.lookup(kind=SUBJECT, key=name, limit=100), subjects),
+        })
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description='Per-call time of the Entity Type lookup')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Catalogue sizes')
+    parser.add_argument('--lookups', type=int, default=10000, help='Number of lookups per variant')
+    args = parser.parse_args()
+
+    print(f"{'entities':>9} {'build ms':>10} {'linear us':>10} {'get_data us':>12} {'response us':>12} "
+          f"{'suggest us':>11} {'subject us':>11}")
+    for result in benchmark(sizes=args.sizes, lookups=args.lookups):
+        print(f"{result['entities']:>9} {result['index_build_seconds'] * 1e3:>10.1f} "
+              f"{result['linear_scan_seconds'] * 1e6:>10.1f} {result['get_data_seconds'] * 1e6:>12.2f} "
+              f"{result['get_response_seconds'] * 1e6:>12.2f} {result['suggest_seconds'] * 1e6:>11.1f} "
+              f"{result['subject_page_seconds'] * 1e6:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
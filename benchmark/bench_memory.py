@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Memory used by the catalogues in each process of the service, for several catalogue sizes
+
+Compares the representation used before, the parsed catalogues with all their fields kept to rebuild the index plus
+lookup tables referencing them and the precomputed responses, with the one used now, only the precomputed responses
+and the search structures. The memory retained after the catalogues are loaded is measured with tracemalloc, and the
+components of the current representation with BaseSDMDescriptionFile.memory_usage.
+
+It also measures the peak memory of parsing the downloaded catalogues in a refresh, reading each body whole and
+parsing it in one go against feeding it chunk by chunk to CatalogueStream.
+
+Usage:
+  python -m benchmark.bench_memory [--sizes N [N ...]]
+"""
+from argparse import ArgumentParser
+from gc import collect
+from tempfile import TemporaryDirectory
+from tracemalloc import start, stop, take_snapshot, get_traced_memory
+from os.path import join
+from orjson import dumps, loads
+from benchmark.catalogue_generator import generate_catalogue_files
+from common.BaseSDMDescriptionFile import BaseSDMDescriptionFile
+from common.CatalogueSnapshot import project_catalogues
+from common.CatalogueStream import CatalogueStream, CHUNK_SIZE
+from common.EntitySearch import EntitySearch
+from datetime import datetime
+
+
+def retained(function) -> tuple:
+    """
+    Bytes allocated by a function and still referenced by its result once it returns
+    :return: Tuple with the result of the function and the bytes
+    """
+    collect()
+    start()
+    before = take_snapshot()
+    result = function()
+    collect()
+    after = take_snapshot()
+    stop()
+
+    size = sum(x.size_diff for x in after.compare_to(before, 'filename'))
+
+    return result, size
+
+
+def peak(function) -> int:
+    """
+    Peak of the memory allocated while a function runs
+    """
+    collect()
+    start()
+    function()
+    size = get_traced_memory()[1]
+    stop()
+
+    return size
+
+
+def parse_whole(official_list: bytes, metadata: bytes) -> tuple:
+    # The copies stand for the bodies read from the responses
+    return project_catalogues(loads(bytes(official_list)), loads(bytes(metadata)))
+
+
+def parse_stream(official_list: bytes, metadata: bytes) -> tuple:
+    catalogues = list()
+
+    for content, is_official_list in ((official_list, True), (metadata, False)):
+        stream = CatalogueStream(official_list=is_official_list)
+        for i in range(0, len(content), CHUNK_SIZE):
+            stream.feed(content[i:i + CHUNK_SIZE])
+        catalogues.append(stream.close())
+
+    return tuple(catalogues)
+
+
+def load_previous(official_list: bytes, metadata: bytes) -> tuple:
+    """
+    Previous representation: the parsed catalogues, the lookup tables of subjects and metadata by Entity Type and the
+    precomputed responses
+    """
+    official_list_data_models_data, data_models_metadata_data = loads(official_list), loads(metadata)
+
+    official_by_entity = dict()
+    for subject in official_list_data_models_data['officialList']:
+        for entity_name in dict.fromkeys(subject['dataModels']):
+            official_by_entity.setdefault(entity_name, []).append(subject)
+
+    metadata_by_entity = dict()
+    for data_model in data_models_metadata_data:
+        metadata_by_entity.setdefault(data_model['dataModel'], []).append(data_model)
+
+    responses = {
+        entity_name: dumps([
+            {
+                'repo': join(subject['repoLink'].replace('.git', ''), 'tree', 'master', entity_name),
+                'yaml': data_model['yamlUrl'],
+                'jsonSchema': data_model['jsonSchemaUrl']
+            }
+            for subject, data_model in zip(subjects, metadata_by_entity.get(entity_name, []))
+        ])
+        for entity_name, subjects in official_by_entity.items()
+    }
+
+    return (official_list_data_models_data, data_models_metadata_data, official_by_entity, metadata_by_entity,
+            responses, EntitySearch(official_by_entity))
+
+
+def load_compact(official_list: bytes, metadata: bytes, snapshot_dir: str) -> BaseSDMDescriptionFile:
+    service = BaseSDMDescriptionFile(snapshot_dir=snapshot_dir)
+    service.__update_index__(official_list_data_models_data=loads(official_list), official_list_validators=None,
+                             data_models_metadata_data=loads(metadata), data_models_metadata_validators=None,
+                             current_time=datetime.now())
+
+    return service
+
+
+def benchmark(sizes: list) -> list:
+    """
+    Run the memory benchmark
+    :param sizes: Numbers of Entity Types of the synthetic catalogues
+    :return: List with one dictionary of results, in bytes, per size
+    """
+    results = list()
+
+    # The first load allocates the caches of the modules involved, which are not part of the representation
+    official_list, metadata = generate_catalogue_files(entities=10)
+    with TemporaryDirectory() as snapshot_dir:
+        load_previous(official_list, metadata)
+        load_compact(official_list, metadata, snapshot_dir)
+
+    for size in sizes:
+        official_list, metadata = generate_catalogue_files(entities=size)
+
+        _, previous = retained(lambda: load_previous(official_list, metadata))
+
+        with TemporaryDirectory() as snapshot_dir:
+            service, compact = retained(lambda: load_compact(official_list, metadata, snapshot_dir))
+
+        results.append({
+            'entities': size,
+            'downloaded_bytes': len(official_list) + len(metadata),
+            'previous_bytes': previous,
+            'compact_bytes': compact,
+            'compact_components_bytes': service.memory_usage(),
+            'refresh_peak_whole_bytes': peak(lambda: parse_whole(official_list, metadata)),
+            'refresh_peak_stream_bytes': peak(lambda: parse_stream(official_list, metadata)),
+        })
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description='Memory used by the catalogues per process')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Catalogue sizes')
+    args = parser.parse_args()
+
+    results = benchmark(sizes=args.sizes)
+
+    print(f"{'entities':>9} {'download KiB':>13} {'previous KiB':>13} {'compact KiB':>12}   components KiB")
+    for result in results:
+        components = ', '.join(f'{name} {size / 1024:.0f}' for name, size in result['compact_components_bytes'].items())
+        print(f"{result['entities']:>9} {result['downloaded_bytes'] / 1024:>13.0f} "
+              f"{result['previous_bytes'] / 1024:>13.0f} {result['compact_bytes'] / 1024:>12.0f}   {components}")
+
+    print()
+    print(f"{'entities':>9} {'refresh peak whole KiB':>23} {'refresh peak stream KiB':>24}")
+    for result in results:
+        print(f"{result['entities']:>9} {result['refresh_peak_whole_bytes'] / 1024:>23.0f} "
+              f"{result['refresh_peak_stream_bytes'] / 1024:>24.0f}")
+
+if __name__ == '__main__':
+    main()
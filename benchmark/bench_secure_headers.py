@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Microbenchmark of the per-request overhead of the security headers middleware
+
+Compares the previous implementation, a BaseHTTPMiddleware that builds the secure objects on every request, with the
+pure ASGI SecureHeadersMiddleware that applies a precomputed header set. The applications are driven directly through
+the ASGI interface, so the figures only include the middleware and the framework.
+
+Usage:
+  python -m benchmark.bench_secure_headers [--requests N]
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from fastapi import FastAPI
+from secure import (
+    Server,
+    ContentSecurityPolicy,
+    StrictTransportSecurity,
+    ReferrerPolicy,
+    PermissionsPolicy,
+    CacheControl,
+    Secure,
+)
+from api.secure_headers import SecureHeadersMiddleware, build_secure_headers
+import asyncio
+
+
+def create_endpoint_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/version")
+    def getversion():
+        return {"version": "bench"}
+
+    return app
+
+
+def create_legacy_app() -> FastAPI:
+    app = create_endpoint_app()
+
+    @app.middleware("http")
+    async def set_secure_headers(request, call_next):
+        response = await call_next(request)
+        server = Server().set("Secure")
+
+        csp = (
+            ContentSecurityPolicy()
+            .default_src("'none'")
+            .base_uri("'self'")
+            .connect_src("'self'" "api.spam.com")
+            .frame_src("'none'")
+            .img_src("'self'", "static.spam.com")
+        )
+
+        hsts = StrictTransportSecurity().include_subdomains().preload().max_age(2592000)
+
+        referrer = ReferrerPolicy().no_referrer()
+
+        permissions_value = PermissionsPolicy().geolocation("self", "'spam.com'").camera("'none'").microphone("'none'")
+
+        cache_value = CacheControl().must_revalidate()
+
+        secure_headers = Secure(
+            server=server,
+            csp=csp,
+            hsts=hsts,
+            referrer=referrer,
+            permissions=permissions_value,
+            cache=cache_value,
+        )
+
+        await secure_headers.set_headers_async(response)
+
+        return response
+
+    return app
+
+
+def create_asgi_app() -> FastAPI:
+    app = create_endpoint_app()
+    app.add_middleware(SecureHeadersMiddleware, headers=build_secure_headers())
+
+    return app
+
+
+async def run_requests(app, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "https",
+        "path": "/version",
+        "raw_path": b"/version",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 10000),
+        "server": ("127.0.0.1", 5700),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    # Warm up the routing and the middleware stack
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+
+    start = perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+
+    return (perf_counter() - start) / requests
+
+
+def benchmark(requests: int = 20000) -> dict:
+    """
+    Run the middleware benchmark
+    :param requests: Number of requests per variant
+    :return: Dictionary with the seconds per request of each variant
+    """
+    variants = {
+        "no middleware": create_endpoint_app(),
+        "BaseHTTPMiddleware, headers built per request": create_legacy_app(),
+        "ASGI middleware, precomputed headers": create_asgi_app(),
+    }
+
+    return {name: asyncio.run(run_requests(app, requests)) for name, app in variants.items()}
+
+
+def main():
+    parser = ArgumentParser(description="Per-request overhead of the security headers middleware")
+    parser.add_argument("--requests", type=int, default=20000, help="Number of requests per variant")
+    args = parser.parse_args()
+
+    results = benchmark(requests=args.requests)
+    baseline = results["no middleware"]
+
+    for name, seconds in results.items():
+        print(f"{name:<48} {seconds * 1e6:8.1f} us/request   overhead {(seconds - baseline) * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
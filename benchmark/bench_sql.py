@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Benchmark of the compilation of JSON Schemas into SQL DDL
+
+Measures the time to compile a batch of synthetic JSON Schemas one after the other in the calling process, in the
+process pool of SQLCompiler, and again once they are memoized.
+
+Usage:
+  python -m benchmark.bench_sql [--documents N [N ...]] [--properties N] [--workers N]
+"""
+from argparse import ArgumentParser
+import asyncio
+from json import dumps
+from random import Random
+from time import perf_counter
+from common.SQLSchema import SQLCompiler, compile_ddl
+
+# Kinds of the properties of the synthetic JSON Schemas
+PROPERTY_SCHEMAS = (
+    {'type': 'string', 'description': 'Property. Text'},
+    {'type': 'number', 'minimum': 0},
+    {'type': 'integer'},
+    {'type': 'boolean'},
+    {'type': 'string', 'format': 'date-time'},
+    {'type': 'string', 'enum': ['low', 'medium', 'high']},
+    {'type': 'array', 'items': {'type': 'string', 'format': 'uri'}},
+    {'type': 'object', 'properties': {'streetAddress': {'type': 'string'}, 'postalCode': {'type': 'string'}}},
+    {'type': 'array', 'items': {'type': 'object', 'properties': {'value': {'type': 'number'},
+                                                                 'unit': {'type': 'string'}}}},
+    {'oneOf': [{'type': 'object', 'properties': {'type': {'type': 'string', 'enum': ['Point']},
+                                                 'coordinates': {'type': 'array', 'items': {'type': 'number'}}}},
+               {'type': 'object', 'properties': {'type': {'type': 'string', 'enum': ['Polygon']},
+                                                 'coordinates': {'type': 'array'}}}]},
+)
+
+
+def generate_schema(random: Random, properties: int) -> bytes:
+    """
+    Serialized JSON Schema of an NGSI-LD entity with the common properties and a random selection of the others
+    """
+    common = {'id': {'type': 'string', 'format': 'uri'}, 'type': {'type': 'string', 'enum': ['Entity']}}
+    specific = {f'property{i}': random.choice(PROPERTY_SCHEMAS) for i in range(properties)}
+
+    return dumps({'allOf': [{'properties': common}, {'properties': specific}], 'required': ['id', 'type']}).encode()
+
+
+async def measure_compiler(batch: list, workers: int, random: Random) -> tuple:
+    """
+    Time to compile a batch with SQLCompiler, as the server does, and again once it is memoized
+    :return: Tuple with the seconds of both
+    """
+    compiler = SQLCompiler(workers=workers)
+
+    try:
+        # The pool is started before the measure, the server keeps it for its whole life
+        await compiler.compile_batch_async(documents=[(generate_schema(random, 1), 'Warmup', str(x)) for x in range(8)],
+                                           dialect='postgresql')
+
+        start = perf_counter()
+        await compiler.compile_batch_async(documents=batch, dialect='postgresql')
+        pool_seconds = perf_counter() - start
+
+        start = perf_counter()
+        await compiler.compile_batch_async(documents=batch, dialect='postgresql')
+        memoized_seconds = perf_counter() - start
+    finally:
+        compiler.close()
+
+    return pool_seconds, memoized_seconds
+
+
+def benchmark(documents: list, properties: int = 100, workers: int = None, seed: int = 0) -> list:
+    """
+    Run the SQL compilation benchmark
+    :param documents: Numbers of JSON Schemas of the batches
+    :param properties: Number of properties of each JSON Schema
+    :param workers: Number of processes of the pool, by default the number of CPUs
+    :param seed: Seed of the synthetic JSON Schemas
+    :return: List with one dictionary of results, in seconds, per batch size
+    """
+    random = Random(seed)
+    results = list()
+
+    for size in documents:
+        batch = [(generate_schema(random=random, properties=properties), f'Entity{i}') for i in range(size)]
+
+        start = perf_counter()
+        for document, table in batch:
+            compile_ddl(document=document, table=table, dialect='postgresql')
+        sequential_seconds = perf_counter() - start
+
+        pool_seconds, memoized_seconds = asyncio.run(measure_compiler(batch=batch, workers=workers, random=random))
+
+        results.append({
+            'documents': size,
+            'sequential_seconds': sequential_seconds,
+            'pool_seconds': pool_seconds,
+            'memoized_seconds': memoized_seconds,
+        })
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description='Time to compile a batch of JSON Schemas into SQL DDL')
+    parser.add_argument('--documents', type=int, nargs='+', default=[16, 128], help='JSON Schemas per batch')
+    parser.add_argument('--properties', type=int, default=100, help='Properties of each JSON Schema')
+    parser.add_argument('--workers', type=int, default=None, help='Processes of the pool')
+    args = parser.parse_args()
+
+    print(f"{'documents':>10} {'sequential ms':>14} {'pool ms':>10} {'memoized ms':>12}")
+    for result in benchmark(documents=args.documents, properties=args.properties, workers=args.workers):
+        print(f"{result['documents']:>10} {result['sequential_seconds'] * 1e3:>14.1f} "
+              f"{result['pool_seconds'] * 1e3:>10.1f} {result['memoized_seconds'] * 1e3:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
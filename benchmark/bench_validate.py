@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Benchmark of the validation of NGSI-LD entities against their JSON Schemas
+
+Measures the time to validate an NDJSON stream of synthetic entities in a thread of the calling process and in the
+process pool of PayloadValidator, with the validators compiled once per schema in each process.
+
+Usage:
+  python -m benchmark.bench_validate [--entities N [N ...]] [--properties N] [--workers N]
+"""
+from argparse import ArgumentParser
+from json import dumps
+from random import Random
+from time import perf_counter
+from hashlib import sha256
+from benchmark.bench_sql import PROPERTY_SCHEMAS
+from common.PayloadValidator import PayloadValidator
+import asyncio
+
+# Valid value of each of the PROPERTY_SCHEMAS
+PROPERTY_VALUES = ('text', 12.5, 3, True, '2024-01-01T00:00:00Z', 'medium', ['urn:ngsi-ld:Device:1'],
+                   {'streetAddress': 'Calle Mayor 1', 'postalCode': '28001'}, [{'value': 1.5, 'unit': 'C'}],
+                   {'type': 'Point', 'coordinates': [-3.7, 40.4]})
+
+# Probability of an invalid value in each property of the synthetic entities
+INVALID_RATIO = 0.005
+
+
+def generate_schema(kinds: list) -> bytes:
+    """
+    Serialized JSON Schema of an NGSI-LD entity with the common properties and one property of each kind
+    """
+    common = {'id': {'type': 'string', 'format': 'uri'}, 'type': {'type': 'string', 'enum': ['Entity']}}
+    specific = {f'property{i}': PROPERTY_SCHEMAS[kind] for i, kind in enumerate(kinds)}
+
+    return dumps({'allOf': [{'properties': common}, {'properties': specific}], 'required': ['id', 'type']}).encode()
+
+
+def generate_stream(random: Random, entities: int, kinds: list) -> bytes:
+    """
+    NDJSON stream of entities of the type Entity, with a few invalid values
+    """
+    lines = (dumps({'id': f'urn:ngsi-ld:Entity:{i}', 'type': 'Entity',
+                    **{f'property{x}': None if random.random() < INVALID_RATIO else PROPERTY_VALUES[kind]
+                       for x, kind in enumerate(kinds)}})
+             for i in range(entities))
+
+    return '\n'.join(lines).encode()
+
+
+async def validate(validator: PayloadValidator, stream: bytes, schemas: list) -> int:
+    async def resolve(entity_type: str) -> list:
+        return schemas
+
+    async def lines():
+        for line in stream.split(b'\n'):
+            yield line
+
+    return sum([result['valid'] async for result in validator.validate_stream(lines=lines(), resolve=resolve)])
+
+
+def benchmark(entities: list, properties: int = 50, workers: int = None, seed: int = 0) -> list:
+    """
+    Run the validation benchmark
+    :param entities: Numbers of entities of the streams
+    :param properties: Number of properties of the JSON Schema and the entities
+    :param workers: Number of processes of the pool, by default the number of CPUs
+    :param seed: Seed of the synthetic JSON Schema and entities
+    :return: List with one dictionary of results, in seconds, per stream size
+    """
+    random = Random(seed)
+    kinds = [random.randrange(len(PROPERTY_SCHEMAS)) for _ in range(properties)]
+    document = generate_schema(kinds=kinds)
+    schemas = [(sha256(document).hexdigest(), document, 'https://example.org/Entity/schema.json')]
+    results = list()
+
+    for size in entities:
+        stream = generate_stream(random=random, entities=size, kinds=kinds)
+
+        validator = PayloadValidator(workers=workers, min_parallel=size)
+        start = perf_counter()
+        valid = asyncio.run(validate(validator=validator, stream=stream, schemas=schemas))
+        thread_seconds = perf_counter() - start
+
+        validator = PayloadValidator(workers=workers, min_parallel=0)
+
+        try:
+            # The pool is started before the measure, the server keeps it for its whole life
+            asyncio.run(validate(validator=validator, stream=stream[:stream.index(b'\n')], schemas=schemas))
+
+            start = perf_counter()
+            asyncio.run(validate(validator=validator, stream=stream, schemas=schemas))
+            pool_seconds = perf_counter() - start
+        finally:
+            validator.close()
+
+        results.append({
+            'entities': size,
+            'valid': valid,
+            'thread_seconds': thread_seconds,
+            'pool_seconds': pool_seconds,
+        })
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description='Time to validate an NDJSON stream of NGSI-LD entities')
+    parser.add_argument('--entities', type=int, nargs='+', default=[1000, 10000], help='Entities per stream')
+    parser.add_argument('--properties', type=int, default=50, help='Properties of each entity')
+    parser.add_argument('--workers', type=int, default=None, help='Processes of the pool')
+    args = parser.parse_args()
+
+    print(f"{'entities':>10} {'valid':>8} {'thread ms':>10} {'pool ms':>10}")
+    for result in benchmark(entities=args.entities, properties=args.properties, workers=args.workers):
+        print(f"{result['entities']:>10} {result['valid']:>8} {result['thread_seconds'] * 1e3:>10.1f} "
+              f"{result['pool_seconds'] * 1e3:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Synthetic SDM catalogues of configurable size
+
+The documents have the same shape as official_list_data_models.json and datamodels_metadata.json, including the
+fields the service does not use, so that download, parsing and index building see realistic payloads. The content is
+a pure function of the arguments, two runs with the same sizes produce byte-identical catalogues.
+"""
+from random import Random
+from orjson import dumps
+
+REPO_LINK = 'https://github.com/smart-data-models/dataModel.{subject}.git'
+RAW_URL = 'https://raw.githubusercontent.com/smart-data-models/dataModel.{subject}/master/{entity}/{file}'
+
+
+# Words of the synthetic Entity Types, CamelCase combinations of them as the real ones, e.g. AirQualityObserved
+WORDS = (
+    'Air', 'Quality', 'Observed', 'Forecast', 'Weather', 'Alert', 'Water', 'Noise', 'Level', 'Traffic', 'Flow',
+    'Vehicle', 'Parking', 'Spot', 'Space', 'Street', 'Light', 'Lamp', 'Building', 'Operation', 'Device', 'Model',
+    'Measurement', 'Point', 'Of', 'Interest', 'Agri', 'Crop', 'Parcel', 'Soil', 'Animal', 'Greenhouse', 'Energy',
+    'Meter', 'Consumption', 'Transport', 'Station', 'Bike', 'Hire', 'Docking', 'Road', 'Segment', 'Lane', 'Waste',
+    'Container', 'Flood', 'Risk', 'Stream', 'Gauge', 'Tree', 'Garden', 'Green', 'Port', 'Vessel', 'Berth', 'Battery',
+    'Charging', 'Solar', 'Panel', 'Wind', 'Turbine', 'Pump', 'Valve', 'Tank',
+)
+
+
+def entity_names(entities: int, seed: int = 0) -> list:
+    """
+    Generate distinct Entity Types, the same ones for the same arguments
+    :param entities: Number of Entity Types
+    :param seed: Seed of the random combinations of words
+    :return: List of Entity Types
+    """
+    rng = Random(seed)
+    names = dict()
+
+    while len(names) < entities:
+        names[''.join(rng.sample(WORDS, rng.choice((1, 2, 2, 3, 3, 3))))] = None
+
+    return list(names)
+
+
+def generate_catalogues(entities: int, subjects: int = None, shared_every: int = 50) -> tuple:
+    """
+    Generate the two SDM catalogues
+    :param entities: Number of distinct Entity Types
+    :param subjects: Number of subjects, by default one per 20 Entity Types
+    :param shared_every: Every n-th Entity Type is also defined in the next subject, as e.g. Vehicle in the real one
+    :return: Tuple (official_list_data_models, data_models_metadata) with the decoded documents
+    """
+    if subjects is None:
+        subjects = max(1, entities // 20)
+
+    names = entity_names(entities)
+    official_list = [
+        {
+            'name': f'Subject{s:04d}',
+            'repoLink': REPO_LINK.format(subject=f'Subject{s:04d}'),
+            'dataModels': [],
+            'domains': ['SmartCities', 'SmartEnvironment'],
+            'description': f'Synthetic subject number {s} used to benchmark the service',
+        }
+        for s in range(subjects)
+    ]
+
+    for i, entity_name in enumerate(names):
+        official_list[i % subjects]['dataModels'].append(entity_name)
+        if shared_every and subjects > 1 and i % shared_every == 0:
+            official_list[(i + 1) % subjects]['dataModels'].append(entity_name)
+
+    # The metadata must list the subjects of an Entity Type in the same order as the official list
+    metadata = list()
+    for subject in official_list:
+        for entity_name in subject['dataModels']:
+            metadata.append({
+                'dataModel': entity_name,
+                'subject': subject['name'],
+                'yamlUrl': RAW_URL.format(subject=subject['name'], entity=entity_name, file='model.yaml'),
+                'jsonSchemaUrl': RAW_URL.format(subject=subject['name'], entity=entity_name, file='schema.json'),
+                'version': '0.1.0',
+                'description': f'Synthetic Entity Type {entity_name}',
+                'attributes': ['id', 'type', 'name', 'description', 'location', 'dateCreated', 'dateModified'],
+            })
+
+    metadata.sort(key=lambda data_model: data_model['dataModel'])
+
+    return {'officialList': official_list, 'updatedDate': '2024-01-01'}, metadata
+
+
+def generate_catalogue_files(entities: int, subjects: int = None) -> tuple:
+    """
+    Generate the two SDM catalogues serialized as they are served by the upstream
+    :return: Tuple (official_list_data_models, data_models_metadata) with the JSON documents as bytes
+    """
+    official_list, metadata = generate_catalogues(entities=entities, subjects=subjects)
+
+    return dumps(official_list), dumps(metadata)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Local stand-in of the upstream servers of the SDM catalogues
+
+Serves the two catalogue files on 127.0.0.1 with the behaviour the service relies on: strong ETag and Last-Modified
+validators, 304 Not Modified answers to conditional requests, gzip content encoding when it is accepted and an
+optional fixed latency, so that the benchmarks do not depend on GitHub nor on the network.
+
+Usage:
+  python -m benchmark.mock_upstream [--entities N] [--port PORT] [--latency SECONDS]
+"""
+from argparse import ArgumentParser
+from email.utils import formatdate
+from gzip import compress
+from hashlib import sha256
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from time import sleep
+from benchmark.catalogue_generator import generate_catalogue_files
+
+OFFICIAL_LIST_PATH = '/official_list_data_models.json'
+DATA_MODELS_METADATA_PATH = '/datamodels_metadata.json'
+
+
+class MockUpstream:
+    def __init__(self, entities: int = 1000, subjects: int = None, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0):
+        """
+        Mock of the upstream servers of the SDM catalogues, started in a background thread
+        :param entities: Number of Entity Types of the synthetic catalogues
+        :param subjects: Number of subjects of the synthetic catalogues
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 selects a free one
+        :param latency: Seconds waited before answering each request
+        """
+        official_list, metadata = generate_catalogue_files(entities=entities, subjects=subjects)
+        last_modified = formatdate(usegmt=True)
+
+        self.files = dict()
+        for path, content in ((OFFICIAL_LIST_PATH, official_list), (DATA_MODELS_METADATA_PATH, metadata)):
+            self.files[path] = {
+                'content': content,
+                'gzip': compress(content, compresslevel=6),
+                'etag': f'"{sha256(content).hexdigest()[:32]}"',
+                'last_modified': last_modified,
+            }
+
+        self.latency = latency
+        self.requests = dict.fromkeys(('200', '304', '404'), 0)
+        self.server = ThreadingHTTPServer((host, port), self.__handler__())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def official_list_data_models(self) -> str:
+        return self.base_url + OFFICIAL_LIST_PATH
+
+    @property
+    def data_models_metadata(self) -> str:
+        return self.base_url + DATA_MODELS_METADATA_PATH
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, name='mock-upstream', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __handler__(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if upstream.latency:
+                    sleep(upstream.latency)
+
+                file = upstream.files.get(self.path)
+                if file is None:
+                    upstream.requests['404'] += 1
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                if self.headers.get('If-None-Match') == file['etag']:
+                    upstream.requests['304'] += 1
+                    self.send_response(304)
+                    self.send_header('ETag', file['etag'])
+                    self.end_headers()
+                    return
+
+                upstream.requests['200'] += 1
+                body = file['content']
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('ETag', file['etag'])
+                self.send_header('Last-Modified', file['last_modified'])
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = file['gzip']
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = ArgumentParser(description='Local stand-in of the upstream servers of the SDM catalogues')
+    parser.add_argument('--entities', type=int, default=1000, help='Number of Entity Types of the catalogues')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds waited before answering each request')
+    args = parser.parse_args()
+
+    upstream = MockUpstream(entities=args.entities, port=args.port, latency=args.latency)
+    print(f'Serving {upstream.official_list_data_models}')
+    print(f'Serving {upstream.data_models_metadata}')
+
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        upstream.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Run all the benchmarks and store the results
+
+The results are written as a JSON document together with the description of the environment (versions of Python and
+of the main dependencies, platform, CPUs and git revision) and the parameters of the run, so that two result files can
+be compared.
+
+Usage:
+  python -m benchmark.run [--output FILE] [--sizes N [N ...]] [--entities N] [--concurrency N] [--duration SECONDS]
+                          [--quick]
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from importlib.metadata import version, PackageNotFoundError
+from os import cpu_count
+from subprocess import run, DEVNULL
+from json import dumps
+from benchmark import (
+    bench_lookup, bench_memory, bench_http, bench_cold_start, bench_secure_headers, bench_sql, bench_validate
+)
+from benchmark.service import REPOSITORY
+import platform
+
+PACKAGES = ('fastapi', 'starlette', 'uvicorn', 'httpx', 'orjson', 'loguru', 'secure')
+
+
+def environment() -> dict:
+    packages = dict()
+    for package in PACKAGES:
+        try:
+            packages[package] = version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+
+    revision = run(['git', 'rev-parse', 'HEAD'], cwd=REPOSITORY, capture_output=True, text=True, stdin=DEVNULL)
+
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': cpu_count(),
+        'git_revision': revision.stdout.strip() or None,
+        'packages': packages,
+    }
+
+
+def main():
+    parser = ArgumentParser(description='Run all the benchmarks and store the results')
+    parser.add_argument('--output', default='benchmark-results.json', help='File to write the results to')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Catalogue sizes of lookup')
+    parser.add_argument('--entities', type=int, default=1000, help='Catalogue size of the HTTP benchmarks')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent connections of the load test')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per HTTP scenario')
+    parser.add_argument('--quick', action='store_true', help='Short run to check that the benchmarks work')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes, args.duration = [100, 1000], 1.0
+
+    parameters = {key: value for key, value in vars(args).items() if key != 'output'}
+    results = dict()
+
+    print('lookup...')
+    results['lookup'] = bench_lookup.benchmark(sizes=args.sizes, lookups=1000 if args.quick else 10000)
+
+    print('memory...')
+    results['memory'] = bench_memory.benchmark(sizes=args.sizes)
+
+    print('sql...')
+    results['sql'] = bench_sql.benchmark(documents=[16] if args.quick else [16, 128])
+
+    print('validate...')
+    results['validate'] = bench_validate.benchmark(entities=[1000] if args.quick else [1000, 10000])
+
+    print('secure headers...')
+    results['secure_headers'] = bench_secure_headers.benchmark(requests=1000 if args.quick else 20000)
+
+    print('cold start...')
+    results['cold_start'] = bench_cold_start.benchmark(entities=args.entities, runs=1 if args.quick else 3)
+
+    print('http...')
+    results['http'] = bench_http.benchmark(entities=args.entities, concurrency=args.concurrency,
+                                           duration=args.duration)
+
+    document = {'environment': environment(), 'parameters': parameters, 'results': results}
+
+    with open(args.output, 'w') as output:
+        output.write(dumps(document, indent=2) + '\n')
+
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
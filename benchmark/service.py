@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Service under test, started in a separate process against the mock upstream
+
+The service reads common/config.json from its working directory, so every run gets a temporary working directory
+with a copy of the configuration of the repository in which the catalogue URLs point to the mock upstream and the
+cache and log files are kept apart from the ones of the repository. TLS is not used, the load generator sends
+X-Forwarded-Proto so that the HTTPS redirection does not apply.
+"""
+from json import load, dumps
+from os import environ
+from os.path import dirname, abspath, join
+from pathlib import Path
+from socket import socket
+from subprocess import Popen, DEVNULL
+from time import perf_counter, sleep
+import httpx
+import sys
+
+REPOSITORY = dirname(dirname(abspath(__file__)))
+FORWARDED_HEADERS = {'X-Forwarded-Proto': 'https'}
+
+
+def free_port() -> int:
+    with socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_config(workdir: str, upstream, overrides: dict = None):
+    """
+    Write the configuration of the service in its working directory
+    :param workdir: Working directory of the service
+    :param upstream: MockUpstream that serves the catalogues
+    :param overrides: Top level sections merged into the configuration, e.g. {'logger': {'fast': True}}
+    """
+    with open(join(REPOSITORY, 'common', 'config.json')) as config_file:
+        config = load(config_file)
+
+    config['logger']['path'] = join(workdir, 'logs', 'access.log')
+    config['catalogues'].update({
+        'official_list_data_models': upstream.official_list_data_models,
+        'data_models_metadata': upstream.data_models_metadata
+    })
+    config['cache']['directory'] = join(workdir, 'cache')
+
+    for section, values in (overrides or dict()).items():
+        config.setdefault(section, dict()).update(values)
+
+    Path(workdir, 'common').mkdir(parents=True, exist_ok=True)
+    Path(workdir, 'common', 'config.json').write_text(dumps(config, indent=2) + '\n')
+
+
+class ServiceProcess:
+    def __init__(self, workdir: str, port: int = None):
+        """
+        The service, executed by uvicorn in a child process
+        :param workdir: Working directory with the configuration written by write_config
+        :param port: Port to listen on, a free one by default
+        """
+        self.workdir = workdir
+        self.port = port or free_port()
+        self.process = None
+        self.started_at = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self):
+        env = dict(environ, PYTHONPATH=REPOSITORY)
+        command = [sys.executable, '-m', 'uvicorn', 'api.server:application', '--host', '127.0.0.1',
+                   '--port', str(self.port), '--proxy-headers', '--forwarded-allow-ips', '*',
+                   '--log-level', 'warning', '--no-server-header']
+
+        self.started_at = perf_counter()
+        self.process = Popen(command, cwd=self.workdir, env=env, stdout=DEVNULL, stderr=DEVNULL)
+
+    def wait_ready(self, entity_type: str, timeout: float = 60.0) -> float:
+        """
+        Wait until the service answers the Entity Type
+        :return: Seconds since the process was started
+        """
+        deadline = self.started_at + timeout
+
+        with httpx.Client(base_url=self.base_url, headers=FORWARDED_HEADERS, timeout=1.0) as client:
+            while perf_counter() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f'The service exited with code {self.process.returncode}')
+
+                try:
+                    response = client.post('/entity', json={'type': entity_type})
+                    if response.status_code == 200:
+                        return perf_counter() - self.started_at
+                except httpx.TransportError:
+                    pass
+
+                sleep(0.01)
+
+        raise TimeoutError(f'The service was not ready after {timeout} seconds')
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
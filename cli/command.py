@@ -23,21 +23,68 @@
 
 
 Usage:
-  sdm_schema.py run (--entity_type ENTITY_TYPE)
-  sdm_schema.py server [--host HOST] [--port PORT]
+  sdm_schema.py run (--entity_type ENTITY_TYPE | --input FILE) [--profile-startup] [--source SOURCE] [--offline]
+  sdm_schema.py search QUERY [--limit LIMIT] [--source SOURCE] [--offline]
+  sdm_schema.py lookup (--subject SUBJECT | --repo REPO | --schema-url URL) [--source SOURCE] [--offline]
+  sdm_schema.py subjects [--prefix PREFIX] [--source SOURCE] [--offline]
+  sdm_schema.py export [--format FORMAT] [--gzip] [--output OUTPUT] [--source SOURCE] [--offline]
+  sdm_schema.py sql (--entity_type ENTITY_TYPE | --input FILE) [--dialect DIALECT] [--source SOURCE] [--offline]
+  sdm_schema.py validate (--payload PAYLOAD | --input FILE) [--source SOURCE] [--offline]
+  sdm_schema.py warm [--concurrency CONCURRENCY] [--source SOURCE] [--offline]
+  sdm_schema.py server [--host HOST] [--port PORT] [--workers N] [--http2] [--compress] [--source SOURCE]
+                       [--offline]
   sdm_schema.py (-H | --help)
   sdm_schema.py --version
 
 Arguments:
   ENTITY_TYPE   Entity Type to look for the JSON Schema
+  FILE          File with one Entity Type per line, or one NGSI-LD entity per line to validate them,
+                - to read them from stdin
+  PAYLOAD       NGSI-LD entity as a JSON object
+  QUERY         Entity Type, part of it or a misspelled one
+  LIMIT         Maximum number of results of the search
+  SUBJECT       Name of a subject of the catalogues, e.g. dataModel.Transportation
+  REPO          Link of the GitHub repository of a subject
+  URL           URL of the JSON Schema of a Data Model
+  PREFIX        Beginning of the name of the subjects
+  FORMAT        Format of the export: ndjson, csv or sqlite
+  OUTPUT        File where the export is written, - for stdout
+  DIALECT       SQL dialect of the DDL: postgresql or sqlite
+  CONCURRENCY   Maximum number of JSON Schemas downloaded at the same time
+  SOURCE        Directory with the catalogues, e.g. a checkout of the data-models repository,
+                or base URL of a mirror
   PORT          HTTP port used by the service
+  N             Number of worker processes of the server
 
 Options:
   -e, --entity_type <Entity Type>  Entity Type to obtain the corresponding JSON Schema
+  -i, --input FILE                 Obtain the JSON Schema of the Entity Types in FILE,
+                                   the results are written as NDJSON
+  --profile-startup                Report in stderr the time spent in each phase
+                                   of the start of the command
+  -l, --limit LIMIT                Maximum number of results of the search [default: 10]
+  --subject SUBJECT                List the Entity Types of a subject
+  --repo REPO                      List the Entity Types of a repository
+  --schema-url URL                 List the Entity Types of a JSON Schema URL
+  --prefix PREFIX                  List only the subjects that start with PREFIX [default: ]
+  -f, --format FORMAT              Format of the export [default: ndjson]
+  -z, --gzip                       Compress the export with gzip
+  -o, --output OUTPUT              Write the export to OUTPUT instead of sdm-catalogue.FORMAT[.gz]
+  -d, --dialect DIALECT            SQL dialect of the DDL [default: postgresql]
+  --payload PAYLOAD                Validate PAYLOAD against the JSON Schemas of its type
+  -c, --concurrency CONCURRENCY    Download CONCURRENCY JSON Schemas at the same time
+                                   [default: 16]
+  -s, --source SOURCE              Read the catalogues from SOURCE instead of the configured locations
+  --offline                        Never download the remote catalogues, only the local ones are read
   -h, --host HOST                  Launch the server in the corresponding host
                                    [default: 127.0.0.1]
   -p, --port PORT                  Launch the server in the corresponding port
                                    [default: 5700]
+  -w, --workers N                  Number of worker processes, the catalogues are downloaded
+                                   once and shared between them [default: 1]
+  --http2                          Serve HTTP/2 and HTTP/1.1 with hypercorn instead of
+                                   HTTP/1.1 with uvicorn
+  --compress                       Compress the responses with brotli or gzip
   -H, --help                       Show this help message and exit
   -v, --version                    Show version and exit
 
@@ -47,6 +94,7 @@ from docopt import docopt
 from os.path import basename
 from sys import argv
 from schema import Schema, And, Or, Use, SchemaError  # type: ignore
+from common.constants import DIALECTS, FORMATS
 
 
 __version__ = "0.1.0"
@@ -69,18 +117,72 @@ def parse_cli() -> dict:
                 str,
                 error="--entity_type ENTITY_TYPE, Entity Type to obtain the corresponding JSON Schema"
             ),
+            "--input": Or(
+                None,
+                str,
+                error="--input FILE, File with one Entity Type per line or - for stdin"
+            ),
+            "QUERY": Or(
+                None,
+                str,
+                error="QUERY, Entity Type, part of it or a misspelled one"
+            ),
+            "--limit": Or(
+                None,
+                And(Use(int), lambda n: 1 <= n <= 100),
+                error="--limit LIMIT, LIMIT should be integer 1 <= LIMIT <= 100"
+            ),
+            "--subject": Or(None, str, error="--subject SUBJECT should be a string"),
+            "--repo": Or(None, str, error="--repo REPO should be a string"),
+            "--schema-url": Or(None, str, error="--schema-url URL should be a string"),
+            "--prefix": Or(None, str, error="--prefix PREFIX should be a string"),
+            "--format": Or(
+                None,
+                And(str, lambda x: x in FORMATS),
+                error=f"--format FORMAT, FORMAT should be one of {', '.join(FORMATS)}"
+            ),
+            "--gzip": bool,
+            "--output": Or(None, str, error="--output OUTPUT should be a string"),
+            "--dialect": Or(
+                None,
+                And(str, lambda x: x in DIALECTS),
+                error=f"--dialect DIALECT, DIALECT should be one of {', '.join(DIALECTS)}"
+            ),
+            "--payload": Or(None, str, error="--payload PAYLOAD should be a string"),
+            "--concurrency": Or(
+                None,
+                And(Use(int), lambda n: 1 <= n <= 256),
+                error="--concurrency CONCURRENCY, CONCURRENCY should be integer 1 <= CONCURRENCY <= 256"
+            ),
+            "--source": Or(None, str, error="--source SOURCE should be a string"),
+            "--offline": bool,
             "--port": Or(
                 None,
                 And(Use(int), lambda n: 1 < n < 65535),
                 error="--port N, N should be integer 1 < N < 65535"
             ),
+            "--workers": Or(
+                None,
+                And(Use(int), lambda n: n >= 1),
+                error="--workers N, N should be integer N >= 1"
+            ),
             "--host": Or(
                 None,
                 str,
                 error="--host HOST should be a string"
             ),
+            "--http2": bool,
+            "--compress": bool,
             "--version": bool,
+            "--profile-startup": bool,
             "run": bool,
+            "search": bool,
+            "lookup": bool,
+            "subjects": bool,
+            "export": bool,
+            "sql": bool,
+            "validate": bool,
+            "warm": bool,
             "server": bool,
         }
     )
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Time spent by the command line in each phase of its start, reported with --profile-startup"""
+from time import perf_counter
+import sys
+
+
+class StartupProfile:
+    def __init__(self, started: float):
+        """
+        Phases of the start of the command line
+        :param started: Value of perf_counter() when the process started to execute the script
+        """
+        self.started = started
+        self.last = started
+        self.phases = list()
+
+    def mark(self, phase: str):
+        """
+        Record the end of a phase, which started at the end of the previous one
+        :param phase: Name of the phase
+        """
+        now = perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self, output=sys.stderr):
+        """
+        Write the time of each phase, the total and the modules loaded. Written to stderr by default, so that it does
+        not mix with the results of the command.
+        """
+        for phase, seconds in self.phases:
+            output.write(f'{phase:<20} {seconds * 1e3:9.1f} ms\n')
+
+        output.write(f"{'total':<20} {(self.last - self.started) * 1e3:9.1f} ms\n")
+
+        server_stack = sorted(x for x in ('fastapi', 'starlette', 'uvicorn', 'secure', 'httpx') if x in sys.modules)
+        output.write(f'{len(sys.modules)} modules loaded, server stack: {", ".join(server_stack) or "not loaded"}\n')
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from httpx import AsyncClient, Limits, Timeout, HTTPStatusError, TimeoutException, TransportError, HTTPError, codes
+from ijson import JSONError
+from datetime import datetime
+from common.BaseSDMDescriptionFile import (BaseSDMDescriptionFile, CatalogueNotReady, NOT_MODIFIED,
+                                           RETRY_STATUS_CODES)
+from common.CatalogueStream import CatalogueStream, CHUNK_SIZE
+from common.CatalogueExport import iter_export
+from common.CatalogueSource import is_remote
+from common.MappedCatalogueIndex import MappedCatalogueIndex
+from common.metrics import CATALOGUE_DOWNLOAD_SECONDS, CATALOGUE_DOWNLOAD_BYTES, CATALOGUE_ENTITIES
+from time import perf_counter, monotonic
+from os import stat
+import asyncio
+
+# Seconds between two checks of the shared index file in follower mode
+SHARED_INDEX_POLL_SECONDS = 2
+
+
+class AsyncSDMDescriptionFile(BaseSDMDescriptionFile):
+    """
+    asyncio version of SDMDescriptionFile for the API server. The catalogues are downloaded by a task of the event
+    loop with httpx and parsed while they are received, the construction of the index runs in a worker thread, and
+    the readers wait on an asyncio.Event, so a slow upstream never blocks the event loop. Before the first index is
+    loaded they only wait for a short time, see wait_ready.
+
+    In follower mode (the workers of a multi-process server) nothing is downloaded: the task maps the shared index file
+    written by the SDMDescriptionFile of the parent process and remaps it when it is replaced.
+    """
+    def __init__(self, logger=None, snapshot_dir=None, shared_index_path=None, follower=False,
+                 official_list_data_models=None, data_models_metadata=None, export_file=None, source=None,
+                 offline=None):
+        super().__init__(logger=logger, snapshot_dir=snapshot_dir, shared_index_path=shared_index_path,
+                         follower=follower, official_list_data_models=official_list_data_models,
+                         data_models_metadata=data_models_metadata, export_file=export_file, source=source,
+                         offline=offline)
+
+        # Set once there is an index to serve, either from the snapshot or from the first download
+        self.ready = asyncio.Event()
+        if self.index is not None:
+            self.ready.set()
+
+        # Data loaded from the snapshot is served right away but revalidated in the first iteration
+        self.refresh_requested = self.index is not None and self.export_file is None
+
+        # Future of the result of the refresh requested with refresh(), while it has not started
+        self.refresh_waiter = None
+
+        self.client = None
+        self.background_task = None
+        self._kill = asyncio.Event()
+        self._wake = asyncio.Event()
+
+    async def start(self):
+        """
+        Create the HTTP client and start the background refresh task, it must be called from the event loop
+        """
+        if self.follower:
+            self.background_task = asyncio.create_task(self.follow_shared_index())
+            return
+
+        self.client = AsyncClient(headers={'Accept-Encoding': 'gzip, deflate'},
+                                  limits=Limits(max_connections=2, max_keepalive_connections=2),
+                                  timeout=Timeout(self.read_timeout_seconds, connect=self.connect_timeout_seconds),
+                                  follow_redirects=True)
+
+        self.background_task = asyncio.create_task(self.get_files_background())
+
+    async def stop(self):
+        """
+        Stop the background refresh task and close the HTTP client
+        """
+        self._kill.set()
+        self._wake.set()
+
+        if self.background_task is not None:
+            await self.background_task
+
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def get_files_background(self):
+        while True:
+            self._wake.clear()
+
+            if self._kill.is_set():
+                break
+
+            current_time = datetime.now()
+            waiter, self.refresh_waiter = self.refresh_waiter, None
+
+            if waiter is not None or self.refresh_requested or self.__refresh_due__(current_time=current_time):
+                self.refresh_requested = False
+
+                if self.export_file is not None:
+                    result = await asyncio.to_thread(self.__load_export__, current_time=current_time)
+                else:
+                    # Both catalogues are downloaded at the same time, the refresh takes as long as the slowest one
+                    official_list, data_models_metadata = await asyncio.gather(
+                        self.__get_data__(url=self.official_list_data_models),
+                        self.__get_data__(url=self.data_models_metadata))
+
+                    official_list_data_models_data, official_list_validators = official_list
+                    data_models_metadata_data, data_models_metadata_validators = data_models_metadata
+
+                    # Building the index is CPU bound, keep it out of the event loop
+                    result = await asyncio.to_thread(self.__update_index__,
+                                                     official_list_data_models_data=official_list_data_models_data,
+                                                     official_list_validators=official_list_validators,
+                                                     data_models_metadata_data=data_models_metadata_data,
+                                                     data_models_metadata_validators=data_models_metadata_validators,
+                                                     current_time=current_time)
+
+                if waiter is not None:
+                    waiter.set_result(result)
+
+            if self.index is not None:
+                self.ready.set()
+
+            # Sleep until the next refresh, refresh() and stop() wake the task up immediately
+            delay = self.__refresh_delay__(current_time=datetime.now())
+            self.next_attempt = monotonic() + delay
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except TimeoutError:
+                pass
+
+        self.logger.info("Stopping background task...")
+
+    async def refresh(self) -> str:
+        """
+        Revalidate the catalogues now instead of waiting for the TTL. The requests received before the refresh starts
+        share it.
+        :return: Result of the refresh, 'updated', 'not_modified' or 'failed'
+        """
+        if self.refresh_waiter is None:
+            self.refresh_waiter = asyncio.get_running_loop().create_future()
+            self._wake.set()
+
+        # The waiter is shared, a cancelled request must not cancel it for the others
+        return await asyncio.shield(self.refresh_waiter)
+
+    async def wait_ready(self):
+        """
+        Wait until there is an index to serve. The download of the catalogues is shared by all the readers, they only
+        wait for it for a short time.
+        :raise CatalogueNotReady: If no index is loaded within the readiness timeout
+        """
+        if self.ready.is_set():
+            return
+
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=self.ready_timeout_seconds)
+        except TimeoutError:
+            raise CatalogueNotReady(retry_after=self.retry_after())
+
+    async def follow_shared_index(self):
+        while True:
+            self.__map_shared_index__()
+
+            if self.index is not None:
+                self.ready.set()
+
+            try:
+                await asyncio.wait_for(self._kill.wait(), timeout=SHARED_INDEX_POLL_SECONDS)
+                break
+            except TimeoutError:
+                pass
+
+        self.logger.info("Stopping background task...")
+
+    def __map_shared_index__(self):
+        try:
+            inode = stat(self.shared_index_path).st_ino
+        except FileNotFoundError:
+            return
+
+        # The file is replaced by a rename, a new inode means a new version of the index
+        if self.index is not None and self.index.inode == inode:
+            return
+
+        try:
+            self.index = MappedCatalogueIndex(path=self.shared_index_path)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Unable to map the shared index '{self.shared_index_path}': {e}")
+            return
+
+        self.obtained_time = self.index.fetched_at
+        CATALOGUE_ENTITIES.set(len(self.index))
+        self.__report_memory__()
+        self.logger.info(f"Shared index '{self.shared_index_path}' mapped, version {self.index.version}")
+
+    async def __get_data__(self, url: str) -> tuple:
+        """
+        Download a catalogue, sending the validators of the data currently loaded in a conditional request. Local
+        catalogues are read from the file system instead.
+        :param url: URL, file:// URL or path of the catalogue
+        :return: Tuple with the catalogue projected to the fields of the index (NOT_MODIFIED if the server answered
+                 304, None in case of error) and the ETag/Last-Modified validators of the response
+        """
+        if not is_remote(url):
+            # The file is parsed in a worker thread, reading it may block
+            return await asyncio.to_thread(self.__get_local_data__, url=url)
+
+        if self.offline:
+            return self.__offline_data__(url=url)
+
+        headers = self.__conditional_headers__(url=url)
+        catalogue = self.__catalogue_name__(url=url)
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.__retry_delay__(attempt=attempt))
+
+            start = perf_counter()
+
+            try:
+                # The body is parsed while it is received, see CatalogueStream. Each chunk is parsed in the event
+                # loop, which is never blocked for longer than the parsing of CHUNK_SIZE bytes.
+                async with self.client.stream('GET', url=url, headers=headers) as response:
+                    if response.status_code == codes.NOT_MODIFIED:
+                        return NOT_MODIFIED, self.validators.get(url)
+
+                    response.raise_for_status()
+
+                    stream = CatalogueStream(official_list=url == self.official_list_data_models)
+                    async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                        stream.feed(chunk)
+
+                    data = stream.close()
+            except HTTPStatusError as errh:
+                self.logger.error(f"HTTP Error: {errh}")
+
+                if errh.response.status_code not in RETRY_STATUS_CODES:
+                    return None, None
+                continue
+            except TimeoutException as errrt:
+                self.logger.error(f"Time out: {errrt}")
+                continue
+            except TransportError as conerr:
+                self.logger.error(f"Connection error: {conerr}")
+                continue
+            except HTTPError as errex:
+                self.logger.error(f"Exception request: {errex}")
+                return None, None
+            except JSONError as e:
+                self.logger.error(f"JSONDecodeError: {e}")
+                return None, None
+            finally:
+                CATALOGUE_DOWNLOAD_SECONDS.observe(perf_counter() - start, catalogue)
+
+            CATALOGUE_DOWNLOAD_BYTES.set(stream.size, catalogue)
+
+            return data, self.__response_validators__(headers=response.headers)
+
+        return None, None
+
+    async def get_data(self, entity_name: str) -> list:
+        """
+        Get the link to the repository and the link to the raw data of the model.yaml of the corresponding Data Model
+        :param entity_name: The name of the entity to search the links in GitHub
+        :return: List of dictionaries with the keys 'repo', 'yaml' and 'jsonSchema'
+        """
+        self.logger.debug("Requesting links from entity '%s'", entity_name)
+
+        await self.wait_ready()
+
+        return self.__lookup__(index=self.index, entity_name=entity_name)
+
+    async def get_response(self, entity_name: str) -> tuple:
+        """
+        Get the serialized links of an Entity Type and the ETag of the version of the catalogues that produced them
+        :param entity_name: The name of the entity to search the links in GitHub
+        :return: Tuple with the JSON document and the ETag
+        """
+        self.logger.debug("Requesting links from entity '%s'", entity_name)
+
+        await self.wait_ready()
+
+        index = self.index
+
+        return self.__lookup__(index=index, entity_name=entity_name, response=True), index.etag
+
+    async def get_data_batch(self, entity_names: list) -> dict:
+        """
+        Get the links of several Entity Types, all of them resolved against the same version of the catalogues
+        :param entity_names: The names of the entities to search the links in GitHub
+        :return: Dictionary keyed by Entity Type with either the key 'links' or the key 'error'
+        """
+        self.logger.debug("Requesting links from %d entities", len(entity_names))
+
+        await self.wait_ready()
+
+        return self.__lookup_batch__(index=self.index, entity_names=entity_names)
+
+    async def search(self, query: str, limit: int = 10) -> list:
+        """
+        Search the Entity Types that match a query, with the same or different case, as a prefix or misspelled
+        :param query: Entity Type, part of it or a misspelled one
+        :param limit: Maximum number of results
+        :return: List of dictionaries with the keys 'type', 'match' and 'distance', ranked from the best match
+        """
+        self.logger.debug("Searching the Entity Types that match '%s'", query)
+
+        await self.wait_ready()
+
+        return self.index.search(query=query, limit=limit)
+
+    async def suggest(self, entity_name: str, limit: int = 5) -> list:
+        """
+        Get the Entity Types that were most likely meant by one that does not exist
+        :param entity_name: The Entity Type that was not found
+        :param limit: Maximum number of suggestions
+        :return: List of Entity Types
+        """
+        await self.wait_ready()
+
+        return self.index.suggest(entity_name=entity_name, limit=limit)
+
+    async def export(self, export_format: str, compress: bool = False) -> tuple:
+        """
+        Serialize the resolved links of all the Entity Types, see CatalogueExport.iter_export. The chunks are produced
+        while the iterator is consumed, from the index in use when the export was requested, so it must be consumed
+        outside the event loop, e.g. by a StreamingResponse.
+        :param export_format: 'ndjson', 'csv' or 'sqlite'
+        :param compress: Compress the export with gzip
+        :return: Tuple with the iterator of bytes and the version of the catalogues
+        """
+        await self.wait_ready()
+
+        index = self.index
+
+        return iter_export(index=index, export_format=export_format, compress=compress), index.version
+
+    async def lookup(self, kind: str, key: str, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Get the Entity Types of a subject, a repository or a JSON Schema URL
+        :param kind: 'subject', 'repoLink' or 'jsonSchemaUrl'
+        :param key: Name of the subject, link of the repository or URL of the JSON Schema
+        :param offset: Number of Entity Types skipped, in alphabetical order
+        :param limit: Maximum number of Entity Types returned, all of them by default
+        :return: Tuple with the total number of Entity Types of the key and the list of the requested ones
+        """
+        self.logger.debug("Looking up the Entity Types of the %s '%s'", kind, key)
+
+        await self.wait_ready()
+
+        return self.index.lookup(kind=kind, key=key, offset=offset, limit=limit)
+
+    async def list_subjects(self, offset: int = 0, limit: int = None, prefix: str = '') -> tuple:
+        """
+        Get the names of the subjects of the catalogues
+        :param offset: Number of subjects skipped, in alphabetical order
+        :param limit: Maximum number of subjects returned, all of them by default
+        :param prefix: Return only the subjects whose name starts with it
+        :return: Tuple with the total number of matching subjects and the list of the requested ones
+        """
+        await self.wait_ready()
+
+        return self.index.list_subjects(offset=offset, limit=limit, prefix=prefix)
+
@@ -0,0 +1,516 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from os.path import join, dirname
+from datetime import datetime, timedelta
+from common.CatalogueIndex import CatalogueIndex
+from common.CatalogueSource import resolve_sources, read_local
+from common.CatalogueSnapshot import save_snapshot, load_snapshot, get_snapshot_path, project_catalogues
+from common.MappedCatalogueIndex import write_mapped_index
+from common.config import load_config
+from common.metrics import (CATALOGUE_REFRESH_TOTAL, CATALOGUE_ENTITIES, CATALOGUE_MEMORY_BYTES, INDEX_BUILD_SECONDS,
+                            LOOKUP_SECONDS, LOOKUP_TOTAL, CATALOGUE_DOWNLOAD_SECONDS, CATALOGUE_DOWNLOAD_BYTES)
+from time import perf_counter, monotonic
+from random import uniform
+from math import ceil
+from ijson import JSONError
+import logging
+
+OFFICIAL_LIST_DATA_MODELS = ('https://raw.githubusercontent.com/smart-data-models/data-models/master/'
+                             'specs/AllSubjects/official_list_data_models.json')
+DATA_MODELS_METADATA = 'https://smartdatamodels.org/extra/datamodels_metadata.json'
+
+# Returned by __get_data__ when the server answers 304 Not Modified to a conditional request
+NOT_MODIFIED = object()
+
+# Default values of the catalogues.refresh section of the configuration
+REFRESH_TTL_SECONDS = 43200
+REFRESH_BACKOFF_INITIAL_SECONDS = 30
+REFRESH_BACKOFF_MAX_SECONDS = 3600
+REFRESH_MIN_ENTITIES_RATIO = 0.5
+
+# Default values of the catalogues.download section of the configuration
+DOWNLOAD_CONNECT_TIMEOUT_SECONDS = 1
+DOWNLOAD_READ_TIMEOUT_SECONDS = 1
+DOWNLOAD_RETRIES = 2
+DOWNLOAD_RETRY_BACKOFF_SECONDS = 0.5
+
+# Status codes of the upstream servers after which a download is retried, the others are final
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+# Default values of the catalogues.readiness section of the configuration
+READY_TIMEOUT_SECONDS = 1
+RETRY_AFTER_SECONDS = 5
+READY_COMMAND_TIMEOUT_SECONDS = 60
+
+
+class CatalogueNotReady(Exception):
+    """
+    Raised by the readers when no index has been loaded yet, instead of waiting for the first download without limit:
+    by AsyncSDMDescriptionFile after a short timeout and by SDMDescriptionFile once the first attempt failed
+    """
+    def __init__(self, retry_after: int):
+        super().__init__('The catalogues of the Data Models are not loaded yet')
+        self.retry_after = retry_after
+
+
+class BaseSDMDescriptionFile:
+    """
+    Catalogue state shared by the threaded (SDMDescriptionFile) and the asyncio (AsyncSDMDescriptionFile)
+    implementations: the sources, the index, the HTTP validators and the local snapshot. The subclasses only
+    provide the way the catalogues are downloaded and how the readers wait for the data.
+    """
+    def __init__(self, logger=None, snapshot_dir=None, shared_index_path=None, follower=False,
+                 official_list_data_models=None, data_models_metadata=None, export_file=None, source=None,
+                 offline=None):
+        config = load_config()
+        catalogues = config.get('catalogues', dict())
+
+        # Official file with all the information of the Data Models and metadata of the Data Models, each of them a
+        # URL, a file:// URL or a path. A source, a mirror or a local directory, replaces both, see resolve_sources.
+        self.official_list_data_models, self.data_models_metadata = resolve_sources(
+            official_list_data_models=(official_list_data_models or
+                                       catalogues.get('official_list_data_models', OFFICIAL_LIST_DATA_MODELS)),
+            data_models_metadata=data_models_metadata or catalogues.get('data_models_metadata', DATA_MODELS_METADATA),
+            source=source or catalogues.get('source'))
+
+        # In offline mode the remote catalogues are never downloaded, the local ones are still read
+        self.offline = catalogues.get('offline', False) if offline is None else offline
+
+        # File written by the export command, loaded instead of downloading the catalogues
+        self.export_file = export_file or catalogues.get('export_file')
+
+        # Lookup tables keyed by Entity Type, replaced as a whole on every refresh. The catalogues are not kept in
+        # memory once the index is built, the snapshot keeps them on disk.
+        self.index = None
+
+        # ETag/Last-Modified validators of the data currently loaded, sent in the conditional requests
+        self.validators = dict()
+
+        filename = join(dirname(dirname(__file__)), 'logs', 'app.log')
+
+        if logger is None:
+            logging.basicConfig(filename=filename,
+                                filemode='w',
+                                format='%(name)s - %(levelname)s - %(message)s',
+                                level=logging.DEBUG)
+            self.logger = logging.getLogger(type(self).__module__)
+        else:
+            self.logger = logger
+
+        # The index is revalidated when it is older than the TTL, and after a failed refresh it is retried with a
+        # jittered exponential backoff. The current index is served meanwhile.
+        refresh = catalogues.get('refresh', dict())
+        self.ttl = timedelta(seconds=refresh.get('ttl_seconds', REFRESH_TTL_SECONDS))
+        self.backoff_initial_seconds = refresh.get('backoff_initial_seconds', REFRESH_BACKOFF_INITIAL_SECONDS)
+        self.backoff_max_seconds = refresh.get('backoff_max_seconds', REFRESH_BACKOFF_MAX_SECONDS)
+        self.min_entities_ratio = refresh.get('min_entities_ratio', REFRESH_MIN_ENTITIES_RATIO)
+        self.failures = 0
+
+        # Both catalogues are downloaded at the same time. Each download is retried after timeouts, connection errors
+        # and RETRY_STATUS_CODES, waiting retry_backoff_seconds and then twice as long every time.
+        download = catalogues.get('download', dict())
+        self.connect_timeout_seconds = download.get('connect_timeout_seconds', DOWNLOAD_CONNECT_TIMEOUT_SECONDS)
+        self.read_timeout_seconds = download.get('read_timeout_seconds', DOWNLOAD_READ_TIMEOUT_SECONDS)
+        self.retries = download.get('retries', DOWNLOAD_RETRIES)
+        self.retry_backoff_seconds = download.get('retry_backoff_seconds', DOWNLOAD_RETRY_BACKOFF_SECONDS)
+
+        # Monotonic time of the next download attempt, set by the subclasses before they sleep
+        self.next_attempt = None
+
+        # Before the first index is loaded the readers wait at most timeout_seconds and are told to come back after
+        # retry_after_seconds, plus the backoff left if the download failed. The commands wait for the first attempt to
+        # load the catalogues, at most command_timeout_seconds.
+        readiness = catalogues.get('readiness', dict())
+        self.ready_timeout_seconds = readiness.get('timeout_seconds', READY_TIMEOUT_SECONDS)
+        self.retry_after_seconds = readiness.get('retry_after_seconds', RETRY_AFTER_SECONDS)
+        self.command_timeout_seconds = readiness.get('command_timeout_seconds', READY_COMMAND_TIMEOUT_SECONDS)
+
+        self.obtained_time = datetime.now()
+
+        # Local snapshot of the catalogues, used to serve requests before the first download finishes
+        if snapshot_dir is None:
+            snapshot_dir = config.get('cache', dict()).get('directory', join(dirname(dirname(__file__)), 'cache'))
+
+        self.snapshot_path = get_snapshot_path(snapshot_dir)
+
+        # Memory-mapped index shared with other processes. The process that downloads the catalogues writes it after
+        # every update, the followers only map it and never download anything.
+        self.shared_index_path = shared_index_path
+        self.follower = follower
+
+        if follower:
+            pass
+        elif self.export_file is not None:
+            self.__load_export__(current_time=datetime.now())
+        else:
+            self.__load_snapshot__()
+
+    def is_expired(self, current_time: datetime) -> bool:
+        return self.index is None or (current_time - self.obtained_time) >= self.ttl
+
+    def __refresh_due__(self, current_time: datetime) -> bool:
+        # A failed refresh is retried when its backoff ends, even if the current index has not expired yet
+        return self.failures > 0 or self.is_expired(current_time=current_time)
+
+    def __refresh_delay__(self, current_time: datetime) -> float:
+        """
+        Seconds to wait until the next refresh
+        :param current_time: The current time
+        :return: The time left until the index expires or, after failed refreshes, an exponential backoff with jitter,
+                 so several instances do not retry against the upstream servers at the same time
+        """
+        if self.failures > 0:
+            backoff = min(self.backoff_max_seconds, self.backoff_initial_seconds * 2 ** (self.failures - 1))
+            return uniform(backoff / 2, backoff)
+
+        if self.index is None:
+            return 0
+
+        return max(0.0, (self.obtained_time + self.ttl - current_time).total_seconds())
+
+    def retry_after(self) -> int:
+        """
+        Seconds after which a request rejected with CatalogueNotReady should be retried
+        """
+        delay = self.retry_after_seconds
+
+        if self.failures > 0 and self.next_attempt is not None:
+            delay += max(0.0, self.next_attempt - monotonic())
+
+        return ceil(delay)
+
+    def __retry_delay__(self, attempt: int) -> float:
+        """
+        Seconds to wait before the retry number attempt (1 for the first retry) of a download
+        """
+        return self.retry_backoff_seconds * 2 ** (attempt - 1)
+
+    def __refresh_result__(self, result: str) -> str:
+        CATALOGUE_REFRESH_TOTAL.inc(result)
+        self.failures = self.failures + 1 if result == 'failed' else 0
+
+        return result
+
+    def __conditional_headers__(self, url: str) -> dict:
+        headers = dict()
+        validators = self.validators.get(url) or dict()
+
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+
+        return headers
+
+    @staticmethod
+    def __response_validators__(headers) -> dict:
+        validators = dict()
+
+        if 'ETag' in headers:
+            validators['etag'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            validators['last_modified'] = headers['Last-Modified']
+
+        return validators
+
+    def __get_local_data__(self, url: str) -> tuple:
+        """
+        Read a catalogue from the local file system, see read_local
+        :param url: file:// URL or path of the catalogue
+        :return: Tuple with the catalogue projected to the fields of the index (NOT_MODIFIED if the file did not change,
+                 None in case of error) and the validators of the file
+        """
+        catalogue = self.__catalogue_name__(url=url)
+        start = perf_counter()
+
+        try:
+            data, validators, size = read_local(location=url, official_list=url == self.official_list_data_models,
+                                                validators=self.validators.get(url))
+        except OSError as e:
+            self.logger.error(f"Unable to read '{url}': {e}")
+            return None, None
+        except JSONError as e:
+            self.logger.error(f"JSONDecodeError: {e}")
+            return None, None
+        finally:
+            CATALOGUE_DOWNLOAD_SECONDS.observe(perf_counter() - start, catalogue)
+
+        if data is None:
+            return NOT_MODIFIED, validators
+
+        CATALOGUE_DOWNLOAD_BYTES.set(size, catalogue)
+
+        return data, validators
+
+    def __offline_data__(self, url: str) -> tuple:
+        """
+        Result of the download of a remote catalogue in offline mode: the data currently loaded, if any, is kept
+        """
+        if self.index is None:
+            self.logger.error(f"Offline mode, '{url}' is not downloaded and there is no data loaded")
+            return None, None
+
+        self.logger.info(f"Offline mode, '{url}' is not downloaded")
+
+        return NOT_MODIFIED, self.validators.get(url)
+
+    def __update_index__(self, official_list_data_models_data, official_list_validators,
+                         data_models_metadata_data, data_models_metadata_validators, current_time: datetime):
+        """
+        Replace the index with the downloaded catalogues, if both of them are valid
+        :param official_list_data_models_data: Downloaded official list, NOT_MODIFIED or None if the download failed
+        :param official_list_validators: HTTP validators of the official list
+        :param data_models_metadata_data: Downloaded metadata, NOT_MODIFIED or None if the download failed
+        :param data_models_metadata_validators: HTTP validators of the metadata
+        :param current_time: Time at which the download started
+        :return: Result of the refresh, 'updated', 'not_modified' or 'failed'
+        """
+        if official_list_data_models_data is NOT_MODIFIED and data_models_metadata_data is NOT_MODIFIED:
+            # The current index is still valid, nothing to parse or rebuild
+            self.obtained_time = datetime.now()
+            self.logger.info("Catalogues not modified since the last download")
+            return self.__refresh_result__('not_modified')
+
+        if official_list_data_models_data is NOT_MODIFIED or data_models_metadata_data is NOT_MODIFIED:
+            # Only one of them changed, the other one is read back from the snapshot
+            previous = self.__previous_catalogues__()
+
+            if previous is None:
+                self.logger.error("Unable to read the unchanged catalogue from the snapshot, keeping the current data")
+                self.validators = dict()
+                return self.__refresh_result__('failed')
+
+            if official_list_data_models_data is NOT_MODIFIED:
+                official_list_data_models_data = previous[0]
+                official_list_validators = self.validators.get(self.official_list_data_models)
+
+            if data_models_metadata_data is NOT_MODIFIED:
+                data_models_metadata_data = previous[1]
+                data_models_metadata_validators = self.validators.get(self.data_models_metadata)
+
+        if not isinstance(official_list_data_models_data, dict) or not isinstance(data_models_metadata_data, list):
+            self.logger.error("Unable to download the catalogues, keeping the current data")
+            return self.__refresh_result__('failed')
+
+        # The new index is built and validated apart, the readers keep using the current one until it is replaced in
+        # a single assignment
+        try:
+            # Only the fields used by the index are read, the downloaded documents are released once it is built
+            official_list_data_models_data, data_models_metadata_data = \
+                project_catalogues(official_list_data_models_data, data_models_metadata_data)
+
+            with INDEX_BUILD_SECONDS.time():
+                index = CatalogueIndex(official_list_data_models_data=official_list_data_models_data,
+                                       data_models_metadata_data=data_models_metadata_data)
+        except (KeyError, TypeError, AttributeError) as e:
+            self.logger.error(f"Invalid catalogues, keeping the current data: {e!r}")
+            return self.__refresh_result__('failed')
+
+        if not self.__is_valid__(index=index):
+            return self.__refresh_result__('failed')
+
+        self.index = index
+
+        CATALOGUE_ENTITIES.set(len(self.index))
+        self.__report_memory__()
+
+        self.validators = {
+            self.official_list_data_models: official_list_validators,
+            self.data_models_metadata: data_models_metadata_validators
+        }
+
+        self.obtained_time = datetime.now()
+
+        self.logger.info("Download complete!")
+        self.logger.info(f"Index built with {len(self.index)} Entity Types")
+        elapsed_time = self.obtained_time - current_time
+        self.logger.info(f"Total time: {elapsed_time.total_seconds():.2f} seconds")
+
+        self.__save_snapshot__(official_list_data_models_data=official_list_data_models_data,
+                               data_models_metadata_data=data_models_metadata_data)
+        self.__publish__()
+
+        return self.__refresh_result__('updated')
+
+    def __is_valid__(self, index: CatalogueIndex) -> bool:
+        """
+        Check a new index before it replaces the current one
+        :param index: The index built from the downloaded catalogues
+        :return: False if it has no Entity Types or lost more of them than allowed by min_entities_ratio, which
+                 usually means a truncated or wrong upstream document
+        """
+        if len(index) == 0:
+            self.logger.error("The catalogues have no Entity Types, keeping the current data")
+            return False
+
+        if self.index is not None and len(index) < self.min_entities_ratio * len(self.index):
+            self.logger.error(f"The catalogues have {len(index)} Entity Types, less than "
+                              f"{self.min_entities_ratio:.0%} of the current {len(self.index)}, "
+                              f"keeping the current data")
+            return False
+
+        return True
+
+    def memory_usage(self) -> dict:
+        """
+        Memory used by the index of the catalogues
+        :return: Dictionary with the bytes used by each component of the index
+        """
+        return dict() if self.index is None else self.index.memory_usage()
+
+    def __report_memory__(self):
+        for component, size in self.memory_usage().items():
+            CATALOGUE_MEMORY_BYTES.set(size, component)
+
+    def __catalogue_name__(self, url: str) -> str:
+        return 'official_list_data_models' if url == self.official_list_data_models else 'data_models_metadata'
+
+    @staticmethod
+    def __lookup__(index, entity_name: str, response: bool = False):
+        """
+        Resolve an Entity Type in the index, recording the time of the lookup and whether it was found
+        :param index: The index to search
+        :param entity_name: The name of the entity to search the links in GitHub
+        :param response: Return the serialized response instead of the list of links
+        """
+        start = perf_counter()
+
+        try:
+            if response:
+                result = index.get_response(entity_name=entity_name)
+            else:
+                result = index.get_data(entity_name=entity_name)
+        except KeyError:
+            LOOKUP_TOTAL.inc('miss')
+            raise
+        finally:
+            LOOKUP_SECONDS.observe(perf_counter() - start)
+
+        LOOKUP_TOTAL.inc('hit')
+
+        return result
+
+    @staticmethod
+    def __lookup_batch__(index, entity_names: list) -> dict:
+        result = index.get_data_batch(entity_names=entity_names)
+
+        found = sum(1 for x in result.values() if 'links' in x)
+        LOOKUP_TOTAL.inc('hit', amount=found)
+        LOOKUP_TOTAL.inc('miss', amount=len(result) - found)
+
+        return result
+
+    def __sources__(self) -> dict:
+        return {
+            'official_list_data_models': self.official_list_data_models,
+            'data_models_metadata': self.data_models_metadata
+        }
+
+    def __load_snapshot__(self):
+        try:
+            snapshot = load_snapshot(path=self.snapshot_path, sources=self.__sources__())
+
+            if snapshot is None:
+                self.logger.info(f"No catalogue snapshot available in '{self.snapshot_path}'")
+                return
+
+            official_list_data_models_data, data_models_metadata_data, obtained_time, validators = snapshot
+
+            with INDEX_BUILD_SECONDS.time():
+                index = CatalogueIndex(official_list_data_models_data=official_list_data_models_data,
+                                       data_models_metadata_data=data_models_metadata_data)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            # A malformed snapshot is ignored, the catalogues are downloaded as if there was none
+            self.logger.warning(f"Ignoring the catalogue snapshot '{self.snapshot_path}': {e}")
+            return
+
+        self.index, self.obtained_time, self.validators = index, obtained_time, validators
+
+        CATALOGUE_ENTITIES.set(len(self.index))
+        self.__report_memory__()
+
+        self.logger.info(f"Catalogue snapshot loaded from '{self.snapshot_path}', "
+                         f"downloaded at {self.obtained_time.isoformat()}")
+
+        self.__publish__()
+
+    def __load_export__(self, current_time: datetime) -> str:
+        """
+        Replace the index with the content of the export file, validated as a download
+        :param current_time: Time at which the load started
+        :return: Result of the refresh, 'updated' or 'failed'
+        """
+        # The readers of the export formats are only imported when the export file is the data source
+        from common.CatalogueExport import read_export, catalogues_from_export
+        from csv import Error as CSVError
+        from sqlite3 import DatabaseError
+
+        try:
+            official_list_data_models_data, data_models_metadata_data = \
+                catalogues_from_export(read_export(path=self.export_file))
+        except (OSError, ValueError, KeyError, TypeError, CSVError, DatabaseError) as e:
+            self.logger.error(f"Unable to read the export file '{self.export_file}': {e}")
+            return self.__refresh_result__('failed')
+
+        self.logger.info(f"Catalogues loaded from the export file '{self.export_file}'")
+
+        return self.__update_index__(official_list_data_models_data=official_list_data_models_data,
+                                     official_list_validators=None,
+                                     data_models_metadata_data=data_models_metadata_data,
+                                     data_models_metadata_validators=None,
+                                     current_time=current_time)
+
+    def __previous_catalogues__(self):
+        """
+        Read the catalogues of the current index from the snapshot
+        :return: Tuple with the official list and the metadata, or None if the snapshot is not the one of the index
+        """
+        try:
+            snapshot = load_snapshot(path=self.snapshot_path, sources=self.__sources__())
+        except ValueError as e:
+            self.logger.warning(f"Ignoring the catalogue snapshot '{self.snapshot_path}': {e}")
+            return None
+
+        if snapshot is None or snapshot[3] != self.validators:
+            return None
+
+        return snapshot[0], snapshot[1]
+
+    def __publish__(self):
+        if self.shared_index_path is None or self.follower:
+            return
+
+        try:
+            write_mapped_index(path=self.shared_index_path, index=self.index, fetched_at=self.obtained_time)
+        except OSError as e:
+            self.logger.error(f"Unable to write the shared index '{self.shared_index_path}': {e}")
+
+    def __save_snapshot__(self, official_list_data_models_data: dict, data_models_metadata_data: list):
+        try:
+            save_snapshot(path=self.snapshot_path,
+                          official_list_data_models_data=official_list_data_models_data,
+                          data_models_metadata_data=data_models_metadata_data,
+                          sources=self.__sources__(),
+                          fetched_at=self.obtained_time,
+                          validators=self.validators)
+        except OSError as e:
+            self.logger.error(f"Unable to write the catalogue snapshot '{self.snapshot_path}': {e}")
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from csv import writer, reader
+from io import StringIO, TextIOWrapper
+from gzip import open as gzip_open
+from zlib import compressobj, MAX_WBITS
+from sqlite3 import connect
+from os import unlink
+from os.path import join
+from tempfile import NamedTemporaryFile
+from orjson import dumps, loads
+from graphlib import TopologicalSorter, CycleError
+from heapq import merge
+from common.constants import FORMATS
+
+# Fields of each record of the export, one record per link of an Entity Type
+FIELDS = ('type', 'subject', 'repoLink', 'repo', 'yaml', 'jsonSchema')
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv', 'sqlite': 'application/vnd.sqlite3'}
+
+# Number of records serialized together in the chunks of the text formats
+CHUNK_RECORDS = 1000
+
+GZIP_MAGIC = b'\x1f\x8b'
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
+
+def export_records(index):
+    """
+    Iterate over the resolved links of the index, one record per link, sorted by Entity Type. The records are
+    produced from the precomputed responses as they are consumed, the whole export is never held in memory.
+
+    The Entity Types with incomplete metadata have no links, they are written with one record per repository that
+    lists them and the fields 'repo', 'yaml' and 'jsonSchema' empty, so they are incomplete again once imported.
+    :param index: A CatalogueIndex or a MappedCatalogueIndex
+    """
+    incomplete = sorted(index.incomplete)
+    repo_links = index.repo_links_of(entity_names=incomplete)
+
+    for entity_name in merge(index.names(), incomplete):
+        if entity_name in index.incomplete:
+            for repo_link in repo_links.get(entity_name, ()):
+                yield {
+                    'type': entity_name,
+                    'subject': index.subject_of(repo_link=repo_link),
+                    'repoLink': repo_link,
+                    'repo': '',
+                    'yaml': '',
+                    'jsonSchema': '',
+                }
+
+            continue
+
+        suffix = join('', 'tree', 'master', entity_name)
+
+        for link in index.get_data(entity_name=entity_name):
+            repo_link = link['repo'].removesuffix(suffix).removesuffix('/')
+
+            yield {
+                'type': entity_name,
+                'subject': index.subject_of(repo_link=repo_link),
+                'repoLink': repo_link,
+                'repo': link['repo'],
+                'yaml': link['yaml'],
+                'jsonSchema': link['jsonSchema'],
+            }
+
+
+def __batches__(records):
+    batch = list()
+
+    for record in records:
+        batch.append(record)
+
+        if len(batch) == CHUNK_RECORDS:
+            yield batch
+            batch = list()
+
+    if batch:
+        yield batch
+
+
+def iter_ndjson(records):
+    for batch in __batches__(records):
+        yield b''.join(dumps(x) + b'\n' for x in batch)
+
+
+def iter_csv(records):
+    buffer = StringIO()
+    csv_writer = writer(buffer, lineterminator='\n')
+    csv_writer.writerow(FIELDS)
+
+    for batch in __batches__(records):
+        csv_writer.writerows([record[x] for x in FIELDS] for record in batch)
+
+        yield buffer.getvalue().encode('utf-8')
+
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def write_sqlite(records, path: str, version: str):
+    """
+    Write the records to a SQLite database with the table links, indexed by Entity Type, and the table meta with the
+    version of the catalogues
+    """
+    connection = connect(path)
+
+    try:
+        connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute(f'CREATE TABLE links ({", ".join(f"{x} TEXT" for x in FIELDS)})')
+        connection.execute('INSERT INTO meta VALUES (?, ?)', ('version', version))
+
+        insert = f'INSERT INTO links VALUES ({", ".join("?" * len(FIELDS))})'
+        for batch in __batches__(records):
+            connection.executemany(insert, ([record[x] for x in FIELDS] for record in batch))
+
+        connection.execute('CREATE INDEX links_type ON links (type)')
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def iter_file(path: str, chunk_size: int = 64 * 1024, remove: bool = False):
+    try:
+        with open(path, 'rb') as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+    finally:
+        if remove:
+            unlink(path)
+
+
+def iter_gzip(chunks):
+    compressor = compressobj(wbits=MAX_WBITS | 16)
+
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+
+    yield compressor.flush()
+
+
+def iter_export(index, export_format: str, compress: bool = False, directory: str = None):
+    """
+    Serialize the resolved links of the index as a sequence of chunks. Nothing is done until the first chunk is
+    requested, so an export that is never consumed does not write the temporary database of the sqlite format.
+    :param index: A CatalogueIndex or a MappedCatalogueIndex
+    :param export_format: One of FORMATS
+    :param compress: Compress the chunks with gzip
+    :param directory: Directory of the temporary database of the sqlite format, which cannot be produced as a stream
+    :return: Iterator of bytes
+    :raise ValueError: If the format is unknown, when the first chunk is requested
+    """
+    records = export_records(index=index)
+
+    if export_format == 'ndjson':
+        chunks = iter_ndjson(records)
+    elif export_format == 'csv':
+        chunks = iter_csv(records)
+    elif export_format == 'sqlite':
+        with NamedTemporaryFile(dir=directory, prefix='.export-', suffix='.sqlite', delete=False) as file:
+            path = file.name
+
+        try:
+            write_sqlite(records=records, path=path, version=index.version)
+        except BaseException:
+            unlink(path)
+            raise
+
+        chunks = iter_file(path=path, remove=True)
+    else:
+        raise ValueError(f'Unknown export format {export_format}, it should be one of {", ".join(FORMATS)}')
+
+    yield from iter_gzip(chunks) if compress else chunks
+
+
+def read_export(path: str):
+    """
+    Iterate over the records of a file written by iter_export, in any of the formats and compressed or not
+    :param path: Path of the file
+    :raise ValueError: If the file is not an export
+    """
+    with open(path, 'rb') as file:
+        magic = file.read(len(SQLITE_MAGIC))
+
+    if magic.startswith(GZIP_MAGIC):
+        with gzip_open(path, 'rb') as file:
+            magic = file.read(len(SQLITE_MAGIC))
+
+        if magic == SQLITE_MAGIC:
+            # SQLite cannot read a compressed database, it is decompressed to a temporary file
+            with gzip_open(path, 'rb') as source, NamedTemporaryFile(prefix='.export-', suffix='.sqlite',
+                                                                     delete=False) as target:
+                while chunk := source.read(64 * 1024):
+                    target.write(chunk)
+
+            try:
+                yield from __read_sqlite__(target.name)
+            finally:
+                unlink(target.name)
+            return
+
+        opener = gzip_open
+    elif magic == SQLITE_MAGIC:
+        yield from __read_sqlite__(path)
+        return
+    else:
+        opener = open
+
+    with opener(path, 'rb') as file:
+        first = file.readline()
+
+        if first.startswith(b'{'):
+            yield loads(first)
+            for line in file:
+                if line.strip():
+                    yield loads(line)
+        elif first.strip() == ','.join(FIELDS).encode('utf-8'):
+            for row in reader(TextIOWrapper(file, encoding='utf-8', newline='')):
+                yield dict(zip(FIELDS, row))
+        else:
+            raise ValueError(f'{path} is not an export of the SDM catalogues')
+
+
+def __read_sqlite__(path: str):
+    connection = connect(path)
+
+    try:
+        yield from (dict(zip(FIELDS, row)) for row in connection.execute(f'SELECT {", ".join(FIELDS)} FROM links'))
+    finally:
+        connection.close()
+
+
+def catalogues_from_export(records) -> tuple:
+    """
+    Rebuild the catalogues from the records of an export, so it can be loaded as a CatalogueIndex
+    :param records: Iterator of records, e.g. read_export
+    :return: Tuple with the official list and the metadata, projected to the fields used by the index
+    :raise ValueError: If the order of the links of the Entity Types is not consistent with any official list
+    """
+    subjects = dict()
+    metadata = list()
+    order = TopologicalSorter()
+    previous = dict()
+
+    for record in records:
+        name = record['subject'] or record['repoLink']
+        subject = subjects.setdefault(name, {'name': name, 'repoLink': record['repoLink'], 'dataModels': []})
+        subject['dataModels'].append(record['type'])
+
+        # The records of the Entity Types with incomplete metadata have no link and no order, see export_records
+        if not record['repo']:
+            order.add(name)
+            continue
+
+        metadata.append({'dataModel': record['type'], 'yamlUrl': record['yaml'], 'jsonSchemaUrl': record['jsonSchema']})
+
+        # The index pairs the subjects of an Entity Type, in the order of the official list, with its metadata
+        # entries, in their order, so a subject must precede the next one that defines the same Entity Type
+        order.add(name, *((previous[record['type']],) if record['type'] in previous else ()))
+        previous[record['type']] = name
+
+    try:
+        official_list = [subjects[x] for x in order.static_order()]
+    except CycleError as e:
+        raise ValueError(f'Inconsistent order of the subjects {e.args[1]}')
+
+    return {'officialList': official_list}, metadata
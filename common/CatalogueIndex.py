@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from os.path import join
+from hashlib import sha256
+from orjson import dumps, loads
+from common.EntitySearch import EntitySearch
+from common.ReverseIndex import ReverseIndex
+from common.memory import deep_sizeof
+
+
+class CatalogueIndex:
+    def __init__(self, official_list_data_models_data: dict, data_models_metadata_data: list):
+        """
+        Build the lookup tables of the SDM catalogues keyed by Entity Type. The index is never modified once it is
+        built, a refresh creates a new instance that replaces the previous one in a single assignment.
+
+        The response of each Entity Type is a pure function of the catalogues, so the index only keeps the serialized
+        responses, the most compact form of the links, and get_data deserializes them. The catalogues themselves are
+        only read while the index is built.
+        :param official_list_data_models_data: Content of the official_list_data_models.json file
+        :param data_models_metadata_data: Content of the datamodels_metadata.json file
+        """
+        repos_by_entity = dict()
+        for subject in official_list_data_models_data['officialList']:
+            # The link of the repository is computed once per subject and shared by all its Entity Types
+            repo = subject['repoLink'].replace('.git', '')
+
+            # A subject is counted only once per Entity Type even if it lists it several times
+            for entity_name in dict.fromkeys(subject['dataModels']):
+                repos_by_entity.setdefault(entity_name, []).append(repo)
+
+        metadata_by_entity = dict()
+        for data_model in data_models_metadata_data:
+            metadata_by_entity.setdefault(data_model['dataModel'], []).append(data_model)
+
+        # The Entity Types with incomplete metadata are not precomputed, get_data raises IndexError for them
+        responses = dict()
+        incomplete = set()
+        for entity_name, repos in repos_by_entity.items():
+            data_model_metadata = metadata_by_entity.get(entity_name, [])
+
+            if len(data_model_metadata) < len(repos):
+                incomplete.add(entity_name)
+                continue
+
+            response = dumps([
+                {
+                    'repo': join(repo, 'tree', 'master', entity_name),
+                    'yaml': data_model['yamlUrl'],
+                    'jsonSchema': data_model['jsonSchemaUrl']
+                }
+                for repo, data_model in zip(repos, data_model_metadata)
+            ])
+
+            # orjson returns the bytes in a buffer of at least 1 KiB, the copy keeps only the document
+            responses[entity_name] = bytes(memoryview(response))
+
+        version = sha256()
+        for entity_name in sorted(responses):
+            version.update(entity_name.encode('utf-8'))
+            version.update(responses[entity_name])
+
+        # The Entity Types with incomplete metadata are part of the exports, so they change the version too
+        for entity_name in sorted(incomplete):
+            version.update(b'\0' + entity_name.encode('utf-8'))
+
+        self.responses = responses
+        self.incomplete = frozenset(incomplete)
+        self.entity_search = EntitySearch(repos_by_entity)
+        self.reverse = ReverseIndex.from_catalogues(official_list_data_models_data=official_list_data_models_data,
+                                                    data_models_metadata_data=data_models_metadata_data)
+        self.version = version.hexdigest()[:32]
+        self.etag = f'"{self.version}"'
+        self.memory = None
+
+    def __len__(self):
+        return len(self.responses) + len(self.incomplete)
+
+    def memory_usage(self) -> dict:
+        """
+        Memory used by the index, computed the first time it is requested
+        :return: Dictionary with the bytes used by the precomputed responses, the search structures and the reverse
+                 lookups. The Entity Types, shared by all of them, are counted in the responses.
+        """
+        if self.memory is None:
+            seen = set()
+
+            self.memory = {
+                'responses': deep_sizeof((self.responses, self.incomplete), seen=seen),
+                'search': deep_sizeof(self.entity_search, seen=seen),
+                'reverse': deep_sizeof(self.reverse, seen=seen),
+            }
+
+        return self.memory
+
+    def names(self):
+        """
+        Iterate over the Entity Types with links in alphabetical order
+        """
+        return iter(sorted(self.responses))
+
+    def get_data(self, entity_name: str) -> list:
+        """
+        Get the links of the Data Models that define the Entity Type
+        :param entity_name: The name of the entity to search the links in GitHub
+        :return: List of dictionaries with the keys 'repo', 'yaml' and 'jsonSchema'
+        """
+        return loads(self.get_response(entity_name=entity_name))
+
+    def get_response(self, entity_name: str) -> bytes:
+        """
+        Get the serialized response of get_data, precomputed when the index was built
+        :param entity_name: The name of the entity to search the links in GitHub
+        :return: JSON document with the list of links
+        """
+        try:
+            return self.responses[entity_name]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable values (e.g. a JSON object sent as type) cannot be an Entity Type
+            raise KeyError(f'No Data Models found for entity {entity_name}')
+
+        if entity_name in self.incomplete:
+            raise IndexError(f'Incomplete metadata for entity {entity_name}')
+
+        raise KeyError(f'No Data Models found for entity {entity_name}')
+
+    def get_data_batch(self, entity_names: list) -> dict:
+        """
+        Get the links of several Entity Types in one pass over the index
+        :param entity_names: The names of the entities to search the links in GitHub
+        :return: Dictionary keyed by Entity Type with either the key 'links' with the list of links or the key 'error'
+                 with the reason why they could not be obtained
+        """
+        response = dict()
+
+        for entity_name in entity_names:
+            if entity_name in response:
+                continue
+
+            try:
+                response[entity_name] = {'links': self.get_data(entity_name=entity_name)}
+            except KeyError as e:
+                response[entity_name] = {'error': e.args[0]}
+            except IndexError:
+                response[entity_name] = {'error': f'Incomplete metadata for entity {entity_name}'}
+
+        return response
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """
+        Search the Entity Types that match a query, see EntitySearch.search
+        """
+        return self.entity_search.search(query=query, limit=limit)
+
+    def suggest(self, entity_name: str, limit: int = 5) -> list:
+        """
+        Get the Entity Types that were most likely meant by one that does not exist, see EntitySearch.suggest
+        """
+        return self.entity_search.suggest(query=entity_name, limit=limit)
+
+    def lookup(self, kind: str, key: str, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Get the Entity Types of a subject, a repository or a JSON Schema URL, see ReverseIndex.lookup
+        """
+        return self.reverse.lookup(kind=kind, key=key, offset=offset, limit=limit)
+
+    def list_subjects(self, offset: int = 0, limit: int = None, prefix: str = '') -> tuple:
+        """
+        Get the names of the subjects, see ReverseIndex.list_subjects
+        """
+        return self.reverse.list_subjects(offset=offset, limit=limit, prefix=prefix)
+
+    def subject_of(self, repo_link: str):
+        """
+        Name of the subject of a repository, see ReverseIndex.subject_of
+        """
+        return self.reverse.subject_of(repo_link=repo_link)
+
+    def repo_links_of(self, entity_names) -> dict:
+        """
+        Get the repositories that list each of the Entity Types, see ReverseIndex.repo_links_of
+        """
+        return self.reverse.repo_links_of(entity_names=entity_names)
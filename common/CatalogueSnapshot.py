@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from json import dump, load, JSONDecodeError
+from os import makedirs, replace, fsync, unlink
+from os.path import join, dirname
+from tempfile import NamedTemporaryFile
+from datetime import datetime
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_FILENAME = 'catalogue.json'
+
+# Fields of the catalogues used to build the CatalogueIndex, the rest of the content is not stored
+OFFICIAL_LIST_FIELDS = ('name', 'repoLink', 'dataModels')
+METADATA_FIELDS = ('dataModel', 'yamlUrl', 'jsonSchemaUrl')
+
+
+def project(item: dict, fields: tuple) -> dict:
+    return {field: item[field] for field in fields if field in item}
+
+
+def project_catalogues(official_list_data_models_data: dict, data_models_metadata_data: list) -> tuple:
+    """
+    Keep only the fields of the catalogues used to build the CatalogueIndex and saved in the snapshot
+    :param official_list_data_models_data: Content of the official_list_data_models.json file
+    :param data_models_metadata_data: Content of the datamodels_metadata.json file
+    :return: Tuple with the projected official list and metadata
+    """
+    official_list = [project(x, OFFICIAL_LIST_FIELDS) for x in official_list_data_models_data['officialList']]
+    metadata = [project(x, METADATA_FIELDS) for x in data_models_metadata_data]
+
+    return {'officialList': official_list}, metadata
+
+
+def save_snapshot(path: str, official_list_data_models_data: dict, data_models_metadata_data: list,
+                  sources: dict, fetched_at: datetime, validators: dict):
+    """
+    Write the catalogues to the snapshot file. The content is written to a temporary file in the same directory
+    and renamed over the previous snapshot, so readers never see a partially written file.
+    :param path: Path of the snapshot file
+    :param official_list_data_models_data: Content of the official_list_data_models.json file
+    :param data_models_metadata_data: Content of the datamodels_metadata.json file
+    :param sources: URLs from which the catalogues were downloaded
+    :param fetched_at: Time at which the catalogues were downloaded
+    :param validators: ETag/Last-Modified validators of the downloaded catalogues, keyed by URL
+    """
+    snapshot = {
+        'meta': {
+            'format': SNAPSHOT_FORMAT,
+            'fetched_at': fetched_at.isoformat(),
+            'sources': sources,
+            'validators': validators
+        },
+        'officialList': [project(x, OFFICIAL_LIST_FIELDS) for x in official_list_data_models_data['officialList']],
+        'metadata': [project(x, METADATA_FIELDS) for x in data_models_metadata_data]
+    }
+
+    directory = dirname(path)
+    makedirs(directory, exist_ok=True)
+
+    with NamedTemporaryFile(mode='w', dir=directory, prefix='.catalogue-', suffix='.tmp', delete=False) as file:
+        try:
+            dump(snapshot, file, separators=(',', ':'))
+            file.flush()
+            fsync(file.fileno())
+        except BaseException:
+            file.close()
+            unlink(file.name)
+            raise
+
+    replace(file.name, path)
+
+
+def load_snapshot(path: str, sources: dict):
+    """
+    Read the catalogues from the snapshot file
+    :param path: Path of the snapshot file
+    :param sources: URLs of the catalogues, a snapshot downloaded from other URLs is discarded
+    :return: Tuple with the official list data, the metadata data, the download time and the HTTP validators, or
+             None if there is no usable snapshot
+    :raise ValueError: If the snapshot is of this format and these sources but its content is malformed, e.g.
+                       truncated or edited by hand
+    """
+    try:
+        with open(path) as file:
+            snapshot = load(file)
+    except (FileNotFoundError, JSONDecodeError, UnicodeDecodeError):
+        return None
+
+    try:
+        meta = snapshot.get('meta', dict())
+
+        if meta.get('format') != SNAPSHOT_FORMAT or meta.get('sources') != sources:
+            return None
+
+        official_list_data_models_data = {'officialList': snapshot['officialList']}
+        data_models_metadata_data = snapshot['metadata']
+        fetched_at = datetime.fromisoformat(meta['fetched_at'])
+        validators = meta.get('validators', dict())
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f'Malformed catalogue snapshot, {e!r}') from e
+
+    return official_list_data_models_data, data_models_metadata_data, fetched_at, validators
+
+
+def get_snapshot_path(directory: str) -> str:
+    return join(directory, SNAPSHOT_FILENAME)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from os import fstat
+from os.path import join, isfile, expanduser
+from mmap import mmap, ACCESS_READ
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from common.CatalogueStream import CatalogueStream, CHUNK_SIZE
+
+# Path of the catalogues in a checkout of https://github.com/smart-data-models/data-models. The metadata is published
+# in smartdatamodels.org, it is looked up in these paths of the directory in this order.
+DIRECTORY_OFFICIAL_LIST_DATA_MODELS = join('specs', 'AllSubjects', 'official_list_data_models.json')
+DIRECTORY_DATA_MODELS_METADATA = ('datamodels_metadata.json',
+                                  join('specs', 'AllSubjects', 'datamodels_metadata.json'),
+                                  join('extra', 'datamodels_metadata.json'))
+
+# Names of the catalogues in a mirror, a server or a directory that publishes both files side by side
+MIRROR_OFFICIAL_LIST_DATA_MODELS = 'official_list_data_models.json'
+MIRROR_DATA_MODELS_METADATA = 'datamodels_metadata.json'
+
+
+def is_remote(location: str) -> bool:
+    """
+    Check if the location of a catalogue is downloaded with HTTP(S) or read from the local file system
+    :param location: URL, file:// URL or path of the catalogue
+    """
+    return urlparse(location).scheme in ('http', 'https')
+
+
+def local_path(location: str) -> str:
+    """
+    Path in the local file system of a location that is not remote
+    :param location: file:// URL or path of the catalogue
+    """
+    if location.startswith('file:'):
+        return url2pathname(urlparse(location).path)
+
+    return expanduser(location)
+
+
+def resolve_sources(official_list_data_models: str, data_models_metadata: str, source: str = None) -> tuple:
+    """
+    Locations of the catalogues. A source, if provided, takes precedence over the individual locations.
+    :param official_list_data_models: URL, file:// URL or path of the official list
+    :param data_models_metadata: URL, file:// URL or path of the metadata
+    :param source: Base URL of a mirror that publishes both files, or a directory: a checkout of the data-models
+                   repository or a directory with both files
+    :return: Tuple with the locations of the official list and of the metadata
+    """
+    if source is None:
+        return official_list_data_models, data_models_metadata
+
+    if is_remote(source):
+        mirror = source.rstrip('/')
+        return f'{mirror}/{MIRROR_OFFICIAL_LIST_DATA_MODELS}', f'{mirror}/{MIRROR_DATA_MODELS_METADATA}'
+
+    directory = local_path(source)
+
+    if isfile(join(directory, MIRROR_OFFICIAL_LIST_DATA_MODELS)):
+        official_list_data_models = join(directory, MIRROR_OFFICIAL_LIST_DATA_MODELS)
+    else:
+        official_list_data_models = join(directory, DIRECTORY_OFFICIAL_LIST_DATA_MODELS)
+
+    # When none of them exists the first one is used, so reading it reports the missing file
+    candidates = [join(directory, x) for x in DIRECTORY_DATA_MODELS_METADATA]
+    data_models_metadata = next((x for x in candidates if isfile(x)), candidates[0])
+
+    return official_list_data_models, data_models_metadata
+
+
+def read_local(location: str, official_list: bool, validators: dict = None) -> tuple:
+    """
+    Read a catalogue from the local file system. The file is mapped in memory and parsed with CatalogueStream in
+    chunks of CHUNK_SIZE, as a download, so it is never read as a whole.
+    :param location: file:// URL or path of the catalogue
+    :param official_list: True for the official list, False for the metadata
+    :param validators: Validators of the data currently loaded, the file is not parsed if they did not change
+    :return: Tuple with the projected catalogue, None if the file did not change, the validators of the file and the
+             number of bytes read
+    :raise OSError: If the file cannot be read
+    :raise JSONError: If the file is not a valid catalogue
+    """
+    with open(local_path(location), 'rb') as file:
+        status = fstat(file.fileno())
+
+        # A file rewritten in place or replaced by another one changes its modification time or its size
+        file_validators = {'etag': f'"{status.st_mtime_ns:x}-{status.st_size:x}"'}
+
+        if validators == file_validators:
+            return None, file_validators, 0
+
+        stream = CatalogueStream(official_list=official_list)
+
+        # An empty file cannot be mapped, close() reports it as an invalid catalogue
+        if status.st_size > 0:
+            with mmap(file.fileno(), 0, access=ACCESS_READ) as mapped:
+                for offset in range(0, len(mapped), CHUNK_SIZE):
+                    stream.feed(mapped[offset:offset + CHUNK_SIZE])
+
+        return stream.close(), file_validators, stream.size
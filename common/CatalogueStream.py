@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from ijson import items_coro, JSONError
+from ijson.utils import sendable_list
+from common.CatalogueSnapshot import project, OFFICIAL_LIST_FIELDS, METADATA_FIELDS
+
+# Size of the chunks read from the HTTP responses
+CHUNK_SIZE = 64 * 1024
+
+
+class CatalogueStream:
+    def __init__(self, official_list: bool):
+        """
+        Incremental parser of a catalogue, fed with the chunks of the HTTP response as they are received. Every Data
+        Model is projected to the fields used by the index as soon as it is complete, so neither the whole body nor
+        the whole parsed document are held in memory, only the projected catalogue and the chunk being parsed.
+        :param official_list: True for the official_list_data_models.json file, False for datamodels_metadata.json
+        """
+        self.official_list = official_list
+        self.fields = OFFICIAL_LIST_FIELDS if official_list else METADATA_FIELDS
+        self.items = list()
+        self.size = 0
+
+        self.pending = sendable_list()
+        self.parser = items_coro(self.pending, 'officialList.item' if official_list else 'item', use_float=True)
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        self.parser.send(chunk)
+        self.__project__()
+
+    def close(self):
+        """
+        Finish the parsing
+        :return: The projected catalogue, with the same structure as the original document
+        :raise JSONError: If the document is not valid JSON or has no Data Models
+        """
+        self.parser.close()
+        self.__project__()
+
+        # A document with another structure produces no items, an empty catalogue is never a valid one
+        if len(self.items) == 0:
+            raise JSONError('No Data Models found in the catalogue')
+
+        return {'officialList': self.items} if self.official_list else self.items
+
+    def __project__(self):
+        for item in self.pending:
+            if isinstance(item, dict):
+                self.items.append(project(item, self.fields))
+
+        del self.pending[:]
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import nsmallest
+
+# Characters ignored when comparing Entity Types, e.g. weather_observed matches WeatherObserved
+SEPARATORS = str.maketrans('', '', ' _-.')
+
+
+def normalize(name: str) -> str:
+    return name.casefold().translate(SEPARATORS)
+
+
+def trigrams(key: str) -> set:
+    padded = f'^{key}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def default_max_distance(key: str) -> int:
+    if len(key) <= 4:
+        return 1
+    if len(key) <= 8:
+        return 2
+    return 3
+
+
+def edit_distance(key: str):
+    """
+    Edit distance to a fixed string with the bit-parallel algorithm of Myers, the cost of each comparison only depends
+    on the length of the other string
+    :param key: The fixed string
+    :return: Function that receives a string and returns its edit distance to key
+    """
+    length = len(key)
+    mask = (1 << length) - 1
+    last = 1 << (length - 1) if length else 0
+
+    peq = dict()
+    for i, c in enumerate(key):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    def distance(other: str) -> int:
+        if not length:
+            return len(other)
+
+        pv, mv, score = mask, 0, length
+
+        for c in other:
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+
+        return score
+
+    return distance
+
+
+class EntitySearch:
+    def __init__(self, entity_names):
+        """
+        Search structures over the Entity Types of the catalogues, built once per version of the catalogues: a map of
+        the normalized (case-folded, without separators) names, the sorted normalized names for prefix searches and
+        an inverted index of trigrams that selects the candidates of the edit distance searches.
+        :param entity_names: The Entity Types of the catalogues
+        """
+        by_key = dict()
+        for entity_name in entity_names:
+            by_key.setdefault(normalize(entity_name), []).append(entity_name)
+
+        self.keys = sorted(by_key)
+        self.names = [tuple(sorted(by_key[x])) for x in self.keys]
+        self.positions = {key: position for position, key in enumerate(self.keys)}
+
+        postings = dict()
+        gram_counts = list()
+        for position, key in enumerate(self.keys):
+            grams = trigrams(key)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+
+        by_length = dict()
+        for position, key in enumerate(self.keys):
+            by_length.setdefault(len(key), []).append(position)
+
+        # Positions packed in arrays of 4 bytes per item instead of lists of references to int objects
+        self.postings = {gram: array('I', x) for gram, x in postings.items()}
+        self.gram_counts = array('H', gram_counts)
+        self.by_length = {length: array('I', x) for length, x in by_length.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __prefix__(self, key: str, limit: int) -> list:
+        positions = list()
+        position = bisect_left(self.keys, key)
+
+        while position < len(self.keys) and self.keys[position].startswith(key) and len(positions) < limit:
+            positions.append(position)
+            position += 1
+
+        # The shortest completions are the most likely ones
+        return sorted(positions, key=lambda x: (len(self.keys[x]), self.keys[x]))
+
+    def __fuzzy__(self, key: str, max_distance: int, limit: int) -> list:
+        grams = trigrams(key)
+        required = len(grams) - 3 * max_distance
+
+        postings = sorted((self.postings.get(x, ()) for x in grams), key=len)
+        selected = None
+
+        if required > 0:
+            # A name that shares the required number of trigrams contains at least one of the 3 * max_distance + 1
+            # rarest ones. When they select few names it is cheaper to compare their trigrams than to traverse the
+            # long posting lists of the most common trigrams.
+            selected = set().union(*postings[:3 * max_distance + 1])
+            if len(selected) * len(key) > sum(len(x) for x in postings):
+                selected = None
+
+        if selected is not None:
+            counts = {x: len(grams & trigrams(self.keys[x])) for x in selected}
+        else:
+            counts = Counter()
+            for posting in postings:
+                counts.update(posting)
+
+        # Each edit changes at most three trigrams and the length by one at most, which bounds the distance from below
+        candidates = list()
+        for position, shared in counts.items():
+            missing = max(len(grams), self.gram_counts[position]) - shared
+            candidates.append((max((missing + 2) // 3, abs(len(self.keys[position]) - len(key))), position))
+
+        if required <= 0:
+            # Short keys can be within max_distance of names without any trigram in common
+            for length in range(max(0, len(key) - max_distance), len(key) + max_distance + 1):
+                candidates.extend((abs(length - len(key)), x)
+                                  for x in self.by_length.get(length, ()) if x not in counts)
+
+        candidates.sort(key=lambda x: (x[0], abs(len(self.keys[x[1]]) - len(key)), self.keys[x[1]]))
+
+        distance_to = edit_distance(key)
+        matches = list()
+        worst = max_distance + 1
+        for lower_bound, position in candidates:
+            # The remaining candidates cannot be closer than the ones already found
+            if lower_bound >= worst:
+                break
+
+            distance = distance_to(self.keys[position])
+            if distance <= max_distance:
+                matches.append((distance, position))
+
+                if len(matches) >= limit:
+                    worst = nsmallest(limit, (x[0] for x in matches))[-1]
+
+        return sorted(matches, key=lambda x: (x[0], abs(len(self.keys[x[1]]) - len(key)), self.keys[x[1]]))
+
+    def search(self, query: str, limit: int = 10, max_distance: int = None) -> list:
+        """
+        Search the Entity Types that match a query
+        :param query: Entity Type, part of it or a misspelled one
+        :param limit: Maximum number of results
+        :param max_distance: Maximum edit distance of the fuzzy matches, by default it depends on the query length
+        :return: List of dictionaries with the keys 'type', 'match' ('exact', 'normalized', 'prefix' or 'fuzzy') and
+                 'distance', ranked from the best match
+        """
+        if not isinstance(query, str) or limit < 1:
+            return list()
+
+        key = normalize(query)
+        if not key:
+            return list()
+
+        if max_distance is None:
+            max_distance = default_max_distance(key)
+
+        results = dict()
+
+        def add(position, match, distance):
+            for entity_name in self.names[position]:
+                if len(results) < limit and entity_name not in results:
+                    results[entity_name] = {'type': entity_name, 'match': match, 'distance': distance}
+
+        position = self.positions.get(key)
+        if position is not None:
+            if query in self.names[position]:
+                results[query] = {'type': query, 'match': 'exact', 'distance': 0}
+
+            add(position, 'normalized', 0)
+
+        for position in self.__prefix__(key, limit=limit):
+            add(position, 'prefix', len(self.keys[position]) - len(key))
+
+        if len(results) < limit:
+            for distance, position in self.__fuzzy__(key, max_distance=max_distance, limit=limit):
+                add(position, 'fuzzy', distance)
+
+        return list(results.values())
+
+    def suggest(self, query: str, limit: int = 5) -> list:
+        """
+        Get the Entity Types that the client most likely meant
+        :param query: Entity Type that was not found
+        :param limit: Maximum number of suggestions
+        :return: List of Entity Types
+        """
+        return [x['type'] for x in self.search(query=query, limit=limit + 1) if x['type'] != query][:limit]
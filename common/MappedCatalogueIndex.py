@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from json import dumps, loads
+from os import makedirs, replace, fsync, unlink, fstat
+from os.path import dirname
+from tempfile import NamedTemporaryFile
+from datetime import datetime
+from itertools import chain
+from orjson import loads as orjson_loads
+from common.EntitySearch import EntitySearch
+from common.ReverseIndex import ReverseIndex
+from common.memory import deep_sizeof
+
+MAGIC = b'SDMIDX01'
+MAPPED_INDEX_FILENAME = 'catalogue.idx'
+
+# Header: magic, length of the JSON metadata, number of entries
+HEADER = Struct('<8sII')
+
+# Entry: offset and length of the Entity Type, offset and length of its serialized response
+ENTRY = Struct('<IIII')
+
+
+def write_mapped_index(path: str, index, fetched_at: datetime):
+    """
+    Write the precomputed responses of a CatalogueIndex to a file that can be memory-mapped by other processes. The
+    entries are sorted by Entity Type so the readers can binary search them without building any structure in memory.
+    The Entity Types with incomplete metadata, which have no response, are kept in the JSON metadata and the reverse
+    lookups are appended at the end of the file. The file is written to a temporary file and renamed over the previous
+    one.
+    :param path: Path of the index file
+    :param index: The CatalogueIndex to write
+    :param fetched_at: Time at which the catalogues were downloaded
+    """
+    reverse = index.reverse.dumps()
+    meta = dumps({'version': index.version, 'fetched_at': fetched_at.isoformat(),
+                  'reverse_length': len(reverse), 'incomplete': sorted(index.incomplete)}).encode('utf-8')
+
+    keys = sorted(x.encode('utf-8') for x in index.responses)
+    entries = list()
+    blob = bytearray()
+    offset = HEADER.size + len(meta) + ENTRY.size * len(keys)
+
+    for key in keys:
+        value = index.responses[key.decode('utf-8')]
+
+        entries.append(ENTRY.pack(offset + len(blob), len(key), offset + len(blob) + len(key), len(value)))
+        blob += key
+        blob += value
+
+    directory = dirname(path)
+    makedirs(directory, exist_ok=True)
+
+    with NamedTemporaryFile(dir=directory, prefix='.catalogue-', suffix='.tmp', delete=False) as file:
+        try:
+            file.write(HEADER.pack(MAGIC, len(meta), len(keys)))
+            file.write(meta)
+            file.write(b''.join(entries))
+            file.write(blob)
+            file.write(reverse)
+            file.flush()
+            fsync(file.fileno())
+        except BaseException:
+            file.close()
+            unlink(file.name)
+            raise
+
+    replace(file.name, path)
+
+
+class MappedCatalogueIndex:
+    """
+    Read-only view of an index file written by write_mapped_index. The file is memory-mapped, so all the processes
+    that open it share the same pages and the lookups only copy the bytes of the response they return.
+    """
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self.mm = mmap(file.fileno(), 0, access=ACCESS_READ)
+            self.inode = fstat(file.fileno()).st_ino
+
+        magic, meta_length, count = HEADER.unpack_from(self.mm, 0)
+
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an SDM catalogue index file')
+
+        meta = loads(self.mm[HEADER.size:HEADER.size + meta_length])
+
+        self.path = path
+        self.count = count
+        self.entries_offset = HEADER.size + meta_length
+        self.version = meta['version']
+        self.etag = f'"{self.version}"'
+        self.fetched_at = datetime.fromisoformat(meta['fetched_at'])
+        self.reverse_length = meta.get('reverse_length', 0)
+        self.incomplete = frozenset(meta.get('incomplete', ()))
+        self.entity_search = None
+        self.reverse = None
+
+    def __len__(self):
+        return self.count + len(self.incomplete)
+
+    def __find__(self, key: bytes):
+        low, high = 0, self.count
+
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, value_offset, value_length = \
+                ENTRY.unpack_from(self.mm, self.entries_offset + middle * ENTRY.size)
+            current = self.mm[key_offset:key_offset + key_length]
+
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return value_offset, value_length
+
+        return None
+
+    def names(self):
+        """
+        Iterate over the Entity Types of the index in alphabetical order
+        """
+        for position in range(self.count):
+            key_offset, key_length, _, _ = ENTRY.unpack_from(self.mm, self.entries_offset + position * ENTRY.size)
+            yield self.mm[key_offset:key_offset + key_length].decode('utf-8')
+
+    def get_response(self, entity_name: str) -> bytes:
+        """
+        Get the serialized links of an Entity Type
+        :param entity_name: The name of the entity to search the links in GitHub
+        :return: JSON document with the list of links
+        """
+        position = self.__find__(entity_name.encode('utf-8')) if isinstance(entity_name, str) else None
+
+        if position is None:
+            if isinstance(entity_name, str) and entity_name in self.incomplete:
+                raise IndexError(f'Incomplete metadata for entity {entity_name}')
+
+            raise KeyError(f'No Data Models found for entity {entity_name}')
+
+        value_offset, value_length = position
+
+        return self.mm[value_offset:value_offset + value_length]
+
+    def get_data(self, entity_name: str) -> list:
+        """
+        Get the links of the Data Models that define the Entity Type
+        :param entity_name: The name of the entity to search the links in GitHub
+        :return: List of dictionaries with the keys 'repo', 'yaml' and 'jsonSchema'
+        """
+        return orjson_loads(self.get_response(entity_name=entity_name))
+
+    def get_data_batch(self, entity_names: list) -> dict:
+        """
+        Get the links of several Entity Types
+        :param entity_names: The names of the entities to search the links in GitHub
+        :return: Dictionary keyed by Entity Type with either the key 'links' or the key 'error'
+        """
+        response = dict()
+
+        for entity_name in entity_names:
+            if entity_name in response:
+                continue
+
+            try:
+                response[entity_name] = {'links': self.get_data(entity_name=entity_name)}
+            except KeyError as e:
+                response[entity_name] = {'error': e.args[0]}
+            except IndexError:
+                response[entity_name] = {'error': f'Incomplete metadata for entity {entity_name}'}
+
+        return response
+
+    def memory_usage(self) -> dict:
+        """
+        Memory used by the index. The mapped file is shared by all the processes that map it, only the search
+        structures and the reverse lookups, built on first use, are private to the process.
+        :return: Dictionary with the bytes of the mapped file, the search structures and the reverse lookups
+        """
+        return {
+            'mapped': len(self.mm),
+            'search': 0 if self.entity_search is None else deep_sizeof(self.entity_search),
+            'reverse': 0 if self.reverse is None else deep_sizeof(self.reverse),
+        }
+
+    def __entity_search__(self) -> EntitySearch:
+        # Built in the first search, the processes that never search do not pay for it
+        if self.entity_search is None:
+            self.entity_search = EntitySearch(chain(self.names(), self.incomplete))
+
+        return self.entity_search
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """
+        Search the Entity Types that match a query, see EntitySearch.search
+        """
+        return self.__entity_search__().search(query=query, limit=limit)
+
+    def suggest(self, entity_name: str, limit: int = 5) -> list:
+        """
+        Get the Entity Types that were most likely meant by one that does not exist, see EntitySearch.suggest
+        """
+        return self.__entity_search__().suggest(query=entity_name, limit=limit)
+
+    def __reverse__(self) -> ReverseIndex:
+        # Loaded in the first reverse lookup, like the search structures
+        if self.reverse is None:
+            self.reverse = ReverseIndex.loads(self.mm[len(self.mm) - self.reverse_length:] if self.reverse_length
+                                              else b'{}')
+
+        return self.reverse
+
+    def lookup(self, kind: str, key: str, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Get the Entity Types of a subject, a repository or a JSON Schema URL, see ReverseIndex.lookup
+        """
+        return self.__reverse__().lookup(kind=kind, key=key, offset=offset, limit=limit)
+
+    def list_subjects(self, offset: int = 0, limit: int = None, prefix: str = '') -> tuple:
+        """
+        Get the names of the subjects, see ReverseIndex.list_subjects
+        """
+        return self.__reverse__().list_subjects(offset=offset, limit=limit, prefix=prefix)
+
+    def subject_of(self, repo_link: str):
+        """
+        Name of the subject of a repository, see ReverseIndex.subject_of
+        """
+        return self.__reverse__().subject_of(repo_link=repo_link)
+
+    def repo_links_of(self, entity_names) -> dict:
+        """
+        Get the repositories that list each of the Entity Types, see ReverseIndex.repo_links_of
+        """
+        return self.__reverse__().repo_links_of(entity_names=entity_names)
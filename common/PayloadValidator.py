@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from os import cpu_count
+from threading import Lock
+from orjson import loads, JSONDecodeError
+from jsonschema.validators import validator_for, Draft7Validator
+from jsonschema.exceptions import SchemaError
+from referencing.exceptions import Unresolvable
+from common.metrics import VALIDATOR_CACHE_TOTAL
+import asyncio
+
+# Maximum number of errors reported per payload
+MAX_ERRORS = 10
+
+# Number of lines of a stream validated together, in the calling process or in one task of the pool
+CHUNK_LINES = 1000
+
+# Compiled validators kept in memory by each process, by content hash of the schema
+VALIDATOR_ENTRIES = 256
+
+# Maximum length of a line of a stream, longer lines are not kept in memory and are reported as invalid
+MAX_LINE_BYTES = 1024 * 1024
+
+# Content hash -> compiled validator, or the SchemaError of an invalid schema. Each process of the pool keeps its own.
+__validators__ = OrderedDict()
+__validators_lock__ = Lock()
+
+
+def compiled_validator(content_hash: str, document: bytes, lookups: dict):
+    """
+    Get the validator of a JSON Schema, compiled the first time it is requested in this process
+    :param content_hash: Hash of the document, e.g. the ETag of SchemaCache
+    :param document: Serialized JSON Schema, with its $ref resolved
+    :param lookups: Dictionary with the number of lookups by result ('hit' or 'miss'), updated with this one. The
+                    lookups are counted by the caller, the processes of the pool do not report metrics.
+    :raise SchemaError: If the document is not a valid JSON Schema
+    """
+    # The validators of a stream of one process are shared by the threads of asyncio.to_thread
+    with __validators_lock__:
+        validator = __validators__.get(content_hash)
+
+        if validator is not None:
+            __validators__.move_to_end(content_hash)
+
+    if validator is None:
+        lookups['miss'] = lookups.get('miss', 0) + 1
+
+        try:
+            schema = loads(document)
+            if not isinstance(schema, (dict, bool)):
+                raise SchemaError(f'{type(schema).__name__} is not an object')
+
+            # The SDM schemas declare the unversioned meta-schema, they are written for draft 7
+            validator_class = validator_for(schema, default=Draft7Validator)
+            validator_class.check_schema(schema)
+            validator = validator_class(schema, format_checker=validator_class.FORMAT_CHECKER)
+        except (JSONDecodeError, SchemaError) as e:
+            validator = SchemaError(f'Invalid JSON Schema: {getattr(e, "message", e)}')
+
+        with __validators_lock__:
+            __validators__[content_hash] = validator
+
+            while len(__validators__) > VALIDATOR_ENTRIES:
+                __validators__.popitem(last=False)
+    else:
+        lookups['hit'] = lookups.get('hit', 0) + 1
+
+    if isinstance(validator, SchemaError):
+        raise validator
+
+    return validator
+
+
+def validate_payload(payload, schemas: list, lookups: dict) -> dict:
+    """
+    Validate an entity against the JSON Schemas of its type. It is valid if it is valid against any of them, when
+    several subjects define the type.
+    :param payload: The parsed entity
+    :param schemas: List of tuples with the content hash, the serialized document and the URL of each JSON Schema
+    :param lookups: See compiled_validator
+    :return: Dictionary with the key 'valid' and, if it is not valid, the key 'errors' with the errors found against
+             the first JSON Schema, each of them with the keys 'path', 'message' and 'jsonSchema'
+    """
+    errors = list()
+
+    for content_hash, document, url in schemas:
+        try:
+            validator = compiled_validator(content_hash, document, lookups)
+            found = [{'path': '/' + '/'.join(str(x) for x in error.absolute_path), 'message': error.message,
+                      'jsonSchema': url}
+                     for error in islice(validator.iter_errors(payload), MAX_ERRORS)]
+        except (SchemaError, Unresolvable) as e:
+            found = [{'path': '/', 'message': str(e), 'jsonSchema': url}]
+
+        if not found:
+            return {'valid': True}
+
+        errors = errors or found
+
+    return {'valid': False, 'errors': errors}
+
+
+class LongLine:
+    """
+    Line of a stream longer than the maximum length, yielded by iter_lines in place of its content
+    """
+    def __init__(self, length: int, max_length: int):
+        self.length = length
+        self.max_length = max_length
+
+
+def parse_line(line):
+    """
+    Parse a line of an NDJSON stream
+    :param line: The content of the line, or a LongLine
+    :return: Tuple with the payload and its type, or None and the error of the line
+    """
+    if isinstance(line, LongLine):
+        return None, f'The line has {line.length} bytes, the maximum is {line.max_length}'
+
+    try:
+        payload = loads(line)
+    except JSONDecodeError as e:
+        return None, f'Invalid JSON: {e}'
+
+    if not isinstance(payload, dict) or not isinstance(payload.get('type'), str):
+        return None, "The payload must be a JSON object with the key 'type' and the value of an Entity Type"
+
+    return payload, payload['type']
+
+
+def parse_lines(lines: list) -> list:
+    """
+    Parse a chunk of lines of an NDJSON stream, see parse_line
+    :param lines: List of tuples with the number of the line and its content
+    :return: List of tuples with the number of the line, the payload or None and its type or the error of the line
+    """
+    return [(number, *parse_line(line)) for number, line in lines]
+
+
+def validate_lines(entries: list, schemas_by_type: dict) -> tuple:
+    """
+    Validate a chunk of parsed lines of an NDJSON stream. It only depends on its arguments, so it runs in the
+    processes of the pool, which keep the compiled validators between chunks.
+    :param entries: List of tuples with the number of the line, the payload or None and its type or the error of the
+                    line, see parse_lines
+    :param schemas_by_type: Dictionary keyed by Entity Type with the JSON Schemas, see validate_payload, or the error
+                            that prevented obtaining them
+    :return: Tuple with the list of the result of each line, see validate_payload, with the keys 'line' and 'type' or
+             'error', and the lookups of the compiled validators, see compiled_validator
+    """
+    results = list()
+    lookups = dict()
+
+    for number, payload, entity_type in entries:
+        if payload is None:
+            results.append({'line': number, 'valid': False, 'error': entity_type})
+            continue
+
+        schemas = schemas_by_type[entity_type]
+
+        if isinstance(schemas, str):
+            results.append({'line': number, 'type': entity_type, 'valid': False, 'error': schemas})
+        else:
+            results.append({'line': number, 'type': entity_type, **validate_payload(payload, schemas, lookups)})
+
+    return results, lookups
+
+
+class PayloadValidator:
+    """
+    Validation of NGSI-LD entities against the JSON Schemas of their type. The JSON Schemas are obtained with a
+    resolver, e.g. from the SchemaCache with their $ref inlined, and compiled once per content hash. The streams are
+    validated in chunks of CHUNK_LINES lines, in parallel in a process pool when they are large, with a bounded number
+    of chunks in memory.
+    """
+    def __init__(self, workers: int = None, min_parallel: int = 2 * CHUNK_LINES, max_pending: int = None):
+        """
+        :param workers: Number of processes of the pool, by default the number of CPUs
+        :param min_parallel: Number of lines read from a stream before its chunks are sent to the pool, shorter streams
+                             are validated in a thread of this process
+        :param max_pending: Maximum number of chunks read and not written yet, by default twice the number of workers
+        """
+        self.workers = workers
+        self.min_parallel = min_parallel
+        self.max_pending = max_pending
+        self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def validate(self, payload, resolve) -> dict:
+        """
+        Validate one entity
+        :param payload: The parsed entity
+        :param resolve: Coroutine function that receives an Entity Type and returns its JSON Schemas, see
+                        validate_payload, raising KeyError if it does not exist or ValueError if they cannot be obtained
+        :return: The result of the validation, see validate_payload, or a dictionary with the key 'error'
+        """
+        if not isinstance(payload, dict) or not isinstance(payload.get('type'), str):
+            return {'valid': False,
+                    'error': "The payload must be a JSON object with the key 'type' and the value of an Entity Type"}
+
+        schemas = await self.__schemas__(entity_type=payload['type'], resolve=resolve)
+
+        if isinstance(schemas, str):
+            return {'type': payload['type'], 'valid': False, 'error': schemas}
+
+        lookups = dict()
+        result = await asyncio.to_thread(validate_payload, payload, schemas, lookups)
+        self.__count__(lookups=lookups)
+
+        return {'type': payload['type'], **result}
+
+    async def validate_stream(self, lines, resolve):
+        """
+        Validate the entities of an NDJSON stream, one per line
+        :param lines: Asynchronous iterator of the lines of the stream, e.g. iter_lines
+        :param resolve: See validate
+        :return: Asynchronous iterator of the result of each non-empty line, in the order of the stream
+        """
+        schemas_by_type = dict()
+        pending = list()
+        read = 0
+        max_pending = self.max_pending or 2 * (self.workers or cpu_count() or 1)
+        loop = asyncio.get_running_loop()
+
+        async for chunk in self.__chunks__(lines=lines):
+            read += len(chunk)
+
+            # Each line is parsed once, before sending the chunk, to obtain the schemas of its types. Only they are sent
+            # with the parsed payloads.
+            entries = await asyncio.to_thread(parse_lines, chunk)
+            types = {entity_type for _, payload, entity_type in entries if payload is not None}
+
+            for entity_type in types - schemas_by_type.keys():
+                schemas_by_type[entity_type] = await self.__schemas__(entity_type=entity_type, resolve=resolve)
+
+            types = {x: schemas_by_type[x] for x in types}
+
+            if read > self.min_parallel:
+                pending.append(loop.run_in_executor(self.__pool__(), validate_lines, entries, types))
+            else:
+                pending.append(asyncio.ensure_future(asyncio.to_thread(validate_lines, entries, types)))
+
+            # Only max_pending chunks are kept in memory, the oldest one is written before reading another one
+            while len(pending) >= max_pending:
+                results, lookups = await pending.pop(0)
+                self.__count__(lookups=lookups)
+
+                for result in results:
+                    yield result
+
+        for future in pending:
+            results, lookups = await future
+            self.__count__(lookups=lookups)
+
+            for result in results:
+                yield result
+
+    @staticmethod
+    async def __chunks__(lines):
+        chunk = list()
+        number = 0
+
+        async for line in lines:
+            number += 1
+
+            if isinstance(line, LongLine) or line.strip():
+                chunk.append((number, line))
+
+            if len(chunk) == CHUNK_LINES:
+                yield chunk
+                chunk = list()
+
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def __count__(lookups: dict):
+        for result, amount in lookups.items():
+            VALIDATOR_CACHE_TOTAL.inc(result, amount=amount)
+
+    @staticmethod
+    async def __schemas__(entity_type: str, resolve):
+        try:
+            return await resolve(entity_type)
+        except KeyError:
+            return f'No Data Models found for entity {entity_type}'
+        except ValueError as e:
+            return str(e)
+
+    def __pool__(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        return self.pool
+
+
+async def iter_lines(chunks, max_length: int = MAX_LINE_BYTES):
+    """
+    Split an asynchronous iterator of bytes, e.g. the body of a request, into lines
+    :param chunks: Asynchronous iterator of bytes
+    :param max_length: Maximum length of a line, the content of a longer line is discarded while it is read
+    :return: Asynchronous iterator of the content of each line, or a LongLine for the lines longer than max_length
+    """
+    # Only the new chunk is split, the pieces of the unfinished line are joined once it ends
+    pieces = list()
+    length = 0
+
+    async for chunk in chunks:
+        *lines, last = chunk.split(b'\n')
+
+        for line in lines:
+            length += len(line)
+
+            if length > max_length:
+                yield LongLine(length=length, max_length=max_length)
+            elif pieces:
+                pieces.append(line)
+                yield b''.join(pieces)
+            else:
+                yield line
+
+            pieces = list()
+            length = 0
+
+        length += len(last)
+
+        if length > max_length:
+            pieces = list()
+        elif last:
+            pieces.append(last)
+
+    if length > max_length:
+        yield LongLine(length=length, max_length=max_length)
+    elif pieces:
+        yield b''.join(pieces)
+
+
+def schema_resolver(get_data, schema_cache):
+    """
+    Build the resolver of the JSON Schemas used by PayloadValidator
+    :param get_data: Coroutine function that receives the keyword entity_name and returns the links of its Data Models
+    :param schema_cache: A started SchemaCache, the JSON Schemas are obtained with their $ref resolved
+    :return: Coroutine function that receives an Entity Type and returns its JSON Schemas, see validate_payload
+    """
+    # The HTTP client is only imported to validate, like in SQLSchema.compile_links
+    from common.SchemaCache import SchemaNotAvailable
+
+    async def resolve(entity_type: str) -> list:
+        try:
+            links = await get_data(entity_name=entity_type)
+        except IndexError:
+            raise KeyError(f'No Data Models found for entity {entity_type}')
+
+        try:
+            documents = [await schema_cache.get_response(url=x['jsonSchema'], resolve=True) for x in links]
+        except SchemaNotAvailable as e:
+            raise ValueError(str(e))
+
+        # The ETag of the SchemaCache is the hash of the document, a new version of a schema is compiled again
+        return [(etag.strip('"'), document, x['jsonSchema']) for x, (document, etag) in zip(links, documents)]
+
+    return resolve
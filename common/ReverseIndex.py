@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from bisect import bisect_left
+from orjson import dumps, loads
+
+# Keys of the lookups, in the same terms as the catalogues
+SUBJECT = 'subject'
+REPO_LINK = 'repoLink'
+JSON_SCHEMA_URL = 'jsonSchemaUrl'
+KINDS = (SUBJECT, REPO_LINK, JSON_SCHEMA_URL)
+
+
+def normalize_repo_link(repo_link: str) -> str:
+    """
+    Canonical form of the link of a repository, with or without the .git suffix or a trailing slash
+    """
+    return repo_link.strip().removesuffix('/').removesuffix('.git')
+
+
+class ReverseIndex:
+    def __init__(self, tables: dict, subjects_by_repo: dict):
+        """
+        Entity Types by subject, by repository and by JSON Schema URL. Each key maps to the sorted tuple of its Entity
+        Types, so a page of the results is a slice and costs O(page) whatever the size of the catalogues.
+        :param tables: Dictionary keyed by kind (see KINDS) of dictionaries from each key to its Entity Types
+        :param subjects_by_repo: Name of the subject of each repository, keyed by the normalized link
+        """
+        self.tables = {
+            kind: {key: tuple(sorted(set(entity_names))) for key, entity_names in tables.get(kind, dict()).items()}
+            for kind in KINDS
+        }
+
+        self.subjects = sorted(self.tables[SUBJECT])
+        self.subjects_by_repo = subjects_by_repo
+
+    @classmethod
+    def from_catalogues(cls, official_list_data_models_data: dict, data_models_metadata_data: list):
+        """
+        Build the reverse lookups of the catalogues
+        :param official_list_data_models_data: Content of the official_list_data_models.json file
+        :param data_models_metadata_data: Content of the datamodels_metadata.json file
+        """
+        tables = {kind: dict() for kind in KINDS}
+        subjects_by_repo = dict()
+
+        for subject in official_list_data_models_data['officialList']:
+            entity_names = subject['dataModels']
+            repo_link = normalize_repo_link(subject['repoLink'])
+
+            tables[SUBJECT].setdefault(subject['name'], []).extend(entity_names)
+            tables[REPO_LINK].setdefault(repo_link, []).extend(entity_names)
+            subjects_by_repo.setdefault(repo_link, subject['name'])
+
+        for data_model in data_models_metadata_data:
+            tables[JSON_SCHEMA_URL].setdefault(data_model['jsonSchemaUrl'], []).append(data_model['dataModel'])
+
+        return cls(tables=tables, subjects_by_repo=subjects_by_repo)
+
+    @classmethod
+    def loads(cls, content: bytes):
+        content = loads(content)
+
+        return cls(tables=content.get('tables', dict()), subjects_by_repo=content.get('subjects_by_repo', dict()))
+
+    def dumps(self) -> bytes:
+        return dumps({'tables': self.tables, 'subjects_by_repo': self.subjects_by_repo})
+
+    def subject_of(self, repo_link: str):
+        """
+        Name of the subject of a repository, None if it is unknown
+        """
+        return self.subjects_by_repo.get(normalize_repo_link(repo_link))
+
+    def lookup(self, kind: str, key: str, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Get the Entity Types of a subject, a repository or a JSON Schema URL
+        :param kind: One of KINDS
+        :param key: Name of the subject, link of the repository or URL of the JSON Schema
+        :param offset: Number of Entity Types skipped, in alphabetical order
+        :param limit: Maximum number of Entity Types returned, all of them by default
+        :return: Tuple with the total number of Entity Types of the key and the list of the requested ones
+        """
+        if kind == REPO_LINK and isinstance(key, str):
+            key = normalize_repo_link(key)
+
+        try:
+            entity_names = self.tables[kind][key]
+        except (KeyError, TypeError):
+            raise KeyError(f'No Entity Types found for {kind} {key}')
+
+        return len(entity_names), list(entity_names[offset:None if limit is None else offset + limit])
+
+    def list_subjects(self, offset: int = 0, limit: int = None, prefix: str = '') -> tuple:
+        """
+        Get the names of the subjects
+        :param offset: Number of subjects skipped, in alphabetical order
+        :param limit: Maximum number of subjects returned, all of them by default
+        :param prefix: Return only the subjects whose name starts with it
+        :return: Tuple with the total number of matching subjects and the list of the requested ones
+        """
+        start = bisect_left(self.subjects, prefix)
+        end = bisect_left(self.subjects, prefix + '\U0010ffff') if prefix else len(self.subjects)
+
+        first = min(start + offset, end)
+        last = end if limit is None else min(first + limit, end)
+
+        return end - start, self.subjects[first:last]
+
+    def repo_links_of(self, entity_names) -> dict:
+        """
+        Get the repositories that list each of the Entity Types
+        :param entity_names: Collection of Entity Types
+        :return: Dictionary keyed by Entity Type with the sorted list of the normalized links of its repositories
+        """
+        entity_names = set(entity_names)
+        repo_links = dict()
+
+        if entity_names:
+            for repo_link, names in self.tables[REPO_LINK].items():
+                for entity_name in entity_names.intersection(names):
+                    repo_links.setdefault(entity_name, []).append(repo_link)
+
+        return {entity_name: sorted(links) for entity_name, links in repo_links.items()}
@@ -19,104 +19,186 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 ##
-from requests import get
+from requests import Session, codes
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError, RequestException, ReadTimeout, ConnectionError
-from json.decoder import JSONDecodeError
-from os.path import join, dirname
+from ijson import JSONError
 from threading import Thread, Condition, Event
-from datetime import datetime, timedelta
-import logging
-
-
-class SDMDescriptionFile:
-    def __init__(self, logger=None):
-        # Official file with all the information of the Data Models
-        self.official_list_data_models = ('https://raw.githubusercontent.com/smart-data-models/data-models/master/'
-                                          'specs/AllSubjects/official_list_data_models.json')
-        self.official_list_data_models_data = dict()
-
-        self.data_models_metadata = 'https://smartdatamodels.org/extra/datamodels_metadata.json'
-        self.data_models_metadata_data = dict()
-
-        filename = join(dirname(dirname(__file__)), 'logs', 'app.log')
-
-        if logger is None:
-            logging.basicConfig(filename=filename,
-                                filemode='w',
-                                format='%(name)s - %(levelname)s - %(message)s',
-                                level=logging.DEBUG)
-            self.logger = logging.getLogger(__name__)
-        else:
-            self.logger = logger
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from common.BaseSDMDescriptionFile import BaseSDMDescriptionFile, CatalogueNotReady, NOT_MODIFIED, RETRY_STATUS_CODES
+from common.CatalogueStream import CatalogueStream, CHUNK_SIZE
+from common.CatalogueSource import is_remote
+from common.metrics import CATALOGUE_DOWNLOAD_SECONDS, CATALOGUE_DOWNLOAD_BYTES
+from time import perf_counter, monotonic
+
+
+class SDMDescriptionFile(BaseSDMDescriptionFile):
+    def __init__(self, logger=None, snapshot_dir=None, shared_index_path=None,
+                 official_list_data_models=None, data_models_metadata=None, export_file=None, source=None,
+                 offline=None, revalidate=False):
+        """
+        Catalogue service of the commands and of the process that refreshes the index shared by the workers
+        :param revalidate: Revalidate the catalogues loaded from the snapshot right away, for long running processes.
+                           Otherwise they are only downloaded again once they are older than the TTL, so a command
+                           that answers from a recent snapshot does not wait for a download before exiting.
+        """
+        super().__init__(logger=logger, snapshot_dir=snapshot_dir, shared_index_path=shared_index_path,
+                         official_list_data_models=official_list_data_models,
+                         data_models_metadata=data_models_metadata, export_file=export_file, source=source,
+                         offline=offline)
 
-        self.check_interval_minutes = 720  # 12h * 60m
-        self.obtained_time = datetime.now()
+        # Pooled HTTP session, the connections to the servers are kept alive between refreshes
+        self.session = Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=2))
 
         # Create a Condition object
         self.data_available = Condition()
 
+        # Data loaded from the snapshot is served right away but revalidated in the first iteration
+        self.refresh_requested = revalidate and self.index is not None and self.export_file is None
+
+        # Set once the background thread tried to load the catalogues, the readers stop waiting then
+        self.attempted = False
+
         # Start the background thread
+        self._kill = Event()
+        self._wake = Event()
         self.background_thread = Thread(target=self.get_files_background)
         self.background_thread.start()
-        self._kill = Event()
 
     def get_files_background(self):
         while True:
+            self._wake.clear()
+
+            if self._kill.is_set():
+                break
+
             current_time = datetime.now()
 
-            if len(self.data_models_metadata_data) == 0 or (current_time - self.obtained_time) > timedelta(days=7):
-                self.official_list_data_models_data = self.__get_data__(url=self.official_list_data_models)
-                self.data_models_metadata_data = self.__get_data__(url=self.data_models_metadata)
+            if self.refresh_requested or self.__refresh_due__(current_time=current_time):
+                self.refresh_requested = False
+
+                if self.export_file is not None:
+                    self.__load_export__(current_time=current_time)
+                else:
+                    # Both catalogues are downloaded at the same time, the refresh takes as long as the slowest one
+                    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='catalogue') as pool:
+                        official_list = pool.submit(self.__get_data__, url=self.official_list_data_models)
+                        data_models_metadata = pool.submit(self.__get_data__, url=self.data_models_metadata)
 
-                self.obtained_time = datetime.now()
+                    official_list_data_models_data, official_list_validators = official_list.result()
+                    data_models_metadata_data, data_models_metadata_validators = data_models_metadata.result()
 
-                self.logger.info("Download complete!")
-                elapsed_time = self.obtained_time - current_time
-                self.logger.info(f"Total time: {elapsed_time.total_seconds():.2f} seconds")
+                    self.__update_index__(official_list_data_models_data=official_list_data_models_data,
+                                          official_list_validators=official_list_validators,
+                                          data_models_metadata_data=data_models_metadata_data,
+                                          data_models_metadata_validators=data_models_metadata_validators,
+                                          current_time=current_time)
 
+            # Every reader waiting for the first index is woken up, not only one of them
             with self.data_available:
-                self.data_available.notify()
+                self.attempted = True
+                self.data_available.notify_all()
+
+            # Sleep until the next refresh, refresh() and stop() wake the thread up immediately
+            delay = self.__refresh_delay__(current_time=datetime.now())
+            self.next_attempt = monotonic() + delay
+            self._wake.wait(delay)
+
+        self.logger.info("Stopping Thread...")
 
-            # Sleep for the specified interval, in seconds
-            # sleep(self.check_interval_minutes * 60)
+    def refresh(self):
+        """
+        Revalidate the catalogues now instead of waiting for the TTL. It only wakes up the background thread, so it
+        can be called from a signal handler.
+        """
+        self.refresh_requested = True
+        self._wake.set()
 
-            # If no kill signal is set, sleep for the interval,
-            # If kill signal comes in while sleeping, immediately
-            #  wake up and handle
-            is_killed = self._kill.wait(self.check_interval_minutes * 60)
-            if is_killed:
+    def __get_data__(self, url: str) -> tuple:
+        """
+        Download a catalogue, sending the validators of the data currently loaded in a conditional request. Local
+        catalogues are read from the file system instead.
+        :param url: URL, file:// URL or path of the catalogue
+        :return: Tuple with the catalogue projected to the fields of the index (NOT_MODIFIED if the server answered
+                 304, None in case of error) and the ETag/Last-Modified validators of the response
+        """
+        if not is_remote(url):
+            return self.__get_local_data__(url=url)
+
+        if self.offline:
+            return self.__offline_data__(url=url)
+
+        headers = self.__conditional_headers__(url=url)
+        catalogue = self.__catalogue_name__(url=url)
+
+        for attempt in range(self.retries + 1):
+            # The wait is interrupted by stop()
+            if attempt > 0 and self._kill.wait(self.__retry_delay__(attempt=attempt)):
                 break
 
-        self.logger.info("Stopping Thread...")
+            start = perf_counter()
 
+            try:
+                # The body is parsed while it is received, see CatalogueStream
+                with self.session.get(url=url, headers=headers, stream=True,
+                                      timeout=(self.connect_timeout_seconds, self.read_timeout_seconds)) as response:
+                    response.raise_for_status()
 
-    @staticmethod
-    def __get_data__(url: str) -> dict:
-        response = None
-
-        try:
-            response = get(url=url, timeout=1)
-            response.raise_for_status()
-        except HTTPError as errh:
-            print("HTTP Error")
-            print(errh.args[0])
-        except ConnectionError as conerr:
-            print("Connection error")
-            print(conerr)
-        except RequestException as errex:
-            print("Exception request")
-            print(errex)
-        except ReadTimeout as errrt:
-            print("Time out")
-            print(errrt)
-
-        try:
-            response = response.json()
-        except JSONDecodeError as e:
-            print("JSONDecodeError")
-            print(e)
-
-        return response
+                    if response.status_code == codes.not_modified:
+                        return NOT_MODIFIED, self.validators.get(url)
+
+                    validators = self.__response_validators__(headers=response.headers)
+
+                    stream = CatalogueStream(official_list=url == self.official_list_data_models)
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        stream.feed(chunk)
+
+                    data = stream.close()
+            except HTTPError as errh:
+                self.logger.error(f"HTTP Error: {errh.args[0]}")
+
+                if errh.response is None or errh.response.status_code not in RETRY_STATUS_CODES:
+                    return None, None
+                continue
+            except ReadTimeout as errrt:
+                self.logger.error(f"Time out: {errrt}")
+                continue
+            except ConnectionError as conerr:
+                self.logger.error(f"Connection error: {conerr}")
+                continue
+            except RequestException as errex:
+                self.logger.error(f"Exception request: {errex}")
+                return None, None
+            except JSONError as e:
+                self.logger.error(f"JSONDecodeError: {e}")
+                return None, None
+            finally:
+                CATALOGUE_DOWNLOAD_SECONDS.observe(perf_counter() - start, catalogue)
+
+            CATALOGUE_DOWNLOAD_BYTES.set(stream.size, catalogue)
+
+            return data, validators
+
+        return None, None
+
+    def __wait_index__(self):
+        """
+        Wait until there is an index to read, at most until the first attempt to load the catalogues ends
+        :return: The current index
+        :raise CatalogueNotReady: If the first attempt failed, e.g. offline without a snapshot, or it did not end
+                                  within the command timeout of the readiness configuration
+        """
+        with self.data_available:
+            self.data_available.wait_for(lambda: self.index is not None or self.attempted,
+                                         timeout=self.command_timeout_seconds)
+
+            if self.index is None:
+                raise CatalogueNotReady(retry_after=self.retry_after())
+
+            return self.index
 
     def get_data(self, entity_name: str) -> dict:
         """
@@ -126,46 +208,108 @@ class SDMDescriptionFile:
         """
         self.logger.info(f"Requesting links from entity '{entity_name}'")
 
-        # Acquire the lock associated with the Condition
-        with self.data_available:
-            # Wait until data is available
-            while self.official_list_data_models_data == dict():
-                self.data_available.wait()
+        index = self.__wait_index__()
+
+        return self.__lookup__(index=index, entity_name=entity_name)
 
-        data_model_metadata = \
-            [x for x in self.data_models_metadata_data if x['dataModel'] == entity_name]
+    def get_data_batch(self, entity_names: list) -> dict:
+        """
+        Get the links of several Entity Types, all of them resolved against the same version of the catalogues
+        :param entity_names: The names of the entities to search the links in GitHub
+        :return: Dictionary keyed by Entity Type with either the key 'links' or the key 'error'
+        """
+        self.logger.info(f"Requesting links from {len(entity_names)} entities")
 
-        official_data_model = \
-            [x for x in self.official_list_data_models_data['officialList'] if entity_name in x['dataModels']]
+        index = self.__wait_index__()
 
-        response = list()
+        return self.__lookup_batch__(index=index, entity_names=entity_names)
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """
+        Search the Entity Types that match a query, with the same or different case, as a prefix or misspelled
+        :param query: Entity Type, part of it or a misspelled one
+        :param limit: Maximum number of results
+        :return: List of dictionaries with the keys 'type', 'match' and 'distance', ranked from the best match
+        """
+        self.logger.info(f"Searching the Entity Types that match '{query}'")
+
+        index = self.__wait_index__()
+
+        return index.search(query=query, limit=limit)
+
+    def suggest(self, entity_name: str, limit: int = 5) -> list:
+        """
+        Get the Entity Types that were most likely meant by one that does not exist
+        :param entity_name: The Entity Type that was not found
+        :param limit: Maximum number of suggestions
+        :return: List of Entity Types
+        """
+        index = self.__wait_index__()
 
-        if len(official_data_model) == 0:
-            raise KeyError(f'No Data Models found for entity {entity_name}')
-        else:
-            for i in range(len(official_data_model)):
-                entity_repo_link = official_data_model[i]['repoLink']
-                entity_repo_link = entity_repo_link.replace('.git', '')
-                entity_repo_link = join(entity_repo_link, 'tree', 'master', entity_name)
+        return index.suggest(entity_name=entity_name, limit=limit)
 
-                entity_yaml_link = data_model_metadata[i]['yamlUrl']
-                entity_jsonschema_url = data_model_metadata[i]['jsonSchemaUrl']
+    def lookup(self, kind: str, key: str, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Get the Entity Types of a subject, a repository or a JSON Schema URL
+        :param kind: 'subject', 'repoLink' or 'jsonSchemaUrl'
+        :param key: Name of the subject, link of the repository or URL of the JSON Schema
+        :param offset: Number of Entity Types skipped, in alphabetical order
+        :param limit: Maximum number of Entity Types returned, all of them by default
+        :return: Tuple with the total number of Entity Types of the key and the list of the requested ones
+        """
+        self.logger.info(f"Looking up the Entity Types of the {kind} '{key}'")
+
+        index = self.__wait_index__()
+
+        return index.lookup(kind=kind, key=key, offset=offset, limit=limit)
+
+    def list_subjects(self, offset: int = 0, limit: int = None, prefix: str = '') -> tuple:
+        """
+        Get the names of the subjects of the catalogues
+        :param offset: Number of subjects skipped, in alphabetical order
+        :param limit: Maximum number of subjects returned, all of them by default
+        :param prefix: Return only the subjects whose name starts with it
+        :return: Tuple with the total number of matching subjects and the list of the requested ones
+        """
+        index = self.__wait_index__()
+
+        return index.list_subjects(offset=offset, limit=limit, prefix=prefix)
+
+    def export(self, export_format: str, compress: bool = False):
+        """
+        Serialize the resolved links of all the Entity Types, see CatalogueExport.iter_export
+        :param export_format: 'ndjson', 'csv' or 'sqlite'
+        :param compress: Compress the export with gzip
+        :return: Iterator of bytes
+        """
+        # The writers of the export formats are only imported to export
+        from common.CatalogueExport import iter_export
+
+        index = self.__wait_index__()
+
+        return iter_export(index=index, export_format=export_format, compress=compress)
+
+    def json_schema_urls(self) -> list:
+        """
+        Get the URLs of the JSON Schemas of all the Data Models, e.g. to download them before they are requested
+        :return: List of URLs without duplicates, in the order of the Entity Types
+        """
+        from common.CatalogueExport import export_records
 
-                resp = {
-                    'repo': entity_repo_link,
-                    'yaml': entity_yaml_link,
-                    'jsonSchema': entity_jsonschema_url
-                }
+        index = self.__wait_index__()
 
-                response.append(resp)
+        # The records of the Entity Types with incomplete metadata have no JSON Schema
+        urls = (record['jsonSchema'] for record in export_records(index=index) if record['jsonSchema'])
 
-            return response
+        return list(dict.fromkeys(urls))
 
     def stop(self):
         """
         Send the message to stop the thread
         """
         self._kill.set()
+        self._wake.set()
+        self.session.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,531 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from json import loads
+from hashlib import sha256
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from common.metrics import SQL_COMPILE_TOTAL
+from common.constants import DIALECTS
+import asyncio
+
+# Column types of each kind of property
+COLUMN_TYPES = {
+    'postgresql': {
+        'string': 'TEXT', 'integer': 'BIGINT', 'number': 'DOUBLE PRECISION', 'boolean': 'BOOLEAN',
+        'date-time': 'TIMESTAMPTZ', 'date': 'DATE', 'time': 'TIME', 'json': 'JSONB', 'geometry': 'geometry({}, 4326)'
+    },
+    'sqlite': {
+        'string': 'TEXT', 'integer': 'INTEGER', 'number': 'REAL', 'boolean': 'INTEGER',
+        'date-time': 'TEXT', 'date': 'TEXT', 'time': 'TEXT', 'json': 'TEXT', 'geometry': 'TEXT'
+    }
+}
+
+SCALAR_KINDS = ('string', 'integer', 'number', 'boolean', 'date-time', 'date', 'time')
+
+# Nested objects are flattened into columns of the table up to this depth, deeper ones are stored as JSON
+MAX_NESTED_DEPTH = 3
+
+# Longest identifier accepted by PostgreSQL, longer ones are truncated with a hash suffix to keep them unique
+MAX_IDENTIFIER_LENGTH = 63
+
+# Geometry types of GeoJSON
+GEOMETRY_TYPES = ('Point', 'MultiPoint', 'LineString', 'MultiLineString', 'Polygon', 'MultiPolygon',
+                  'GeometryCollection')
+
+
+def quote(identifier: str) -> str:
+    if len(identifier) > MAX_IDENTIFIER_LENGTH:
+        suffix = sha256(identifier.encode('utf-8')).hexdigest()[:8]
+        identifier = f'{identifier[:MAX_IDENTIFIER_LENGTH - 9]}_{suffix}'
+
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def merge(schema) -> dict:
+    """
+    Merge the branches of allOf into a single schema, with the union of their properties and required properties
+    :param schema: A resolved JSON Schema, i.e. with its $ref inlined
+    """
+    if not isinstance(schema, dict):
+        return dict()
+
+    if 'allOf' not in schema:
+        return schema
+
+    merged = {k: v for k, v in schema.items() if k != 'allOf'}
+    properties = dict()
+    required = list()
+
+    for branch in [merge(x) for x in schema['allOf']] + [merged]:
+        for key, value in branch.items():
+            if key == 'properties' and isinstance(value, dict):
+                properties.update(value)
+            elif key == 'required' and isinstance(value, list):
+                required.extend(x for x in value if x not in required)
+            else:
+                merged.setdefault(key, value)
+
+    if properties:
+        merged['properties'] = properties
+    if required:
+        merged['required'] = required
+
+    return merged
+
+
+def geometry_type(schema: dict):
+    """
+    Geometry type of a GeoJSON property
+    :return: One of GEOMETRY_TYPES, 'Geometry' if the property accepts several of them, or None if it is not GeoJSON
+    """
+    branches = schema.get('oneOf') or schema.get('anyOf') or [schema]
+    types = set()
+
+    for branch in branches:
+        branch = merge(branch)
+        properties = branch.get('properties')
+
+        if not isinstance(properties, dict) or 'type' not in properties:
+            return None
+        if 'coordinates' not in properties and 'geometries' not in properties:
+            return None
+
+        enum = merge(properties['type']).get('enum') or GEOMETRY_TYPES
+        types.update(x for x in enum if x in GEOMETRY_TYPES)
+
+    if not types:
+        return None
+
+    return types.pop() if len(types) == 1 else 'Geometry'
+
+
+def kind(schema: dict) -> str:
+    """
+    Kind of column of a property: one of SCALAR_KINDS, 'object', 'array', 'geometry' or 'json'
+    """
+    if geometry_type(schema) is not None:
+        return 'geometry'
+
+    branches = schema.get('oneOf') or schema.get('anyOf')
+    if branches:
+        kinds = {kind(merge(x)) for x in branches if merge(x).get('type') != 'null'}
+        return kinds.pop() if len(kinds) == 1 and kinds <= set(SCALAR_KINDS) else 'json'
+
+    schema_type = schema.get('type')
+    if isinstance(schema_type, list):
+        types = [x for x in schema_type if x != 'null']
+        schema_type = types[0] if len(types) == 1 else None
+
+    if schema_type is None and 'properties' in schema:
+        schema_type = 'object'
+    if schema_type is None and isinstance(schema.get('enum'), list):
+        values = schema['enum']
+        schema_type = 'string' if all(isinstance(x, str) for x in values) else None
+
+    if schema_type == 'string' and schema.get('format') in ('date-time', 'date', 'time'):
+        return schema['format']
+
+    if schema_type in ('string', 'integer', 'number', 'boolean', 'object', 'array'):
+        return schema_type
+
+    return 'json'
+
+
+class SQLTable:
+    def __init__(self, name: str, dialect: str):
+        self.name = name
+        self.dialect = dialect
+        self.columns = list()
+        self.names = set()
+        self.comments = list()
+        self.constraints = list()
+
+    def add(self, name: str, definition: str, description=None):
+        # Flattened properties may produce the same name as other property, the later ones get a suffix
+        unique, i = name, 2
+        while unique.casefold() in self.names:
+            unique, i = f'{name}_{i}', i + 1
+
+        self.names.add(unique.casefold())
+        self.columns.append(f'{quote(unique)} {definition}')
+
+        if description and isinstance(description, str):
+            self.comments.append((unique, description))
+
+        return unique
+
+    def ddl(self) -> str:
+        lines = ',\n'.join(f'    {x}' for x in self.columns + self.constraints)
+        statements = [f'CREATE TABLE IF NOT EXISTS {quote(self.name)} (\n{lines}\n);']
+
+        # SQLite has no comments on the columns
+        if self.dialect == 'postgresql':
+            statements.extend(f'COMMENT ON COLUMN {quote(self.name)}.{quote(column)} IS {literal(description)};'
+                              for column, description in self.comments)
+
+        return '\n'.join(statements)
+
+
+class SchemaCompiler:
+    def __init__(self, table: str, dialect: str):
+        self.dialect = dialect
+        self.types = COLUMN_TYPES[dialect]
+        self.root = table
+        self.tables = list()
+        self.geometry = False
+
+    def compile(self, schema) -> str:
+        schema = merge(schema)
+
+        if not isinstance(schema.get('properties'), dict):
+            raise ValueError('The JSON Schema has no properties')
+
+        table = SQLTable(name=self.root, dialect=self.dialect)
+        self.tables.append(table)
+
+        required = schema.get('required') or []
+        properties = schema['properties']
+
+        # NGSI-LD entities are identified by the property id, it is added if the schema does not define it
+        id_schema = merge(properties.get('id'))
+        table.add('id', f'{self.__column_type__(id_schema) if "id" in properties else "TEXT"} PRIMARY KEY',
+                  description=id_schema.get('description'))
+
+        for name, schema in properties.items():
+            if name != 'id':
+                self.__property__(table=table, prefix='', name=name, schema=merge(schema), depth=0,
+                                  required=name in required)
+
+        statements = [x.ddl() for x in self.tables]
+
+        if self.geometry and self.dialect == 'postgresql':
+            statements.insert(0, 'CREATE EXTENSION IF NOT EXISTS postgis;')
+
+        return '\n\n'.join(statements) + '\n'
+
+    def __column_type__(self, schema: dict, column_kind: str = None) -> str:
+        column_kind = column_kind or kind(schema)
+
+        if column_kind == 'geometry':
+            self.geometry = True
+            return self.types['geometry'].format(geometry_type(schema))
+
+        if column_kind in SCALAR_KINDS:
+            return self.types[column_kind]
+
+        return self.types['json']
+
+    def __checks__(self, column: str, schema: dict, column_kind: str) -> str:
+        checks = list()
+
+        enum = schema.get('enum')
+        if column_kind == 'string' and isinstance(enum, list) and enum and all(isinstance(x, str) for x in enum):
+            checks.append(f'{quote(column)} IN ({", ".join(literal(x) for x in enum)})')
+
+        if column_kind in ('integer', 'number'):
+            for keyword, operator in (('minimum', '>='), ('maximum', '<=')):
+                value = schema.get(keyword)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    checks.append(f'{quote(column)} {operator} {value}')
+
+        if self.dialect == 'sqlite':
+            if column_kind == 'boolean':
+                checks.append(f'{quote(column)} IN (0, 1)')
+            elif column_kind in ('json', 'object', 'geometry', 'array'):
+                checks.append(f'json_valid({quote(column)})')
+
+        return ''.join(f' CHECK ({x})' for x in checks)
+
+    def __property__(self, table: SQLTable, prefix: str, name: str, schema: dict, depth: int, required: bool):
+        column = prefix + name
+        column_kind = kind(schema)
+        description = schema.get('description')
+
+        if column_kind == 'object' and depth < MAX_NESTED_DEPTH and isinstance(schema.get('properties'), dict):
+            # The fields of a nested object are columns of the same table, nullable as the object may be missing
+            for child, child_schema in schema['properties'].items():
+                self.__property__(table=table, prefix=f'{column}_', name=child, schema=merge(child_schema),
+                                  depth=depth + 1, required=False)
+            return
+
+        if column_kind == 'array':
+            items = merge(schema.get('items'))
+            items_kind = kind(items) if items else 'json'
+
+            if items_kind == 'object' and isinstance(items.get('properties'), dict) and depth == 0:
+                self.__child_table__(parent=table, column=column, items=items, description=description)
+                return
+
+            if items_kind in SCALAR_KINDS and self.dialect == 'postgresql':
+                definition = f'{self.__column_type__(items, items_kind)}[]'
+            else:
+                definition = self.types['json']
+
+            unique = table.add(column, definition, description=description)
+
+            if required:
+                table.columns[-1] += ' NOT NULL'
+
+            table.columns[-1] += self.__checks__(unique, schema, 'array')
+            return
+
+        definition = self.__column_type__(schema, column_kind)
+        unique = table.add(column, definition, description=description)
+
+        if required:
+            table.columns[-1] += ' NOT NULL'
+
+        table.columns[-1] += self.__checks__(unique, schema, column_kind)
+
+    def __child_table__(self, parent: SQLTable, column: str, items: dict, description):
+        """
+        Arrays of objects are stored in a table with a row per element, referencing the row of the entity
+        """
+        child = SQLTable(name=f'{parent.name}_{column}', dialect=self.dialect)
+        self.tables.append(child)
+
+        child.add('entity_id', f'TEXT NOT NULL REFERENCES {quote(parent.name)} ("id") ON DELETE CASCADE',
+                  description=description)
+        child.add('position', 'INTEGER NOT NULL')
+        child.constraints.append('PRIMARY KEY ("entity_id", "position")')
+
+        required = items.get('required') or []
+        for name, schema in items['properties'].items():
+            self.__property__(table=child, prefix='', name=name, schema=merge(schema), depth=1,
+                              required=name in required)
+
+
+def compile_ddl(document: bytes, table: str, dialect: str) -> str:
+    """
+    Compile a JSON Schema into the SQL DDL of a table with a column per property. Nested objects are flattened into
+    columns up to MAX_NESTED_DEPTH, arrays of objects get their own table with a row per element, arrays of scalars
+    are native arrays in PostgreSQL and JSON in SQLite, and GeoJSON properties are PostGIS geometries in PostgreSQL
+    and GeoJSON text in SQLite. Any other property is stored as JSON.
+
+    It only depends on its arguments, so it can run in another process and its result can be memoized by the hash of
+    the document.
+    :param document: Serialized JSON Schema, with its $ref resolved
+    :param table: Name of the table
+    :param dialect: One of DIALECTS
+    :return: The CREATE TABLE statements
+    :raise ValueError: If the document is not a JSON Schema of an object or the dialect is unknown
+    """
+    if dialect not in DIALECTS:
+        raise ValueError(f'Unknown SQL dialect {dialect}, it should be one of {", ".join(DIALECTS)}')
+
+    return SchemaCompiler(table=table, dialect=dialect).compile(schema=loads(document))
+
+
+class SQLCompiler:
+    """
+    Memoized compilation of JSON Schemas into SQL DDL. The DDL is kept in memory by content hash of the document,
+    table and dialect, and the batches with several documents to compile are compiled in parallel in a process pool.
+    """
+    def __init__(self, memory_entries: int = 512, workers: int = None, min_parallel: int = 4):
+        """
+        :param memory_entries: Maximum number of compiled DDL kept in memory
+        :param workers: Number of processes of the pool, by default the number of CPUs
+        :param min_parallel: Smallest number of documents to compile that is sent to the pool, smaller batches are
+                             compiled in the calling process, which is faster than sending them to another one
+        """
+        self.memory_entries = memory_entries
+        self.workers = workers
+        self.min_parallel = min_parallel
+
+        # (content hash, table, dialect) -> DDL
+        self.compiled = OrderedDict()
+
+        self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def compile_batch_async(self, documents: list, dialect: str) -> list:
+        """
+        Compile several JSON Schemas, in parallel if there are at least min_parallel of them not compiled yet. The
+        compilation never runs in the event loop thread.
+        :param documents: List of tuples with the serialized document, the name of the table and, optionally, the hash
+                          of the document
+        :param dialect: One of DIALECTS
+        :return: List with the DDL of each document, in the same order, or the ValueError raised compiling it
+        """
+        keys, results, pending = self.__pending__(documents=documents, dialect=dialect)
+        loop = asyncio.get_running_loop()
+
+        executor = self.__pool__() if len(pending) >= self.min_parallel else None
+        function = compile_ddl if executor is not None else self.__safe_compile__
+
+        outcomes = await asyncio.gather(*(loop.run_in_executor(executor, function, document, key[1], dialect)
+                                          for key, document in pending.items()), return_exceptions=True)
+
+        for key, outcome in zip(pending, outcomes):
+            if isinstance(outcome, ValueError):
+                results[key] = outcome
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results[key] = self.__store__(key=key, ddl=outcome)
+
+        return [results[key] for key in keys]
+
+    def __pending__(self, documents: list, dialect: str) -> tuple:
+        """
+        Split a batch into the documents already compiled and the ones to compile
+        :return: Tuple with the key of each document, the DDL of the compiled ones and the documents to compile, both
+                 of them keyed by their key. The same document is compiled once even if it appears several times.
+        """
+        keys = list()
+        results = dict()
+        pending = dict()
+
+        for document, table, *content_hash in documents:
+            key = (content_hash[0] if content_hash and content_hash[0] else sha256(document).hexdigest(), table,
+                   dialect)
+            keys.append(key)
+
+            if key in results or key in pending:
+                continue
+
+            ddl = self.__cached__(key=key)
+            if ddl is None:
+                pending[key] = document
+            else:
+                results[key] = ddl
+
+        return keys, results, pending
+
+    def __pool__(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        return self.pool
+
+    @staticmethod
+    def __safe_compile__(document: bytes, table: str, dialect: str):
+        try:
+            return compile_ddl(document=document, table=table, dialect=dialect)
+        except ValueError as e:
+            return e
+
+    def __cached__(self, key: tuple):
+        ddl = self.compiled.get(key)
+
+        if ddl is None:
+            SQL_COMPILE_TOTAL.inc('miss')
+            return None
+
+        SQL_COMPILE_TOTAL.inc('hit')
+        self.compiled.move_to_end(key)
+
+        return ddl
+
+    def __store__(self, key: tuple, ddl: str) -> str:
+        self.compiled[key] = ddl
+
+        while len(self.compiled) > self.memory_entries:
+            self.compiled.popitem(last=False)
+
+        return ddl
+
+
+def table_names(entity_type: str, links: list) -> list:
+    """
+    Names of the tables of the Data Models of an Entity Type: the Entity Type for the first one and, when several
+    subjects define it, the Entity Type followed by the name of the subject for the others
+    :param entity_type: The Entity Type
+    :param links: The links of the Data Models, as returned by get_data
+    """
+    names = [entity_type]
+
+    for link in links[1:]:
+        subject = link['repo'].split('/tree/')[0].rstrip('/').rsplit('/', 1)[-1].removeprefix('dataModel.')
+        names.append(f'{entity_type}_{subject}')
+
+    return names
+
+
+def render_ddl(links: list, ddls: list) -> str:
+    """
+    Script with the DDL of the Data Models of an Entity Type, each of them preceded by a comment with its JSON Schema
+    :param links: The links of the Data Models, as returned by get_data
+    :param ddls: The DDL of each of them
+    """
+    return '\n'.join(f'-- {link["jsonSchema"]}\n{ddl}' for link, ddl in zip(links, ddls))
+
+
+async def compile_links(links_by_type: dict, schema_cache, compiler: SQLCompiler, dialect: str) -> dict:
+    """
+    Compile the SQL DDL of the Data Models of several Entity Types. Their JSON Schemas are obtained concurrently from
+    the SchemaCache, with their $ref resolved, and compiled in a single batch.
+    :param links_by_type: Dictionary keyed by Entity Type with the links of its Data Models, as returned by get_data
+    :param schema_cache: A started SchemaCache
+    :param compiler: The SQLCompiler
+    :param dialect: One of DIALECTS
+    :return: Dictionary keyed by Entity Type with either the keys 'sql' and 'etag', a strong ETag derived from the
+             hashes of the documents, or the key 'error'
+    """
+    # The HTTP client is only imported to compile, the command line imports this module for its dialects
+    from common.SchemaCache import SchemaNotAvailable
+
+    async def documents(links: list) -> list:
+        return [await schema_cache.get_response(url=x['jsonSchema'], resolve=True) for x in links]
+
+    outcomes = await asyncio.gather(*(documents(x) for x in links_by_type.values()), return_exceptions=True)
+
+    result = dict()
+    batch = list()
+
+    for (entity_type, links), outcome in zip(links_by_type.items(), outcomes):
+        if isinstance(outcome, SchemaNotAvailable):
+            result[entity_type] = {'error': str(outcome)}
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            # The ETag of the SchemaCache is the hash of the document
+            batch.extend((document, table, etag.strip('"'))
+                         for (document, etag), table in zip(outcome, table_names(entity_type=entity_type, links=links)))
+
+    ddls = iter(await compiler.compile_batch_async(documents=batch, dialect=dialect))
+
+    for (entity_type, links), outcome in zip(links_by_type.items(), outcomes):
+        if entity_type in result:
+            continue
+
+        compiled = [next(ddls) for _ in links]
+        errors = [(link, x) for link, x in zip(links, compiled) if isinstance(x, ValueError)]
+
+        if errors:
+            link, error = errors[0]
+            result[entity_type] = {'error': f'Unable to compile the JSON Schema {link["jsonSchema"]}: {error}'}
+            continue
+
+        # The DDL only depends on the documents and the dialect
+        etag = sha256(f'{dialect}:{",".join(x[1] for x in outcome)}'.encode('utf-8')).hexdigest()
+        result[entity_type] = {'sql': render_ddl(links=links, ddls=compiled), 'etag': f'"{etag}"'}
+
+    return result
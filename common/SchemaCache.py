@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from httpx import AsyncClient, Limits, Timeout, HTTPError, TransportError, codes
+from json import loads, dumps, JSONDecodeError
+from hashlib import sha256
+from collections import OrderedDict
+from urllib.parse import urljoin, urldefrag, unquote
+from os import makedirs, replace, scandir, unlink, utime
+from os.path import join, exists
+from threading import Lock
+from tempfile import NamedTemporaryFile
+from time import time
+from copy import deepcopy
+from itertools import islice
+from common.metrics import SCHEMA_FETCH_COALESCED_TOTAL
+from common.BaseSDMDescriptionFile import RETRY_STATUS_CODES
+import asyncio
+import logging
+
+# When the documents on disk exceed disk_bytes, the least recently used ones are removed until they take this fraction
+# of it, so the next documents stored do not prune the cache again
+PRUNE_TARGET_RATIO = 0.9
+
+
+class SchemaNotAvailable(Exception):
+    """
+    Raised when a JSON Schema document, or one of the documents it references, cannot be obtained
+    """
+
+
+class SchemaCache:
+    """
+    Two level (memory and disk) cache of the JSON Schema documents referenced by the catalogues. The documents are
+    stored on disk by content hash, with a small file per URL pointing to the current hash and keeping the HTTP
+    validators used to revalidate it. The documents with their $ref resolved and inlined are memoized, together with
+    their serialization and a strong ETag, keyed by URL and content hash, and revalidated with the documents they
+    inline.
+    """
+    def __init__(self, directory: str, memory_entries: int = 512, disk_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: int = 7 * 24 * 3600, timeout_seconds: float = 10, retries: int = 2,
+                 retry_backoff_seconds: float = 0.5, logger=None):
+        self.documents_directory = join(directory, 'schemas', 'documents')
+        self.urls_directory = join(directory, 'schemas', 'urls')
+
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # The downloads are retried after timeouts, connection errors and RETRY_STATUS_CODES, like the catalogues
+        self.timeout_seconds = timeout_seconds
+        self.retries = retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+        # url -> (content hash, parsed document, time of the last validation)
+        self.documents = OrderedDict()
+
+        # (url, resolve, content hash) -> (serialized document, ETag, content hash of each document inlined by URL)
+        self.responses = OrderedDict()
+
+        # url -> task of the download in flight, shared by the concurrent requests of the same document
+        self.fetches = dict()
+
+        # Bytes of the documents on disk, computed in the first store and then updated by every write and removal
+        self.disk_usage = None
+        self.disk_lock = Lock()
+
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.client = None
+
+    async def start(self):
+        self.client = AsyncClient(headers={'Accept-Encoding': 'gzip, deflate'},
+                                  limits=Limits(max_connections=10, max_keepalive_connections=10),
+                                  timeout=Timeout(self.timeout_seconds),
+                                  follow_redirects=True)
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def get_document(self, url: str) -> tuple:
+        """
+        Get a JSON Schema document, from memory, from disk or downloading it
+        :param url: URL of the document
+        :return: Tuple with the content hash and the parsed document
+        """
+        entry = self.documents.get(url)
+
+        if entry is not None and time() - entry[2] < self.ttl_seconds:
+            self.documents.move_to_end(url)
+            return entry[0], entry[1]
+
+        content_hash, document = await self.__fetch_once__(url=url)
+
+        self.documents[url] = (content_hash, document, time())
+        self.documents.move_to_end(url)
+
+        while len(self.documents) > self.memory_entries:
+            self.documents.popitem(last=False)
+
+        return content_hash, document
+
+    async def get_response(self, url: str, resolve: bool = True) -> tuple:
+        """
+        Get the serialized JSON Schema document, with its $ref inlined if requested
+        :param url: URL of the document
+        :param resolve: Resolve the $ref of the document and inline them
+        :return: Tuple with the serialized document and its strong ETag
+        """
+        content_hash, document = await self.get_document(url=url)
+        key = (url, resolve, content_hash)
+
+        cached = self.responses.get(key)
+        if cached is not None and await self.__unchanged__(dependencies=cached[2]):
+            self.responses.move_to_end(key)
+            return cached[0], cached[1]
+
+        dependencies = dict()
+        if resolve:
+            document = await self.resolve(url=url, document=document, dependencies=dependencies)
+
+        body = dumps(document, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        cached = body, f'"{sha256(body).hexdigest()}"', dependencies
+
+        self.responses[key] = cached
+        self.responses.move_to_end(key)
+
+        while len(self.responses) > self.memory_entries:
+            self.responses.popitem(last=False)
+
+        return cached[0], cached[1]
+
+    async def __unchanged__(self, dependencies: dict) -> bool:
+        """
+        Check if the documents inlined in a resolved document are still the same, revalidating them like the root
+        document once they are older than the TTL
+        :param dependencies: Content hash of each inlined document by URL
+        """
+        for url, content_hash in dependencies.items():
+            current_hash, _ = await self.get_document(url=url)
+
+            if current_hash != content_hash:
+                return False
+
+        return True
+
+    async def __fetch_once__(self, url: str) -> tuple:
+        """
+        Single-flight version of __fetch__, the concurrent misses of a URL wait for the same download
+        """
+        task = self.fetches.get(url)
+
+        if task is None:
+            task = asyncio.ensure_future(self.__fetch__(url=url))
+            self.fetches[url] = task
+            task.add_done_callback(lambda _: self.fetches.pop(url, None))
+        else:
+            SCHEMA_FETCH_COALESCED_TOTAL.inc()
+
+        # The task is shared, a cancelled request must not cancel it for the others
+        return await asyncio.shield(task)
+
+    async def warm(self, urls, concurrency: int = 16):
+        """
+        Download the JSON Schema documents, and the documents they reference, into the cache, so the first request of
+        any of them is answered from the disk
+        :param urls: Iterable of URLs of the documents
+        :param concurrency: Maximum number of documents downloaded at the same time
+        :return: Asynchronous iterator of a tuple per URL, in the order they finish, with the URL and either None or
+                 the SchemaNotAvailable error that prevented caching it
+        """
+        urls = iter(urls)
+        pending = set()
+
+        async def warm_one(url: str) -> tuple:
+            try:
+                await self.get_response(url=url, resolve=True)
+            except SchemaNotAvailable as e:
+                return url, e
+
+            return url, None
+
+        # At most concurrency downloads are in flight, a new one starts when one of them finishes
+        while True:
+            pending.update(asyncio.ensure_future(warm_one(url)) for url in islice(urls, concurrency - len(pending)))
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                yield task.result()
+
+    async def resolve(self, url: str, document, dependencies: dict = None):
+        """
+        Inline the $ref of a document. References that form a cycle are kept as they are.
+        :param url: URL of the document, base of the relative references
+        :param document: Parsed document
+        :param dependencies: Dictionary updated with the content hash of each referenced document by URL
+        :return: A copy of the document with the $ref replaced by the referenced content
+        """
+        return await self.__resolve_node__(base=url, node=document, stack=(url,),
+                                           dependencies=dict() if dependencies is None else dependencies)
+
+    async def __resolve_node__(self, base: str, node, stack: tuple, dependencies: dict):
+        if isinstance(node, list):
+            return [await self.__resolve_node__(base=base, node=x, stack=stack, dependencies=dependencies)
+                    for x in node]
+
+        if not isinstance(node, dict):
+            return node
+
+        ref = node.get('$ref')
+
+        if isinstance(ref, str):
+            target = urljoin(base, ref)
+
+            if target in stack:
+                node = deepcopy(node)
+
+                # Keep the reference, absolute if it does not point to the root document
+                if urldefrag(target)[0] != stack[0]:
+                    node['$ref'] = target
+
+                return node
+
+            target_url, fragment = urldefrag(target)
+            if target_url == '':
+                target_url = base
+
+            target_hash, target_document = await self.get_document(url=target_url)
+            if target_url != stack[0]:
+                dependencies[target_url] = target_hash
+
+            referenced = self.__pointer__(document=target_document, pointer=fragment, url=target)
+
+            resolved = await self.__resolve_node__(base=target_url, node=referenced, stack=stack + (target,),
+                                                   dependencies=dependencies)
+
+            siblings = {k: v for k, v in node.items() if k != '$ref'}
+            if not siblings or not isinstance(resolved, dict):
+                return resolved
+
+            resolved = dict(resolved)
+            for k, v in siblings.items():
+                resolved[k] = await self.__resolve_node__(base=base, node=v, stack=stack, dependencies=dependencies)
+
+            return resolved
+
+        return {k: await self.__resolve_node__(base=base, node=v, stack=stack, dependencies=dependencies)
+                for k, v in node.items()}
+
+    @staticmethod
+    def __pointer__(document, pointer: str, url: str):
+        if pointer in ('', '/'):
+            return document
+
+        node = document
+        for token in pointer.lstrip('/').split('/'):
+            token = unquote(token).replace('~1', '/').replace('~0', '~')
+
+            try:
+                node = node[int(token)] if isinstance(node, list) else node[token]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise SchemaNotAvailable(f'Unable to resolve the reference {url}')
+
+        return node
+
+    async def __fetch__(self, url: str) -> tuple:
+        if not url.startswith(('https://', 'http://')):
+            raise SchemaNotAvailable(f'Unsupported URL {url}')
+
+        meta = await asyncio.to_thread(self.__read_meta__, url)
+        headers = dict()
+
+        if meta is not None:
+            if time() - meta['validated_at'] < self.ttl_seconds:
+                document = await asyncio.to_thread(self.__read_document__, meta['hash'])
+                if document is not None:
+                    return meta['hash'], document
+
+            if 'etag' in meta:
+                headers['If-None-Match'] = meta['etag']
+            if 'last_modified' in meta:
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        if self.client is None:
+            await self.start()
+
+        try:
+            response = await self.__get__(url=url, headers=headers)
+
+            if response.status_code == codes.NOT_MODIFIED and meta is not None:
+                document = await asyncio.to_thread(self.__read_document__, meta['hash'])
+
+                if document is not None:
+                    meta['validated_at'] = time()
+                    await asyncio.to_thread(self.__write_meta__, url, meta)
+                    return meta['hash'], document
+
+                response = await self.__get__(url=url, headers=dict())
+
+            response.raise_for_status()
+        except HTTPError as e:
+            raise SchemaNotAvailable(f'Unable to download {url}: {e}')
+
+        content = response.content
+
+        try:
+            document = loads(content)
+        except (JSONDecodeError, UnicodeDecodeError) as e:
+            raise SchemaNotAvailable(f'Invalid JSON document {url}: {e}')
+
+        content_hash = sha256(content).hexdigest()
+
+        meta = {'url': url, 'hash': content_hash, 'validated_at': time()}
+        if 'ETag' in response.headers:
+            meta['etag'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            meta['last_modified'] = response.headers['Last-Modified']
+
+        await asyncio.to_thread(self.__store__, url, meta, content)
+
+        return content_hash, document
+
+    async def __get__(self, url: str, headers: dict):
+        """
+        GET request retried after timeouts, connection errors and RETRY_STATUS_CODES, with an exponential backoff
+        """
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+
+            try:
+                response = await self.client.get(url=url, headers=headers)
+            except TransportError:
+                if attempt == self.retries:
+                    raise
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                return response
+
+    def __meta_path__(self, url: str) -> str:
+        return join(self.urls_directory, sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def __read_meta__(self, url: str):
+        try:
+            with open(self.__meta_path__(url=url)) as file:
+                return loads(file.read())
+        except (OSError, JSONDecodeError):
+            return None
+
+    def __read_document__(self, content_hash: str):
+        path = join(self.documents_directory, content_hash + '.json')
+
+        try:
+            with open(path, 'rb') as file:
+                content = file.read()
+        except OSError:
+            return None
+
+        try:
+            document = loads(content)
+        except (JSONDecodeError, UnicodeDecodeError) as e:
+            # A corrupt document is removed and reported as a miss, so it is downloaded again
+            self.logger.warning(f"Removing the corrupt JSON Schema {path} from the disk cache: {e}")
+
+            with self.disk_lock:
+                try:
+                    unlink(path)
+                except OSError:
+                    return None
+
+                if self.disk_usage is not None:
+                    self.disk_usage -= len(content)
+
+            return None
+
+        # Touch the document so the disk pruning keeps the most recently used ones
+        utime(path)
+
+        return document
+
+    def __write_meta__(self, url: str, meta: dict):
+        self.__write_file__(directory=self.urls_directory, path=self.__meta_path__(url=url),
+                            content=dumps(meta).encode('utf-8'))
+
+    def __store__(self, url: str, meta: dict, content: bytes):
+        path = join(self.documents_directory, meta['hash'] + '.json')
+
+        try:
+            # The documents are stored by the threads of asyncio.to_thread, the usage is updated by one at a time
+            with self.disk_lock:
+                if self.disk_usage is None:
+                    self.disk_usage = self.__scan_usage__()
+
+                # The name is the content hash, a document already stored keeps its size
+                stored = exists(path)
+
+                self.__write_file__(directory=self.documents_directory, path=path, content=content)
+                self.__write_meta__(url=url, meta=meta)
+
+                if not stored:
+                    self.disk_usage += len(content)
+
+                if self.disk_usage > self.disk_bytes:
+                    self.__prune__()
+        except OSError as e:
+            self.logger.error(f"Unable to store the JSON Schema {url} in the disk cache: {e}")
+
+    @staticmethod
+    def __write_file__(directory: str, path: str, content: bytes):
+        makedirs(directory, exist_ok=True)
+
+        with NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as file:
+            file.write(content)
+
+        replace(file.name, path)
+
+    def __scan_usage__(self) -> int:
+        try:
+            return sum(x.stat().st_size for x in scandir(self.documents_directory) if x.name.endswith('.json'))
+        except FileNotFoundError:
+            return 0
+
+    def __prune__(self):
+        entries = [x for x in scandir(self.documents_directory) if x.name.endswith('.json')]
+        total = sum(x.stat().st_size for x in entries)
+        target = self.disk_bytes * PRUNE_TARGET_RATIO
+
+        # Remove the least recently used documents, the URL files pointing to them become misses
+        for entry in sorted(entries, key=lambda x: x.stat().st_mtime):
+            if total <= target:
+                break
+
+            total -= entry.stat().st_size
+            unlink(entry.path)
+
+        self.disk_usage = total
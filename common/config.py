@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from pathlib import Path
+from json import load
+
+
+def load_config() -> dict:
+    """
+    Load the service configuration file, common/config.json relative to the working directory
+    :return: The content of the configuration file or an empty dictionary if it does not exist
+    """
+    config_path = Path.cwd().joinpath("common/config.json")
+
+    try:
+        with open(config_path) as config_file:
+            config = load(config_file)
+    except FileNotFoundError:
+        config = dict()
+
+    return config
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+# Values shared by the command line and the modules that use them. This module has no imports, so validating the
+# options of a command does not load the modules of the other commands.
+
+# SQL dialects of the DDL compiled from the JSON Schemas, see SQLSchema
+DIALECTS = ('postgresql', 'sqlite')
+
+# Formats of the export of the resolved catalogue, see CatalogueExport
+FORMATS = ('ndjson', 'csv', 'sqlite')
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+"""Memory accounting of the catalogue structures and of the process"""
+from sys import getsizeof, platform
+
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:  # Windows
+    getrusage = None
+
+
+def deep_sizeof(obj, seen: set = None) -> int:
+    """
+    Size in bytes of an object and of all the objects it references: containers, attributes and __slots__. The
+    objects referenced several times, e.g. interned strings, are counted once.
+    :param obj: The object to measure
+    :param seen: Identifiers of the objects already counted, shared between calls to not count them twice
+    :return: The size in bytes
+    """
+    if seen is None:
+        seen = set()
+
+    size = 0
+    pending = [obj]
+
+    while pending:
+        current = pending.pop()
+
+        if id(current) in seen:
+            continue
+
+        seen.add(id(current))
+        size += getsizeof(current)
+
+        if isinstance(current, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        else:
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    pending.append(getattr(current, slot))
+
+            if hasattr(current, '__dict__'):
+                pending.append(vars(current))
+
+    return size
+
+
+def resident_memory_bytes():
+    """
+    Resident set size of the process, from /proc on Linux or the peak one reported by getrusage elsewhere
+    :return: The size in bytes or None if it cannot be obtained
+    """
+    try:
+        from os import sysconf
+
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * sysconf('SC_PAGE_SIZE')
+    except (ImportError, OSError, ValueError):
+        pass
+
+    if getrusage is None:
+        return None
+
+    # Bytes on macOS, kilobytes on the other systems
+    return getrusage(RUSAGE_SELF).ru_maxrss * (1 if platform == 'darwin' else 1024)
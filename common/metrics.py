@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from contextlib import contextmanager
+from common.memory import resident_memory_bytes
+
+# Default histogram buckets, in seconds, from 10 microseconds (in-memory lookups) to 30 seconds (downloads)
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(names, values)]
+
+    if extra:
+        labels.append(extra)
+
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.lock = Lock()
+
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def samples(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {value}' for name, labels, value in self.samples())
+
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), registry=None):
+        super().__init__(name=name, documentation=documentation, labels=labels, registry=registry)
+        self.values = dict()
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> list:
+        with self.lock:
+            values = list(self.values.items())
+
+        return [(self.name, format_labels(self.label_names, labels), value) for labels, value in values]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), registry=None):
+        super().__init__(name=name, documentation=documentation, labels=labels, registry=registry)
+        self.values = dict()
+        self.function = None
+
+    def set(self, value: float, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def set_function(self, function):
+        """
+        Compute the value of the gauge when the metrics are collected instead of keeping it up to date
+        :param function: Callable without arguments that returns the value, or None if there is no value
+        """
+        self.function = function
+
+    def samples(self) -> list:
+        if self.function is not None:
+            value = self.function()
+            return [] if value is None else [(self.name, '', value)]
+
+        with self.lock:
+            values = list(self.values.items())
+
+        return [(self.name, format_labels(self.label_names, labels), value) for labels, value in values]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 registry=None):
+        super().__init__(name=name, documentation=documentation, labels=labels, registry=registry)
+        self.buckets = tuple(buckets)
+
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self.values = dict()
+
+    def observe(self, value: float, *labels):
+        position = bisect_left(self.buckets, value)
+
+        with self.lock:
+            entry = self.values.get(labels)
+
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            entry[0][position] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *labels)
+
+    def samples(self) -> list:
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+
+        samples = list()
+
+        for labels, counts, total in values:
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket',
+                                format_labels(self.label_names, labels, extra=f'le="{bound}"'),
+                                cumulative))
+
+            samples.append((f'{self.name}_sum', format_labels(self.label_names, labels), total))
+            samples.append((f'{self.name}_count', format_labels(self.label_names, labels), cumulative))
+
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = list()
+
+    def register(self, metric: Metric):
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        """
+        Render all the metrics in the Prometheus text exposition format
+        """
+        return '\n'.join(x.render() for x in self.metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# Catalogue metrics, shared by SDMDescriptionFile and AsyncSDMDescriptionFile
+CATALOGUE_DOWNLOAD_SECONDS = Histogram('sdm_catalogue_download_seconds',
+                                       'Time spent downloading each catalogue', labels=('catalogue',))
+CATALOGUE_DOWNLOAD_BYTES = Gauge('sdm_catalogue_download_bytes',
+                                 'Size of the last payload downloaded for each catalogue', labels=('catalogue',))
+CATALOGUE_REFRESH_TOTAL = Counter('sdm_catalogue_refresh_total',
+                                  'Refreshes of the catalogues by result', labels=('result',))
+CATALOGUE_ENTITIES = Gauge('sdm_catalogue_entities', 'Number of Entity Types in the index')
+CATALOGUE_AGE_SECONDS = Gauge('sdm_catalogue_age_seconds', 'Time since the catalogues were downloaded')
+INDEX_BUILD_SECONDS = Histogram('sdm_index_build_seconds', 'Time spent building the index of the catalogues')
+LOOKUP_SECONDS = Histogram('sdm_lookup_seconds', 'Time spent resolving an Entity Type in the index')
+LOOKUP_TOTAL = Counter('sdm_lookup_total', 'Entity Type lookups by result', labels=('result',))
+
+CATALOGUE_MEMORY_BYTES = Gauge('sdm_catalogue_memory_bytes',
+                               'Memory used by the index of the catalogues by component', labels=('component',))
+PROCESS_RESIDENT_MEMORY_BYTES = Gauge('sdm_process_resident_memory_bytes', 'Resident memory of the process')
+PROCESS_RESIDENT_MEMORY_BYTES.set_function(resident_memory_bytes)
+
+SCHEMA_FETCH_COALESCED_TOTAL = Counter('sdm_schema_fetch_coalesced_total',
+                                       'Requests of a JSON Schema that waited for a download already in flight')
+VALIDATOR_CACHE_TOTAL = Counter('sdm_validator_cache_total', 'Lookups of the compiled JSON Schema validators by result',
+                                labels=('result',))
+SQL_COMPILE_TOTAL = Counter('sdm_sql_compile_total', 'Lookups of the compiled SQL DDL by result', labels=('result',))
+
+# API metrics
+REQUEST_SECONDS = Histogram('sdm_http_request_duration_seconds', 'Latency of the HTTP requests',
+                            labels=('method', 'route', 'status'))
@@ -20,39 +20,382 @@
 # under the License.
 ##
 
+from time import perf_counter
+
+# Taken before the other imports, --profile-startup reports the time spent in them
+STARTED = perf_counter()
+
 from cli.command import parse_cli
-from api.server import launch
+from cli.startup_profile import StartupProfile
 from common.SDMDescriptionFile import SDMDescriptionFile
+from common.BaseSDMDescriptionFile import CatalogueNotReady
+from common.ReverseIndex import SUBJECT, REPO_LINK, JSON_SCHEMA_URL
 from api.custom_logging import CustomizeLogger
+from itertools import islice
+from json import dumps
+import sys
+
+# Number of Entity Types resolved per call to get_data_batch when reading them from a file
+BATCH_SIZE = 1000
+
+# Options of the lookup command and the kind of key that they look up
+LOOKUP_OPTIONS = {'--subject': SUBJECT, '--repo': REPO_LINK, '--schema-url': JSON_SCHEMA_URL}
 
+# Commands that write their results to stdout, their log is written to stderr so that it is not mixed with them
+STDOUT_COMMANDS = ('run', 'search', 'lookup', 'subjects', 'sql', 'validate', 'warm', 'export')
 
-def get_logger():
+
+def get_logger(stream=sys.stdout):
     custom_logger = CustomizeLogger()
-    customize_logger = custom_logger.get_logger()
+    customize_logger = custom_logger.get_logger(stream=stream)
 
     return customize_logger
 
 
-if __name__ == "__main__":
-    logger = get_logger()
-    args = parse_cli()
+def source_options(args) -> dict:
+    """
+    Options of the catalogue service given in the command line, the configuration is used for the missing ones
+    """
+    return {'source': args["--source"], 'offline': True if args["--offline"] else None}
+
+
+def run_batch(sdm_description: SDMDescriptionFile, input_file):
+    """
+    Resolve the Entity Types read from a file, one per line, and write the results to stdout as NDJSON
+    :param sdm_description: The SDMDescriptionFile used to obtain the links
+    :param input_file: File object with one Entity Type per line
+    """
+    entity_types = (line.strip() for line in input_file)
+    entity_types = (x for x in entity_types if x)
+
+    while batch := list(islice(entity_types, BATCH_SIZE)):
+        results = sdm_description.get_data_batch(entity_names=batch)
+
+        for entity_type in batch:
+            sys.stdout.write(dumps({'type': entity_type, **results[entity_type]}) + '\n')
+
+        sys.stdout.flush()
+
+
+def compile_sql(sdm_description: SDMDescriptionFile, entity_types: list, dialect: str) -> dict:
+    """
+    Compile the SQL DDL of the Data Models of several Entity Types, see SQLSchema.compile_links
+    :return: Dictionary keyed by Entity Type with either the key 'sql' or the key 'error'
+    """
+    # The HTTP client and the compiler are only imported to compile
+    from common.SchemaCache import SchemaCache
+    from common.SQLSchema import SQLCompiler, compile_links
+    from common.config import load_config
+    import asyncio
+
+    config = load_config()
+    cache_config = config.get('cache', dict())
+
+    results = sdm_description.get_data_batch(entity_names=entity_types)
+    links_by_type = {k: v['links'] for k, v in results.items() if 'links' in v}
+
+    async def compile_all() -> dict:
+        schema_cache = SchemaCache(directory=cache_config.get('directory', './cache'),
+                                   **cache_config.get('schemas', dict()))
+        await schema_cache.start()
+
+        try:
+            return await compile_links(links_by_type=links_by_type, schema_cache=schema_cache, compiler=compiler,
+                                       dialect=dialect)
+        finally:
+            await schema_cache.stop()
+
+    compiler = SQLCompiler(**config.get('sql', dict()))
+
+    try:
+        compiled = asyncio.run(compile_all())
+    finally:
+        compiler.close()
+
+    # The Entity Types not found in the catalogues keep the error of get_data_batch
+    return {k: {x: y for x, y in compiled.get(k, v).items() if x in ('sql', 'error')} for k, v in results.items()}
+
+
+def validate_payloads(sdm_description: SDMDescriptionFile, payload: str = None, input_file=None):
+    """
+    Validate NGSI-LD entities against the JSON Schemas of their type and write the results to stdout as NDJSON, see
+    PayloadValidator
+    :param sdm_description: The SDMDescriptionFile used to obtain the links
+    :param payload: NGSI-LD entity as a JSON document
+    :param input_file: Binary file object with one NGSI-LD entity per line, used if there is no payload
+    """
+    # The HTTP client and the validator are only imported to validate
+    from common.SchemaCache import SchemaCache
+    from common.PayloadValidator import PayloadValidator, iter_lines, schema_resolver
+    from common.config import load_config
+    from orjson import loads, JSONDecodeError
+    import asyncio
+
+    config = load_config()
+    cache_config = config.get('cache', dict())
+
+    async def get_data(entity_name: str) -> list:
+        return await asyncio.to_thread(sdm_description.get_data, entity_name=entity_name)
+
+    async def chunks():
+        # The file is read in blocks and split by iter_lines, which bounds the length of the lines kept in memory
+        while chunk := input_file.read(65536):
+            yield chunk
+
+    async def validate_all():
+        schema_cache = SchemaCache(directory=cache_config.get('directory', './cache'),
+                                   **cache_config.get('schemas', dict()))
+        await schema_cache.start()
+
+        resolve = schema_resolver(get_data=get_data, schema_cache=schema_cache)
+
+        try:
+            if input_file is None:
+                try:
+                    result = await validator.validate(payload=loads(payload), resolve=resolve)
+                except JSONDecodeError as e:
+                    result = {'valid': False, 'error': f'Invalid JSON: {e}'}
+
+                sys.stdout.write(dumps(result) + '\n')
+            else:
+                async for result in validator.validate_stream(lines=iter_lines(chunks()), resolve=resolve):
+                    sys.stdout.write(dumps(result) + '\n')
+        finally:
+            await schema_cache.stop()
+
+    validator = PayloadValidator(**config.get('validate', dict()))
+
+    try:
+        asyncio.run(validate_all())
+    finally:
+        validator.close()
+
+
+def warm_cache(sdm_description: SDMDescriptionFile, concurrency: int) -> dict:
+    """
+    Download the JSON Schemas of all the Data Models into the cache of the server, see SchemaCache.warm. The
+    documents that cannot be cached are written to stdout as NDJSON.
+    :param sdm_description: The SDMDescriptionFile used to obtain the links
+    :param concurrency: Maximum number of documents downloaded at the same time
+    :return: Dictionary with the number of documents, of the cached ones and of the failed ones
+    """
+    # The HTTP client is only imported to download the documents
+    from common.SchemaCache import SchemaCache
+    from common.config import load_config
+    import asyncio
+
+    cache_config = load_config().get('cache', dict())
+    urls = sdm_description.json_schema_urls()
+
+    async def warm_all() -> int:
+        schema_cache = SchemaCache(directory=cache_config.get('directory', './cache'),
+                                   **cache_config.get('schemas', dict()))
+        await schema_cache.start()
+
+        failed = 0
+
+        try:
+            async for url, error in schema_cache.warm(urls=urls, concurrency=concurrency):
+                if error is not None:
+                    failed += 1
+                    sys.stdout.write(dumps({'jsonSchema': url, 'error': str(error)}) + '\n')
+        finally:
+            await schema_cache.stop()
+
+        return failed
+
+    failed = asyncio.run(warm_all())
+
+    return {'documents': len(urls), 'cached': len(urls) - failed, 'failed': failed}
+
+
+def run_command(args, logger, profile: StartupProfile):
+    """
+    Run the command given in the command line
+    :param args: Arguments parsed by parse_cli
+    :param logger: Logger of the command
+    :param profile: Start-up profile, marked when the catalogue service is ready and when the answer is written
+    """
+    if args["run"] is True and args["--input"] is not None:
+        sdm_description = SDMDescriptionFile(**source_options(args))
+        profile.mark('catalogue service')
+
+        try:
+            if args["--input"] == '-':
+                run_batch(sdm_description=sdm_description, input_file=sys.stdin)
+            else:
+                with open(args["--input"]) as input_file:
+                    run_batch(sdm_description=sdm_description, input_file=input_file)
+        except OSError as e:
+            print(f'Unable to read the Entity Types: {e}')
+            logger.error(f'Unable to read the Entity Types: {e}')
+        finally:
+            sdm_description.stop()
 
-    if args["run"] is True:
+        profile.mark('answers')
+
+    elif args["run"] is True:
         entity_type = args["--entity_type"]
 
-        sdm_description = SDMDescriptionFile()
+        sdm_description = SDMDescriptionFile(**source_options(args))
+        profile.mark('catalogue service')
 
         try:
             response = sdm_description.get_data(entity_name=entity_type)
             print(response)
-            sdm_description.stop()
-        except IndexError as e:
+        except (KeyError, IndexError):
             print(f'Unable to find the Entity Name: {entity_type}')
             logger.error(f'Unable to find the Entity Name: {entity_type}')
+
+            suggestions = sdm_description.suggest(entity_name=entity_type)
+            if suggestions:
+                print(f'Did you mean: {", ".join(suggestions)}?')
+        finally:
+            sdm_description.stop()
+
+        profile.mark('answer')
+
+    elif args["search"] is True:
+        sdm_description = SDMDescriptionFile(**source_options(args))
+
+        try:
+            for result in sdm_description.search(query=args["QUERY"], limit=int(args["--limit"])):
+                print(dumps(result))
+        finally:
+            sdm_description.stop()
+
+    elif args["lookup"] is True:
+        kind, key = next((kind, args[option]) for option, kind in LOOKUP_OPTIONS.items() if args[option] is not None)
+
+        sdm_description = SDMDescriptionFile(**source_options(args))
+
+        try:
+            _, entity_types = sdm_description.lookup(kind=kind, key=key)
+
+            for entity_type in entity_types:
+                print(dumps({'type': entity_type}))
+        except KeyError as e:
+            print(e.args[0])
+            logger.error(e.args[0])
+        finally:
+            sdm_description.stop()
+
+    elif args["subjects"] is True:
+        sdm_description = SDMDescriptionFile(**source_options(args))
+
+        try:
+            _, subjects = sdm_description.list_subjects(prefix=args["--prefix"])
+
+            for subject in subjects:
+                print(dumps({'subject': subject}))
+        finally:
+            sdm_description.stop()
+
+    elif args["export"] is True:
+        sdm_description = SDMDescriptionFile(**source_options(args))
+
+        output_path = args["--output"] or f'sdm-catalogue.{args["--format"]}' + ('.gz' if args["--gzip"] else '')
+        try:
+            chunks = sdm_description.export(export_format=args["--format"], compress=args["--gzip"])
+
+            if output_path == '-':
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+
+                sys.stdout.buffer.flush()
+            else:
+                with open(output_path, 'wb') as output:
+                    for chunk in chunks:
+                        output.write(chunk)
+
+                print(output_path)
+        except OSError as e:
+            print(f'Unable to write the export: {e}', file=sys.stderr)
+            logger.error(f'Unable to write the export: {e}')
+        finally:
+            sdm_description.stop()
+
+    elif args["sql"] is True:
+        sdm_description = SDMDescriptionFile(**source_options(args))
+
+        try:
+            if args["--input"] is None:
+                entity_types = [args["--entity_type"]]
+            elif args["--input"] == '-':
+                entity_types = [x.strip() for x in sys.stdin if x.strip()]
+            else:
+                with open(args["--input"]) as input_file:
+                    entity_types = [x.strip() for x in input_file if x.strip()]
+
+            results = compile_sql(sdm_description=sdm_description, entity_types=entity_types,
+                                  dialect=args["--dialect"])
+
+            if args["--input"] is None:
+                result = results[entity_types[0]]
+                print(result.get('sql', f'-- {result.get("error")}'))
+            else:
+                for entity_type, result in results.items():
+                    print(dumps({'type': entity_type, **result}))
+        except OSError as e:
+            print(f'Unable to read the Entity Types: {e}')
+            logger.error(f'Unable to read the Entity Types: {e}')
+        finally:
+            sdm_description.stop()
+
+    elif args["validate"] is True:
+        sdm_description = SDMDescriptionFile(**source_options(args))
+
+        try:
+            if args["--input"] is None:
+                validate_payloads(sdm_description=sdm_description, payload=args["--payload"])
+            elif args["--input"] == '-':
+                validate_payloads(sdm_description=sdm_description, input_file=sys.stdin.buffer)
+            else:
+                with open(args["--input"], 'rb') as input_file:
+                    validate_payloads(sdm_description=sdm_description, input_file=input_file)
+        except OSError as e:
+            print(f'Unable to read the NGSI-LD entities: {e}')
+            logger.error(f'Unable to read the NGSI-LD entities: {e}')
+        finally:
+            sdm_description.stop()
+
+    elif args["warm"] is True:
+        sdm_description = SDMDescriptionFile(**source_options(args))
+
+        try:
+            print(dumps(warm_cache(sdm_description=sdm_description, concurrency=int(args["--concurrency"]))))
+        finally:
             sdm_description.stop()
 
     elif args["server"] is True:
+        # The server stack is only imported to launch the server
+        from api.server import launch
+
         port = int(args["--port"])
         host = args["--host"]
+        workers = int(args["--workers"])
+
+        launch(app="api.server:application", host=host, port=port, workers=workers, http2=args["--http2"],
+               compress=args["--compress"], **source_options(args))
+
+
+if __name__ == "__main__":
+    profile = StartupProfile(started=STARTED)
+    profile.mark('imports')
+
+    args = parse_cli()
+    profile.mark('arguments')
+
+    logger = get_logger(stream=sys.stderr if any(args[x] for x in STDOUT_COMMANDS) else sys.stdout)
+    profile.mark('logger')
+
+    try:
+        run_command(args=args, logger=logger, profile=profile)
+    except CatalogueNotReady as e:
+        # No snapshot and the catalogues could not be loaded, e.g. offline or the sources are not reachable
+        print(e, file=sys.stderr)
+        logger.error(str(e))
+        sys.exit(1)
 
-        launch(app="api.server:application", host=host, port=port)
+    if args["--profile-startup"]:
+        profile.report()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from os.path import dirname, abspath
+import sys
+import pytest
+
+# The modules are imported from the root of the repository, as the service and the command line do
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+
+@pytest.fixture
+def catalogues() -> tuple:
+    """
+    Small catalogues with an Entity Type defined by two subjects, an Entity Type with less metadata entries than
+    subjects and one without any metadata entry, i.e. both with incomplete metadata
+    :return: Tuple with the official list and the metadata
+    """
+    official_list = {'officialList': [
+        {'name': 'dataModel.Weather', 'repoLink': 'https://github.com/smart-data-models/dataModel.Weather.git',
+         'dataModels': ['WeatherObserved', 'WeatherForecast', 'Alarm', 'Partial']},
+        {'name': 'dataModel.Environment', 'repoLink': 'https://github.com/smart-data-models/dataModel.Environment',
+         'dataModels': ['AirQualityObserved', 'Alarm', 'Partial', 'Orphan']},
+    ]}
+
+    metadata = [
+        {'dataModel': x, 'yamlUrl': f'https://example.org/{x}/{i}/model.yaml',
+         'jsonSchemaUrl': f'https://example.org/{x}/{i}/schema.json'}
+        for i, x in enumerate(['WeatherObserved', 'WeatherForecast', 'Alarm', 'AirQualityObserved', 'Alarm',
+                               'Partial'])
+    ]
+
+    return official_list, metadata
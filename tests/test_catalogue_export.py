@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+import pytest
+from common.CatalogueExport import iter_export, read_export, catalogues_from_export, export_records
+from common.CatalogueIndex import CatalogueIndex
+from common.constants import FORMATS
+
+
+def index_of(official_list: dict, metadata: list) -> CatalogueIndex:
+    return CatalogueIndex(official_list_data_models_data=official_list, data_models_metadata_data=metadata)
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('export_format', FORMATS)
+def test_roundtrip(tmp_path, catalogues, export_format, compress):
+    index = index_of(*catalogues)
+    path = tmp_path / f'export.{export_format}'
+    path.write_bytes(b''.join(iter_export(index=index, export_format=export_format, compress=compress,
+                                          directory=str(tmp_path))))
+
+    imported = index_of(*catalogues_from_export(read_export(path=str(path))))
+
+    assert imported.responses == index.responses
+    assert imported.incomplete == index.incomplete
+    assert imported.version == index.version
+    assert imported.list_subjects() == index.list_subjects()
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_incomplete_entities_are_exported(catalogues):
+    index = index_of(*catalogues)
+    records = [x for x in export_records(index=index) if x['type'] in ('Orphan', 'Partial')]
+
+    assert index.incomplete == {'Orphan', 'Partial'}
+    assert [(x['type'], x['subject']) for x in records] == [
+        ('Orphan', 'dataModel.Environment'), ('Partial', 'dataModel.Environment'), ('Partial', 'dataModel.Weather')]
+    assert all(x['repo'] == x['yaml'] == x['jsonSchema'] == '' for x in records)
+
+
+def test_records_are_sorted_by_entity_type(catalogues):
+    types = [x['type'] for x in export_records(index=index_of(*catalogues))]
+
+    assert types == sorted(types)
+
+
+def test_inconsistent_order_of_the_subjects():
+    records = [
+        {'type': x, 'subject': subject, 'repoLink': f'https://github.com/{subject}', 'repo': f'{subject}/{x}',
+         'yaml': f'{subject}/{x}.yaml', 'jsonSchema': f'{subject}/{x}.json'}
+        for x, subject in (('A', 'first'), ('A', 'second'), ('B', 'second'), ('B', 'first'))
+    ]
+
+    with pytest.raises(ValueError, match='Inconsistent order'):
+        catalogues_from_export(records)
+
+
+def test_unknown_file(tmp_path):
+    path = tmp_path / 'export.txt'
+    path.write_bytes(b'not an export\n')
+
+    with pytest.raises(ValueError):
+        list(read_export(path=str(path)))
+
+
+def test_unknown_format(catalogues):
+    with pytest.raises(ValueError, match='Unknown export format'):
+        next(iter_export(index=index_of(*catalogues), export_format='xml'))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from datetime import datetime
+from json import dump
+import pytest
+from common.CatalogueSnapshot import save_snapshot, load_snapshot, SNAPSHOT_FORMAT
+
+SOURCES = {'official_list_data_models': 'https://example.org/official.json',
+           'data_models_metadata': 'https://example.org/metadata.json'}
+
+
+def test_roundtrip(tmp_path, catalogues):
+    official_list, metadata = catalogues
+    path = str(tmp_path / 'catalogue.json')
+    fetched_at = datetime.now()
+
+    save_snapshot(path=path, official_list_data_models_data=official_list, data_models_metadata_data=metadata,
+                  sources=SOURCES, fetched_at=fetched_at, validators={'x': {'etag': '"1"'}})
+
+    assert load_snapshot(path=path, sources=SOURCES) == (official_list, metadata, fetched_at, {'x': {'etag': '"1"'}})
+
+
+def test_other_sources(tmp_path, catalogues):
+    path = str(tmp_path / 'catalogue.json')
+    save_snapshot(path=path, official_list_data_models_data=catalogues[0], data_models_metadata_data=catalogues[1],
+                  sources=SOURCES, fetched_at=datetime.now(), validators={})
+
+    assert load_snapshot(path=path, sources={**SOURCES, 'data_models_metadata': 'file:///metadata.json'}) is None
+
+
+@pytest.mark.parametrize('content', [None, b'', b'{"meta": {"format": 1', b'\xff\xfe'])
+def test_missing_or_unreadable_snapshot(tmp_path, content):
+    path = tmp_path / 'catalogue.json'
+
+    if content is not None:
+        path.write_bytes(content)
+
+    assert load_snapshot(path=str(path), sources=SOURCES) is None
+
+
+def meta(**fields) -> dict:
+    return {'format': SNAPSHOT_FORMAT, 'sources': SOURCES, 'fetched_at': '2024-01-01T00:00:00+00:00', **fields}
+
+
+@pytest.mark.parametrize('snapshot', [
+    [1, 2],
+    {'meta': meta(), 'metadata': []},
+    {'meta': meta(), 'officialList': []},
+    {'meta': {'format': SNAPSHOT_FORMAT, 'sources': SOURCES}, 'officialList': [], 'metadata': []},
+    {'meta': meta(fetched_at='yesterday'), 'officialList': [], 'metadata': []},
+    {'meta': meta(fetched_at=1), 'officialList': [], 'metadata': []},
+])
+def test_malformed_snapshot(tmp_path, snapshot):
+    path = tmp_path / 'catalogue.json'
+
+    with open(path, 'w') as file:
+        dump(snapshot, file)
+
+    with pytest.raises(ValueError, match='Malformed catalogue snapshot'):
+        load_snapshot(path=str(path), sources=SOURCES)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from gzip import decompress
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from api.compression import CompressionMiddleware, negotiate, brotli
+
+BODY = b'{"type": "WeatherObserved"}\n' * 100
+
+
+def large(request):
+    return Response(BODY, media_type='application/json', headers={'ETag': '"v1"'})
+
+
+def small(request):
+    return Response(b'{}', media_type='application/json')
+
+
+def encoded(request):
+    return Response(BODY, media_type='application/json', headers={'Content-Encoding': 'identity'})
+
+
+def archive(request):
+    return Response(BODY, media_type='application/gzip')
+
+
+def stream(request):
+    async def chunks():
+        for _ in range(3):
+            yield b'{"line": 1}\n'
+
+    return StreamingResponse(chunks(), media_type='application/x-ndjson')
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[Route(f'/{x.__name__}', x) for x in (large, small, encoded, archive, stream)])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip', 'gzip'),
+    ('br, gzip', 'br'),
+    ('gzip;q=0.5, br;q=0.1', 'br'),
+    ('br;q=0, gzip', 'gzip'),
+    ('gzip;q=0', None),
+    ('gzip;q=0, *', 'br'),
+    ('*;q=0', None),
+    ('*', 'br'),
+    ('identity', None),
+    ('', None),
+    ('GZIP ; q=1.0', 'gzip'),
+    ('gzip;q=invalid', None),
+])
+def test_negotiate(accept_encoding, expected):
+    assert negotiate(accept_encoding=accept_encoding, encodings=('br', 'gzip')) == expected
+
+
+def test_gzip(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'].lower() == 'accept-encoding'
+    assert response.headers['etag'] == 'W/"v1"'
+    assert response.content == BODY
+
+
+@pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+def test_brotli(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['content-encoding'] == 'br'
+    assert response.content == BODY
+
+
+def test_rejected_encodings(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip;q=0, br;q=0'})
+
+    assert 'content-encoding' not in response.headers
+    assert response.headers['vary'].lower() == 'accept-encoding'
+    assert response.headers['etag'] == '"v1"'
+    assert response.content == BODY
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'content-encoding' not in response.headers
+    assert response.headers['vary'].lower() == 'accept-encoding'
+
+
+@pytest.mark.parametrize('path', ['/encoded', '/archive'])
+def test_encoded_responses_are_sent_as_they_are(client, path):
+    response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers.get('content-encoding') in (None, 'identity')
+    assert 'vary' not in response.headers
+    assert response.content == BODY
+
+
+def test_streamed_responses_are_compressed_whatever_their_size(client):
+    with client.stream('GET', '/stream', headers={'Accept-Encoding': 'gzip'}) as response:
+        raw = b''.join(response.iter_raw())
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'content-length' not in response.headers
+    assert decompress(raw) == b'{"line": 1}\n' * 3
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from random import Random
+from common.EntitySearch import EntitySearch, edit_distance, normalize, default_max_distance
+
+
+def levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+
+    for i, x in enumerate(a, start=1):
+        current = [i]
+        for j, y in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+
+    return previous[-1]
+
+
+def random_names(random: Random, amount: int) -> list:
+    alphabet = 'abcdeABCDE_'
+    return sorted({''.join(random.choice(alphabet) for _ in range(random.randint(1, 12))) for _ in range(amount)})
+
+
+def test_edit_distance_matches_levenshtein():
+    random = Random(1)
+
+    for _ in range(2000):
+        a = ''.join(random.choice('abc') for _ in range(random.randint(0, 10)))
+        b = ''.join(random.choice('abc') for _ in range(random.randint(0, 10)))
+
+        assert edit_distance(a)(b) == levenshtein(a, b), (a, b)
+
+
+def test_edit_distance_of_keys_longer_than_a_machine_word():
+    a = 'AirQualityObservedWithAVeryLongNameThatNeedsMoreThanSixtyFourBits' * 2
+    b = a.replace('Quality', 'Qualty').replace('Bits', 'Bytes')
+
+    assert edit_distance(a)(b) == levenshtein(a, b)
+
+
+def test_fuzzy_search_finds_every_name_within_the_distance():
+    random = Random(2)
+    names = random_names(random, amount=300)
+    search = EntitySearch(names)
+
+    for query in random_names(random, amount=200):
+        key = normalize(query)
+
+        # Queries made only of separators are not searched
+        if not key:
+            continue
+
+        max_distance = default_max_distance(key)
+        results = search.search(query=query, limit=len(names), max_distance=max_distance)
+        found = {x['type'] for x in results}
+
+        expected = {x for x in names if levenshtein(key, normalize(x)) <= max_distance}
+        assert expected <= found, query
+
+        for result in results:
+            if result['match'] == 'fuzzy':
+                assert result['distance'] == levenshtein(key, normalize(result['type']))
+                assert result['distance'] <= max_distance
+
+
+def test_fuzzy_search_ranks_the_closest_names_first():
+    random = Random(3)
+    names = random_names(random, amount=300)
+    search = EntitySearch(names)
+
+    for query in random_names(random, amount=100):
+        fuzzy = [x['distance'] for x in search.search(query=query, limit=len(names)) if x['match'] == 'fuzzy']
+
+        assert fuzzy == sorted(fuzzy)
+
+
+def test_search_match_kinds():
+    search = EntitySearch(['WeatherObserved', 'WeatherForecast', 'AirQualityObserved'])
+
+    assert search.search('WeatherObserved')[0] == {'type': 'WeatherObserved', 'match': 'exact', 'distance': 0}
+    assert search.search('weather_observed')[0] == {'type': 'WeatherObserved', 'match': 'normalized', 'distance': 0}
+    assert search.search('weatherfore')[0] == {'type': 'WeatherForecast', 'match': 'prefix', 'distance': 4}
+    assert search.search('WeatherObserbed')[0] == {'type': 'WeatherObserved', 'match': 'fuzzy', 'distance': 1}
+
+
+def test_search_ignores_invalid_queries():
+    search = EntitySearch(['WeatherObserved'])
+
+    assert search.search('') == []
+    assert search.search('_-.') == []
+    assert search.search({'type': 'WeatherObserved'}) == []
+    assert search.search('WeatherObserved', limit=0) == []
+
+
+def test_suggest_excludes_the_query():
+    search = EntitySearch(['Alarm', 'Alarms', 'Alert'])
+
+    assert 'Alarm' not in search.suggest('Alarm')
+    assert search.suggest('Alarn')[0] == 'Alarm'
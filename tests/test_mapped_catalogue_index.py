@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from datetime import datetime
+import pytest
+from common.CatalogueIndex import CatalogueIndex
+from common.MappedCatalogueIndex import MappedCatalogueIndex, write_mapped_index
+
+
+@pytest.fixture
+def indexes(tmp_path, catalogues) -> tuple:
+    official_list, metadata = catalogues
+
+    # Names around the ones of the catalogues, so the binary search ends on both sides and in between
+    official_list['officialList'].append({'name': 'dataModel.Other', 'repoLink': 'https://github.com/x/dataModel.Other',
+                                          'dataModels': [f'Entity{i:03}' for i in range(0, 200, 2)]})
+    metadata.extend({'dataModel': f'Entity{i:03}', 'yamlUrl': f'y{i}', 'jsonSchemaUrl': f'j{i}'}
+                    for i in range(0, 200, 2))
+
+    index = CatalogueIndex(official_list_data_models_data=official_list, data_models_metadata_data=metadata)
+    path = str(tmp_path / 'catalogue.index')
+    write_mapped_index(path=path, index=index, fetched_at=datetime.now())
+
+    return index, MappedCatalogueIndex(path=path)
+
+
+def test_same_responses(indexes):
+    index, mapped = indexes
+
+    assert list(mapped.names()) == list(index.names())
+    assert len(mapped) == len(index)
+    assert mapped.version == index.version
+
+    for entity_name in index.names():
+        assert mapped.get_response(entity_name=entity_name) == index.get_response(entity_name=entity_name)
+
+
+@pytest.mark.parametrize('entity_name', ['', 'AAA', 'Entity001', 'Entity199', 'Entity200', 'Zzz', 'weatherobserved'])
+def test_missing_entity_types(indexes, entity_name):
+    for index in indexes:
+        with pytest.raises(KeyError, match='No Data Models found'):
+            index.get_response(entity_name=entity_name)
+
+
+@pytest.mark.parametrize('entity_name', [{'type': 'Alarm'}, ['Alarm'], None])
+def test_invalid_entity_types(indexes, entity_name):
+    for index in indexes:
+        with pytest.raises(KeyError):
+            index.get_response(entity_name=entity_name)
+
+
+@pytest.mark.parametrize('entity_name', ['Partial', 'Orphan'])
+def test_incomplete_entity_types(indexes, entity_name):
+    for index in indexes:
+        with pytest.raises(IndexError, match='Incomplete metadata'):
+            index.get_data(entity_name=entity_name)
+
+        assert index.get_data_batch([entity_name]) == {entity_name: {
+            'error': f'Incomplete metadata for entity {entity_name}'}}
+
+
+def test_reverse_lookups(indexes):
+    index, mapped = indexes
+
+    assert mapped.list_subjects() == index.list_subjects()
+    assert mapped.lookup(kind='subject', key='dataModel.Weather') == index.lookup(kind='subject',
+                                                                                 key='dataModel.Weather')
+    assert mapped.search('Partial') == index.search('Partial')
+
+
+def test_not_an_index_file(tmp_path):
+    path = tmp_path / 'catalogue.index'
+    path.write_bytes(b'\0' * 64)
+
+    with pytest.raises(ValueError):
+        MappedCatalogueIndex(path=str(path))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from hashlib import sha256
+from json import dumps
+import asyncio
+import pytest
+from common.PayloadValidator import PayloadValidator, iter_lines, LongLine, CHUNK_LINES
+
+SCHEMA = dumps({
+    'type': 'object',
+    'properties': {'id': {'type': 'string'}, 'temperature': {'type': 'number', 'minimum': -273.15}},
+    'required': ['id'],
+}).encode()
+
+
+async def resolve(entity_type: str) -> list:
+    if entity_type != 'WeatherObserved':
+        raise KeyError(entity_type)
+
+    return [(sha256(SCHEMA).hexdigest(), SCHEMA, 'https://example.org/schema.json')]
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+def split(chunks, max_length: int) -> list:
+    async def collect():
+        return [x async for x in iter_lines(iterate(chunks), max_length=max_length)]
+
+    return asyncio.run(collect())
+
+
+def validate_stream(validator: PayloadValidator, lines: list) -> list:
+    async def collect():
+        return [x async for x in validator.validate_stream(lines=iterate(lines), resolve=resolve)]
+
+    try:
+        return asyncio.run(collect())
+    finally:
+        validator.close()
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 1000])
+def test_iter_lines_in_any_chunk_size(size):
+    content = b'{"a": 1}\n\n{"b": 2}\n{"c": 3}'
+    chunks = [content[i:i + size] for i in range(0, len(content), size)]
+
+    assert split(chunks, max_length=100) == [b'{"a": 1}', b'', b'{"b": 2}', b'{"c": 3}']
+
+
+def test_iter_lines_replaces_long_lines():
+    lines = split([b'short\n', b'x' * 6, b'x' * 6, b'\nend\n'], max_length=10)
+
+    assert lines[0] == b'short'
+    assert isinstance(lines[1], LongLine) and lines[1].length == 12
+    assert lines[2] == b'end'
+    assert len(lines) == 3
+
+
+def test_validate_stream_in_chunks():
+    valid = dumps({'id': 'urn:ngsi-ld:WeatherObserved:1', 'type': 'WeatherObserved', 'temperature': 20}).encode()
+    invalid = dumps({'id': 'urn:ngsi-ld:WeatherObserved:2', 'type': 'WeatherObserved', 'temperature': -300}).encode()
+    lines = [valid if i % 2 else invalid for i in range(2 * CHUNK_LINES + 10)]
+
+    results = validate_stream(PayloadValidator(min_parallel=10 * CHUNK_LINES), lines=lines)
+
+    assert [x['line'] for x in results] == list(range(1, len(lines) + 1))
+    assert [x['valid'] for x in results] == [bool(i % 2) for i in range(len(lines))]
+    assert results[0]['errors'][0]['path'] == '/temperature'
+
+
+def test_validate_stream_in_the_pool():
+    line = dumps({'id': 'urn:ngsi-ld:WeatherObserved:1', 'type': 'WeatherObserved'}).encode()
+
+    results = validate_stream(PayloadValidator(workers=1, min_parallel=0), lines=[line] * (CHUNK_LINES + 1))
+
+    assert len(results) == CHUNK_LINES + 1
+    assert all(x['valid'] for x in results)
+
+
+def test_validate_stream_errors_per_line():
+    lines = [b'not json', b'', b'[1]', dumps({'type': 'Unknown'}).encode(), LongLine(length=20, max_length=10)]
+
+    results = validate_stream(PayloadValidator(), lines=lines)
+
+    assert [x['line'] for x in results] == [1, 3, 4, 5]
+    assert all(not x['valid'] for x in results)
+    assert results[0]['error'].startswith('Invalid JSON')
+    assert results[2] == {'line': 4, 'type': 'Unknown', 'valid': False,
+                          'error': 'No Data Models found for entity Unknown'}
+    assert results[3]['error'] == 'The line has 20 bytes, the maximum is 10'
+
+
+def test_validate_one_payload():
+    validator = PayloadValidator()
+
+    assert asyncio.run(validator.validate({'id': 'x', 'type': 'WeatherObserved'}, resolve=resolve)) == \
+        {'type': 'WeatherObserved', 'valid': True}
+    assert 'error' in asyncio.run(validator.validate([1], resolve=resolve))
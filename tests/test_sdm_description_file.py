@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from datetime import datetime
+from json import dump
+import logging
+import time
+import pytest
+from common.BaseSDMDescriptionFile import CatalogueNotReady
+from common.CatalogueSnapshot import save_snapshot, get_snapshot_path, SNAPSHOT_FORMAT
+from common.SDMDescriptionFile import SDMDescriptionFile
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # The configuration is read from the working directory, without it the defaults are used
+    monkeypatch.chdir(tmp_path)
+
+    return tmp_path
+
+
+def offline_description(snapshot_dir) -> SDMDescriptionFile:
+    return SDMDescriptionFile(logger=logging.getLogger('tests'), snapshot_dir=str(snapshot_dir), offline=True)
+
+
+def sources(snapshot_dir) -> dict:
+    description = offline_description(snapshot_dir)
+    description.stop()
+
+    return {'official_list_data_models': description.official_list_data_models,
+            'data_models_metadata': description.data_models_metadata}
+
+
+def test_offline_without_snapshot(workdir):
+    description = offline_description(workdir)
+
+    try:
+        start = time.monotonic()
+
+        with pytest.raises(CatalogueNotReady):
+            description.get_data(entity_name='WeatherObserved')
+
+        # The command fails once the first attempt ends, it does not wait for the timeout
+        assert time.monotonic() - start < description.command_timeout_seconds
+    finally:
+        description.stop()
+
+
+def test_offline_with_snapshot(workdir, catalogues):
+    save_snapshot(path=get_snapshot_path(str(workdir)), official_list_data_models_data=catalogues[0],
+                  data_models_metadata_data=catalogues[1], sources=sources(workdir),
+                  fetched_at=datetime.now(), validators={})
+
+    description = offline_description(workdir)
+
+    try:
+        assert [x['jsonSchema'] for x in description.get_data(entity_name='Alarm')] == [
+            'https://example.org/Alarm/2/schema.json', 'https://example.org/Alarm/4/schema.json']
+
+        with pytest.raises(IndexError):
+            description.get_data(entity_name='Partial')
+    finally:
+        description.stop()
+
+
+def test_malformed_snapshot_is_ignored(workdir, caplog):
+    with open(get_snapshot_path(str(workdir)), 'w') as file:
+        dump({'meta': {'format': SNAPSHOT_FORMAT, 'sources': sources(workdir), 'fetched_at': 'yesterday'},
+              'officialList': [], 'metadata': []}, file)
+
+    with caplog.at_level(logging.WARNING, logger='tests'):
+        description = offline_description(workdir)
+
+    try:
+        assert description.index is None
+        assert 'Ignoring the catalogue snapshot' in caplog.text
+
+        with pytest.raises(CatalogueNotReady):
+            description.get_data(entity_name='Alarm')
+    finally:
+        description.stop()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+##
+# Copyright 2024 FIWARE Foundation, e.V.
+#
+# This file is part of SDM SQL schema generator
+#
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+from json import dumps
+from sqlite3 import connect
+import pytest
+from common.SQLSchema import compile_ddl, quote, MAX_IDENTIFIER_LENGTH, MAX_NESTED_DEPTH
+from common.constants import DIALECTS
+
+SCHEMA = {
+    'allOf': [
+        {'properties': {'id': {'type': 'string', 'description': 'Unique identifier'},
+                        'type': {'type': 'string', 'enum': ['WeatherObserved']}}},
+        {'properties': {
+            'temperature': {'type': 'number', 'minimum': -273.15},
+            'dateObserved': {'type': 'string', 'format': 'date-time'},
+            'raining': {'type': 'boolean'},
+            'address': {'type': 'object', 'properties': {
+                'streetAddress': {'type': 'string'},
+                'postalCode': {'type': 'string'}}},
+            'location': {'type': 'object', 'properties': {
+                'type': {'type': 'string', 'enum': ['Point']},
+                'coordinates': {'type': 'array', 'items': {'type': 'number'}}}},
+            'tags': {'type': 'array', 'items': {'type': 'string'}},
+            'contacts': {'type': 'array', 'items': {'type': 'object', 'properties': {
+                'phone': {'type': 'string'},
+                'email': {'type': 'string'}}, 'required': ['phone']}},
+        }, 'required': ['dateObserved']},
+    ]
+}
+
+
+def nested(depth: int) -> dict:
+    schema = {'type': 'string'}
+
+    for level in reversed(range(depth)):
+        schema = {'type': 'object', 'properties': {f'level{level}': schema}}
+
+    return schema
+
+
+def compile_schema(schema: dict, dialect: str) -> str:
+    return compile_ddl(document=dumps(schema).encode(), table='WeatherObserved', dialect=dialect)
+
+
+def test_postgresql_columns():
+    ddl = compile_schema(SCHEMA, dialect='postgresql')
+
+    assert ddl.startswith('CREATE EXTENSION IF NOT EXISTS postgis;')
+    assert '"id" TEXT PRIMARY KEY' in ddl
+    assert '"temperature" DOUBLE PRECISION CHECK ("temperature" >= -273.15)' in ddl
+    assert '"dateObserved" TIMESTAMPTZ NOT NULL' in ddl
+    assert '"raining" BOOLEAN' in ddl
+    assert '"location" geometry(Point, 4326)' in ddl
+    assert '"tags" TEXT[]' in ddl
+    assert '"type" TEXT CHECK ("type" IN (\'WeatherObserved\'))' in ddl
+    assert 'COMMENT ON COLUMN "WeatherObserved"."id" IS \'Unique identifier\';' in ddl
+
+
+def test_nested_objects_are_flattened():
+    ddl = compile_schema(SCHEMA, dialect='postgresql')
+
+    assert '"address_streetAddress" TEXT' in ddl
+    assert '"address_postalCode" TEXT' in ddl
+    assert '"address" ' not in ddl
+
+
+def test_objects_deeper_than_the_maximum_depth_are_json():
+    ddl = compile_schema({'properties': {'root': nested(MAX_NESTED_DEPTH + 1)}}, dialect='postgresql')
+
+    flattened = '_'.join(['root'] + [f'level{x}' for x in range(MAX_NESTED_DEPTH)])
+    assert f'"{flattened}" JSONB' in ddl
+
+
+def test_arrays_of_objects_have_a_child_table():
+    ddl = compile_schema(SCHEMA, dialect='postgresql')
+
+    assert 'CREATE TABLE IF NOT EXISTS "WeatherObserved_contacts"' in ddl
+    assert '"entity_id" TEXT NOT NULL REFERENCES "WeatherObserved" ("id") ON DELETE CASCADE' in ddl
+    assert 'PRIMARY KEY ("entity_id", "position")' in ddl
+    assert '"phone" TEXT NOT NULL' in ddl
+
+
+def test_sqlite_ddl_is_valid():
+    ddl = compile_schema(SCHEMA, dialect='sqlite')
+
+    assert 'postgis' not in ddl
+    assert 'COMMENT ON' not in ddl
+    assert '"location" TEXT CHECK (json_valid("location"))' in ddl
+    assert '"raining" INTEGER CHECK ("raining" IN (0, 1))' in ddl
+
+    connection = connect(':memory:')
+    try:
+        connection.executescript(ddl)
+        tables = {x for x, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        connection.close()
+
+    assert tables == {'WeatherObserved', 'WeatherObserved_contacts'}
+
+
+def test_long_identifiers_are_truncated_uniquely():
+    first, second = 'a' * 70 + 'first', 'a' * 70 + 'second'
+
+    assert len(quote(first)) == MAX_IDENTIFIER_LENGTH + 2
+    assert quote(first) != quote(second)
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_schema_without_properties(dialect):
+    with pytest.raises(ValueError):
+        compile_schema({'type': 'string'}, dialect=dialect)
+
+
+def test_unknown_dialect():
+    with pytest.raises(ValueError, match='Unknown SQL dialect'):
+        compile_schema(SCHEMA, dialect='oracle')